@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Shared helpers for the benchmark scripts
+
+Run the benchmarks from the repository root as modules, for ex
+    python -m benchmarks.bench_impute --csv 'data science exercise - sample data.csv'
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from ds_data import DATA_PATH, load_data, peak_rss_mb  # noqa: F401 - used by the benchmark workers
+
+
+def load_sample(path=DATA_PATH):
+    # same typed loader as DS_Model_Final.py
+    return load_data(path)
+
+
+def replicate(df, n_rows, seed=42):
+    # Scale the sample up (or down) to n_rows by sampling rows with replacement
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(df), n_rows)
+    return df.iloc[idx].reset_index(drop=True)
+
+
+def reset_peak_rss():
+    # linux only - writing 5 to clear_refs sets VmHWM back to the current rss, so peak_rss_mb is per stage
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+@contextmanager
+def timer(results, key):
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
+
+
+def print_table(rows):
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+def save_json(rows, path):
+    if path:
+        with open(path, 'w') as f:
+            json.dump(rows, f, indent=2, default=float)
+        print(f'Results written to {path}')
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Cold start load time and memory of the joblib pickle against the memory mapped artifact
+
+Starts --workers fresh python processes per format that each import what they need, load the
+model and score a few rows, then wait until all of them are loaded before reporting memory, as
+scoring workers would. RSS counts shared pages in every process, PSS (linux only) splits them
+between the processes that map them, so it shows the pages the artifact workers share.
+The artifact imports sklearn on the first row that needs KNN imputation, so with missing numerics
+in the scored rows that import moves from load_s to first_predict_s.
+
+    python -m benchmarks.bench_artifact --csv <sample csv> --model <xgb_pipeline.pkl>
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import joblib
+
+from benchmarks._common import DATA_PATH, print_table, save_json
+from ds_artifact import save_artifact
+
+WORKER = r'''
+import json, sys, time
+start = time.perf_counter()
+if sys.argv[1] == 'joblib':
+    import joblib
+    model = joblib.load(sys.argv[2])
+else:
+    from ds_artifact import load_artifact
+    model = load_artifact(sys.argv[2])
+load_s = time.perf_counter() - start
+import pandas as pd
+X = pd.read_csv(sys.argv[3], nrows=100, skipinitialspace=True, na_values=['?'])
+start = time.perf_counter()
+model.predict_proba(X)
+first_predict_s = time.perf_counter() - start
+print('ready', flush=True)
+sys.stdin.readline()
+
+memory = {}
+for path, key in (('/proc/self/status', 'VmRSS'), ('/proc/self/smaps_rollup', 'Pss')):
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(key + ':'):
+                    memory[key] = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+print(json.dumps({'load_s': load_s, 'first_predict_s': first_predict_s,
+                  'rss_mb': memory.get('VmRSS'), 'pss_mb': memory.get('Pss')}), flush=True)
+'''
+
+
+def run_workers(kind, path, csv, n_workers):
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONWARNINGS='ignore')
+    workers = [subprocess.Popen([sys.executable, '-c', WORKER, kind, path, csv], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, text=True, env=env) for _ in range(n_workers)]
+    # all workers hold their model until every one of them is loaded
+    for worker in workers:
+        if worker.stdout.readline().strip() != 'ready':
+            raise RuntimeError(f'{kind} worker failed')
+    results = []
+    for worker in workers:
+        worker.stdin.write('\n')
+        worker.stdin.flush()
+        results.append(json.loads(worker.stdout.readline()))
+        worker.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--model', default='/content/xgb_pipeline.pkl')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        artifact = save_artifact(joblib.load(args.model), os.path.join(directory, 'artifact'))
+        rows = []
+        for kind, path in (('joblib', args.model), ('artifact', artifact)):
+            results = run_workers(kind, path, args.csv, args.workers)
+            rows.append({
+                'format': kind,
+                'workers': args.workers,
+                'load_s': sum(r['load_s'] for r in results) / len(results),
+                'first_predict_s': sum(r['first_predict_s'] for r in results) / len(results),
+                'rss_mb_per_worker': sum(r['rss_mb'] or 0 for r in results) / len(results),
+                'pss_mb_total': sum(r['pss_mb'] or 0 for r in results),
+            })
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Scoring time with and without the ds_cache prediction cache on traffic with repeated records
+
+The sample is scaled up to --rows rows by sampling with replacement, so records repeat the way they
+do in production traffic (and the sample itself has repeated feature rows). Both paths score it
+  batch   predict_proba per --chunksize rows, as ds_score
+  single  one predict_proba call per record for --single-rows records drawn from --single-distinct ones,
+          as ds_serve without batching
+and the cached probabilities are checked against the model's.
+
+    python -m benchmarks.bench_cache --csv <sample csv> --model <xgb_pipeline.pkl or artifact dir>
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks._common import DATA_PATH, load_sample, print_table, replicate, save_json
+from ds_cache import PredictionCache, model_version
+from ds_columns import prepare_features
+from ds_score import load_model
+
+
+def _score(scorer, X, chunksize):
+    start = time.perf_counter()
+    proba = np.concatenate([scorer.predict_proba(X.iloc[i:i + chunksize])[:, 1] for i in range(0, len(X), chunksize)])
+    return proba, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--model', default='/content/xgb_pipeline.pkl')
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--chunksize', type=int, default=10_000)
+    parser.add_argument('--single-rows', type=int, default=2000)
+    parser.add_argument('--single-distinct', type=int, default=500)
+    parser.add_argument('--cache-size', type=int, default=1_000_000)
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    X = prepare_features(replicate(load_sample(args.csv), args.rows), drop_columns=())
+    rows = []
+    single = replicate(X.head(args.single_distinct), args.single_rows)
+    for path, part, chunksize in [('batch', X, args.chunksize), ('single', single, 1)]:
+        n = len(part)
+        expected, seconds = _score(model, part, chunksize)
+        rows.append({'path': path, 'cache': False, 'rows': n, 'seconds': seconds, 'rows_per_second': n / seconds})
+        cache = PredictionCache(model, version=model_version(args.model), max_entries=args.cache_size)
+        proba, seconds = _score(cache, part, chunksize)
+        stats = cache.stats()
+        rows.append({'path': path, 'cache': True, 'rows': n, 'seconds': seconds, 'rows_per_second': n / seconds,
+                     'hit_rate': stats['cache_hit_rate'], 'entries': stats['cache_entries'],
+                     'max_abs_diff': float(np.abs(proba - expected).max())})
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Throughput of CategoricalCleaner against the applymap cleaning of DS_Analysis.py
+
+Baseline: per cell strip with applymap, replace('?', NaN) and a LabelEncoder per string column.
+New: CategoricalCleaner(encode=True) on the same raw (unstripped object) frame.
+Throughput is reported in cells/second over the string columns.
+
+    python -m benchmarks.bench_cleaning --csv <sample csv> [--sizes 27467 274670 2746700]
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from benchmarks._common import DATA_PATH, print_table, replicate, save_json, timer
+from ds_preprocess import CategoricalCleaner
+
+
+def applymap_baseline(df):
+    # DataFrame.applymap was renamed to DataFrame.map in pandas 2.1
+    cell_map = getattr(df, 'map', None) or df.applymap
+    df = cell_map(lambda x: str(x).strip() if isinstance(x, str) else x)
+    df = df.replace('?', np.nan)
+    out = df.astype(object)
+    for column in df.columns:
+        le = LabelEncoder()
+        non_null_indices = df[column].notna()
+        out.loc[non_null_indices, column] = le.fit_transform(df.loc[non_null_indices, column].astype(str))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[27_467, 274_670, 2_746_700])
+    parser.add_argument('--baseline-max-rows', type=int, default=300_000)
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    # raw strings, as read by the notebook before any cleaning
+    raw = pd.read_csv(args.csv, dtype=str, keep_default_na=False)
+    string_columns = [c for c in raw.columns if pd.to_numeric(raw[c], errors='coerce').isna().all()]
+    raw = raw[string_columns].astype(object)
+
+    rows = []
+    for n_rows in args.sizes:
+        X = replicate(raw, n_rows)
+        cells = X.size
+        row = {'rows': n_rows, 'cells': cells}
+        with timer(row, 'cleaner_s'):
+            CategoricalCleaner(encode=True).fit_transform(X)
+        row['cleaner_cells_per_s'] = cells / row['cleaner_s']
+        if n_rows <= args.baseline_max_rows:
+            with timer(row, 'applymap_s'):
+                applymap_baseline(X)
+            row['applymap_cells_per_s'] = cells / row['applymap_s']
+            row['speedup'] = row['applymap_s'] / row['cleaner_s']
+        rows.append(row)
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
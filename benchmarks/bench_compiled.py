@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Compiled (numpy only) predictor against Pipeline.predict_proba
+
+Fits the final model pipeline with the one hot + KNN preprocessor (dense and sparse) and with the
+native categorical preprocessor, compiles each with ds_compile.compile_pipeline and reports the
+largest probability difference, batch predict time and single row latency of both.
+
+    python -m benchmarks.bench_compiled --csv <sample csv>
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from xgboost import XGBClassifier
+
+from benchmarks._common import DATA_PATH, load_sample, print_table, replicate, save_json
+from ds_compile import compile_pipeline
+from ds_preprocess import CategoricalCleaner, build_native_preprocessor, build_preprocessor, feature_types, split_X_y
+
+
+def _latency_ms(predict, X, n):
+    latencies = []
+    for i in range(min(n, len(X))):
+        start = time.perf_counter()
+        predict(X.iloc[[i]])
+        latencies.append(time.perf_counter() - start)
+    return np.percentile(latencies, [50, 99]) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--n-estimators', type=int, default=500)
+    parser.add_argument('--max-depth', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=None, help='scale the scored rows up to this many')
+    parser.add_argument('--single-rows', type=int, default=200, help='rows scored one at a time for latency')
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    X, y = split_X_y(load_sample(args.csv))
+    X_train, X_test, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42)
+    if args.rows:
+        X_test = replicate(X_test, args.rows)
+    numerical_features, categorical_features = feature_types(X)
+
+    preprocessors = {
+        'onehot_knn': build_preprocessor(numerical_features, categorical_features),
+        'onehot_knn_sparse': build_preprocessor(numerical_features, categorical_features, sparse=True),
+        'native': build_native_preprocessor(numerical_features, categorical_features),
+    }
+    rows = []
+    for name, preprocessor in preprocessors.items():
+        pipeline = Pipeline(steps=[
+            ('cleaner', CategoricalCleaner(columns=list(categorical_features))),
+            ('preprocessor', preprocessor),
+            ('classifier', XGBClassifier(n_estimators=args.n_estimators, max_depth=args.max_depth, learning_rate=0.2,
+                                         scale_pos_weight=10, eval_metric='logloss',
+                                         enable_categorical=True, tree_method='hist'))
+        ])
+        pipeline.fit(X_train, y_train)
+        compiled = compile_pipeline(pipeline)
+
+        start = time.perf_counter()
+        expected = pipeline.predict_proba(X_test)[:, 1]
+        pipeline_s = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = compiled.predict_proba(X_test)[:, 1]
+        compiled_s = time.perf_counter() - start
+
+        pipeline_p50, pipeline_p99 = _latency_ms(pipeline.predict_proba, X_test, args.single_rows)
+        compiled_p50, compiled_p99 = _latency_ms(compiled.predict_proba, X_test, args.single_rows)
+        rows.append({
+            'preprocessor': name,
+            'rows': len(X_test),
+            'max_abs_diff': float(np.abs(expected - actual).max()),
+            'label_mismatches': int(((expected >= 0.5) != (actual >= 0.5)).sum()),
+            'pipeline_s': pipeline_s,
+            'compiled_s': compiled_s,
+            'pipeline_row_p50_ms': pipeline_p50,
+            'compiled_row_p50_ms': compiled_p50,
+            'pipeline_row_p99_ms': pipeline_p99,
+            'compiled_row_p99_ms': compiled_p99,
+        })
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
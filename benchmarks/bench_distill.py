@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Latency/size vs recall tradeoff of the ds_distill fast tier against the tuned model
+
+Fits the final pipeline with the large end of the grid (--n-estimators trees of depth 5, learning rate
+0.005, scale_pos_weight 10) on 80% of the sample, or loads --model, then runs distill_model with the
+train part split again into fit/validation and scores the selected fast model on the test part.
+
+    python -m benchmarks.bench_distill --csv <sample csv>
+"""
+
+import argparse
+import time
+
+import joblib
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from benchmarks._common import DATA_PATH, load_sample, print_table, save_json
+from ds_distill import distill_model
+from ds_preprocess import split_X_y
+from ds_train import build_pipeline
+
+
+def _recall_precision(model, X, y, threshold):
+    predicted = model.predict_proba(X)[:, 1] >= threshold
+    y = np.asarray(y).astype(bool)
+    tp = int((predicted & y).sum())
+    return tp / max(int(y.sum()), 1), tp / max(int(predicted.sum()), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--model', default=None, help='fitted pipeline pickle, default is to fit one')
+    parser.add_argument('--n-estimators', type=int, default=1000)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--max-recall-loss', type=float, default=0.01)
+    parser.add_argument('--json', default=None, help='optional path to write the tradeoff table')
+    args = parser.parse_args()
+
+    X, y = split_X_y(load_sample(args.csv))
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    if args.model:
+        model = joblib.load(args.model)
+    else:
+        model, _ = build_pipeline(X)
+        model.set_params(classifier__n_estimators=args.n_estimators, classifier__max_depth=5,
+                         classifier__learning_rate=0.005, classifier__scale_pos_weight=10)
+        model.fit(X_train, y_train)
+
+    X_fit, X_valid, y_fit, y_valid = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
+    start = time.perf_counter()
+    fast_model, tradeoff = distill_model(model, X_fit, X_valid, y_valid, threshold=args.threshold,
+                                         max_recall_loss=args.max_recall_loss)
+    print(f'distill_model took {time.perf_counter() - start:.1f}s')
+    print_table(tradeoff.to_dict(orient='records'))
+
+    rows = []
+    for name, candidate in [('full', model), ('fast', fast_model)]:
+        recall, precision = _recall_precision(candidate, X_test, y_test, args.threshold)
+        rows.append({'model': name, 'trees': candidate.steps[-1][1].get_booster().num_boosted_rounds(),
+                     'test_recall': recall, 'test_precision': precision})
+    print_table(rows)
+    save_json(tradeoff.to_dict(orient='records'), args.json)
+
+
+if __name__ == '__main__':
+    main()
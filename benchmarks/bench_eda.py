@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Time and peak memory of the DS_Analysis.py exploration figures, raw-point plots against ds_eda aggregates
+
+The sample is scaled up to --rows rows (100x by default) and written to a temporary csv. Each mode
+draws the Gender/Education/HoursWorkWeekly/WorkClass and MaritalStatus/Occupation/HoursWorkWeekly/Race
+figures in its own process (Agg backend):
+  seaborn     load_data + sns.countplot/boxplot/histplot on the full frame, as DS_Analysis.py
+  aggregates  compute_aggregates over the csv chunks + plot_overview
+The seaborn pairplot of DS_Analysis.py is left out, it does not finish in reasonable time at this size
+(ds_eda draws it from the stratified sample only).
+
+    python -m benchmarks.bench_eda --csv <sample csv> --rows 2700000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+from benchmarks._common import DATA_PATH, print_table, replicate, save_json
+
+WORKER = r'''
+import json, sys, time
+import matplotlib.pyplot as plt
+import seaborn as sns
+from benchmarks._common import peak_rss_mb
+
+mode, path, chunksize = sys.argv[1], sys.argv[2], int(sys.argv[3])
+start = time.perf_counter()
+if mode == 'seaborn':
+    from ds_data import load_data
+    data = load_data(path, use_cache=False, chunksize=chunksize)
+    fig, axes = plt.subplots(2, 2, figsize=(20, 20))
+    sns.countplot(data=data, x='Gender', hue='IncomeLabel', ax=axes[0, 0])
+    sns.countplot(data=data, x='Education', hue='IncomeLabel', order=data['Education'].value_counts().index, ax=axes[0, 1])
+    sns.boxplot(data=data, x='IncomeLabel', y='HoursWorkWeekly', ax=axes[1, 0])
+    sns.countplot(data=data, x='WorkClass', hue='IncomeLabel', order=data['WorkClass'].value_counts().index, ax=axes[1, 1])
+    fig.savefig('/dev/null', format='png')
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    sns.countplot(y='MaritalStatus', hue='IncomeLabel', data=data, order=data['MaritalStatus'].value_counts().index, ax=axes[0, 0])
+    sns.countplot(y='Occupation', hue='IncomeLabel', data=data, order=data['Occupation'].value_counts().index, ax=axes[0, 1])
+    sns.histplot(data=data, x='HoursWorkWeekly', hue='IncomeLabel', multiple='stack', kde=True, ax=axes[1, 0])
+    sns.countplot(y='Race', hue='IncomeLabel', data=data, order=data['Race'].value_counts().index, ax=axes[1, 1])
+    fig.savefig('/dev/null', format='png')
+else:
+    from ds_eda import compute_aggregates, plot_overview
+    eda = compute_aggregates(path, chunksize=chunksize, pairs=[('Age', 'HoursWorkWeekly')], sample_per_class=2000)
+    plt.show = lambda: plt.gcf().savefig('/dev/null', format='png')
+    plot_overview(eda)
+print(json.dumps({'mode': mode, 'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb()}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--rows', type=int, default=2_700_000)
+    parser.add_argument('--chunksize', type=int, default=500_000)
+    parser.add_argument('--modes', nargs='+', default=['seaborn', 'aggregates'])
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONWARNINGS='ignore', MPLBACKEND='Agg')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'extract.csv')
+        raw = pd.read_csv(args.csv)
+        replicate(raw, args.rows).to_csv(path, index=False)
+        del raw
+        rows = []
+        for mode in args.modes:
+            output = subprocess.run([sys.executable, '-c', WORKER, mode, path, str(args.chunksize)], env=env,
+                                    check=True, capture_output=True, text=True)
+            rows.append({'rows': args.rows, **json.loads(output.stdout.strip().splitlines()[-1])})
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Batch scoring throughput with and without ds_explain reasons
+
+Runs the ds_score worker functions in process over --rows rows of the (replicated) sample, --chunksize
+rows per chunk, for
+  none         probabilities only
+  flagged      + --top-k reasons for the rows labelled 1 (ds_score --explain)
+  all          + reasons for every row (ds_score --explain-all)
+and each explaining mode with exact TreeSHAP and with the approximate contributions.
+
+    python -m benchmarks.bench_explain --csv <sample csv> --model <xgb_pipeline.pkl or artifact dir>
+"""
+
+import argparse
+import time
+
+import ds_score
+from benchmarks._common import DATA_PATH, load_sample, print_table, replicate, save_json
+from ds_columns import prepare_features
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--model', default='/content/xgb_pipeline.pkl')
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--chunksize', type=int, default=10_000)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    X = prepare_features(replicate(load_sample(args.csv), args.rows), drop_columns=())
+    modes = [('none', None, False)] + [(mode, approximate, mode == 'all')
+                                       for approximate in (False, True) for mode in ('flagged', 'all')]
+    rows = []
+    for mode, approximate, all_rows in modes:
+        explain = None if approximate is None else (args.top_k, args.threshold, all_rows, approximate)
+        ds_score._init_worker(args.model, explain=explain)
+        # warm up (memory mapped artifact pages, first imputer build)
+        ds_score._score_chunk(X.iloc[:args.chunksize])
+        explained = flagged = 0
+        start = time.perf_counter()
+        for i in range(0, len(X), args.chunksize):
+            proba, _, reasons = ds_score._score_chunk(X.iloc[i:i + args.chunksize])
+            flagged += int((proba >= args.threshold).sum())
+            if reasons is not None:
+                explained += int(reasons['reason_1'].notna().sum())
+        seconds = time.perf_counter() - start
+        rows.append({'mode': mode, 'approximate': approximate, 'rows': len(X), 'flagged': flagged,
+                     'with_reasons': explained, 'seconds': seconds, 'rows_per_second': len(X) / seconds})
+    for row in rows:
+        row['slowdown'] = row['seconds'] / rows[0]['seconds']
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
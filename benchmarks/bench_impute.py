@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Benchmark IndexedKNNImputer against sklearn KNNImputer
+
+Imputes the numerical features of the sample data replicated to 30K, 300K and 3M rows.
+Brute force KNNImputer is quadratic, so it is only run up to --brute-max-rows;
+where both ran, the share of imputed cells that agree (within --tol) is reported.
+Cells that differ come from equally distant donors (the integer valued columns have many): IndexedKNNImputer
+takes them in row order, KNNImputer as np.argpartition leaves them. tests/test_impute.py checks the cells
+where that choice does not matter.
+
+    python -m benchmarks.bench_impute --csv <sample csv> [--sizes 30000 300000 3000000]
+"""
+
+import argparse
+
+import numpy as np
+from sklearn.impute import KNNImputer
+
+from benchmarks._common import DATA_PATH, load_sample, print_table, replicate, save_json, timer
+from ds_impute import IndexedKNNImputer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[30_000, 300_000, 3_000_000])
+    parser.add_argument('--brute-max-rows', type=int, default=30_000)
+    parser.add_argument('--tol', type=float, default=1e-6)
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    sample = load_sample(args.csv)
+    numerical = sample.select_dtypes(include=['number']).columns
+
+    rows = []
+    for n_rows in args.sizes:
+        X = replicate(sample[numerical], n_rows).to_numpy(dtype=np.float64)
+        missing = np.isnan(X)
+        row = {'rows': n_rows, 'incomplete_rows': int(missing.any(axis=1).sum())}
+
+        with timer(row, 'indexed_s'):
+            indexed = IndexedKNNImputer(n_neighbors=5).fit_transform(X)
+
+        if n_rows <= args.brute_max_rows:
+            with timer(row, 'knnimputer_s'):
+                brute = KNNImputer(n_neighbors=5).fit_transform(X)
+            row['speedup'] = row['knnimputer_s'] / row['indexed_s']
+            valid = ~missing.all(axis=0)
+            imputed_cells = missing[:, valid]
+            diff = np.abs(indexed - brute)[imputed_cells]
+            row['cells_matching'] = float(np.mean(diff <= args.tol)) if diff.size else 1.0
+            row['max_abs_diff'] = float(diff.max()) if diff.size else 0.0
+        else:
+            row['knnimputer_s'] = None
+        rows.append(row)
+        print_table([row])
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
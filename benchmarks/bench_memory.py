@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Memory of the training frame with and without ds_data.optimize_dtypes
+
+Prints the per column bytes of the plain read_csv frame against the optimized one (scaled up to
+--report-rows rows), then fits the final model pipeline on --rows rows in a separate process per mode
+and reports the peak process memory:
+  raw        read_csv dtypes (strings, int64/float64) scaled up, as the scripts did before load_data
+  optimized  optimize_dtypes (category + downcast numerics) before scaling up, as load_data returns it
+
+    python -m benchmarks.bench_memory --csv <sample csv> --rows 10000000 --preprocessor native
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+from benchmarks._common import DATA_PATH, replicate, save_json
+from ds_data import memory_report, optimize_dtypes
+
+WORKER = r'''
+import json, sys, time
+import pandas as pd
+from benchmarks._common import peak_rss_mb, replicate
+from ds_data import optimize_dtypes
+from ds_preprocess import split_X_y
+from ds_train import build_pipeline
+
+mode, path, rows, preprocessor, n_estimators = sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4], int(sys.argv[5])
+data = pd.read_csv(path, skipinitialspace=True)
+if mode == 'optimized':
+    data = optimize_dtypes(data)
+data = replicate(data, rows)
+frame_mb = data.memory_usage(deep=True).sum() / 2**20
+X, y = split_X_y(data)
+del data
+pipeline, preprocessors = build_pipeline(X)
+pipeline.set_params(preprocessor=preprocessors[preprocessor == 'native'], classifier__n_estimators=n_estimators,
+                    verbose=False)
+start = time.perf_counter()
+pipeline.fit(X, y)
+print(json.dumps({'mode': mode, 'rows': rows, 'frame_mb': frame_mb, 'fit_s': time.perf_counter() - start,
+                  'peak_rss_mb': peak_rss_mb()}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--report-rows', type=int, default=1_000_000)
+    parser.add_argument('--preprocessor', choices=['onehot_knn', 'native'], default='native',
+                        help='the KNN imputers dominate the fit at 10M rows, native keeps the run short')
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    raw = replicate(pd.read_csv(args.csv, skipinitialspace=True), args.report_rows)
+    report = memory_report(raw, optimize_dtypes(raw))
+    del raw
+    print(f'Bytes per column at {args.report_rows:,} rows')
+    print(report.to_string())
+
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONWARNINGS='ignore')
+    rows = []
+    for mode in ('raw', 'optimized'):
+        output = subprocess.run([sys.executable, '-c', WORKER, mode, args.csv, str(args.rows), args.preprocessor,
+                                 str(args.n_estimators)], env=env, check=True, capture_output=True, text=True)
+        rows.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    print(pd.DataFrame(rows).to_string(index=False))
+    save_json({'columns': report.reset_index(names='column').to_dict(orient='records'), 'fit': rows}, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Side by side comparison of the one hot + KNN preprocessor and the native categorical mode
+
+Both pipelines are fitted with the same classifier settings on the same 80/20 split as
+DS_Model_Final.py. Reported: test recall/precision at 0.5, fit time, batch predict time
+and single row predict latency.
+
+    python -m benchmarks.bench_native --csv <sample csv>
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.metrics import precision_score, recall_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from xgboost import XGBClassifier
+
+from benchmarks._common import DATA_PATH, load_sample, print_table, save_json
+from ds_preprocess import build_native_preprocessor, build_preprocessor, feature_types, split_X_y
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--n-estimators', type=int, default=500)
+    parser.add_argument('--max-depth', type=int, default=5)
+    parser.add_argument('--learning-rate', type=float, default=0.2)
+    parser.add_argument('--scale-pos-weight', type=float, default=10)
+    parser.add_argument('--single-rows', type=int, default=200, help='rows scored one at a time for latency')
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    X, y = split_X_y(load_sample(args.csv))
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    numerical_features, categorical_features = feature_types(X)
+
+    preprocessors = {
+        'onehot_knn': build_preprocessor(numerical_features, categorical_features),
+        'native': build_native_preprocessor(numerical_features, categorical_features),
+    }
+    rows = []
+    for name, preprocessor in preprocessors.items():
+        classifier = XGBClassifier(n_estimators=args.n_estimators, max_depth=args.max_depth,
+                                   learning_rate=args.learning_rate, scale_pos_weight=args.scale_pos_weight,
+                                   eval_metric='logloss', enable_categorical=True, tree_method='hist')
+        pipeline = Pipeline(steps=[('preprocessor', preprocessor), ('classifier', classifier)])
+
+        start = time.perf_counter()
+        pipeline.fit(X_train, y_train)
+        fit_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        y_pred = (pipeline.predict_proba(X_test)[:, 1] >= 0.5).astype(int)
+        predict_s = time.perf_counter() - start
+
+        latencies = []
+        for i in range(min(args.single_rows, len(X_test))):
+            start = time.perf_counter()
+            pipeline.predict_proba(X_test.iloc[[i]])
+            latencies.append(time.perf_counter() - start)
+
+        rows.append({
+            'preprocessor': name,
+            'recall': recall_score(y_test, y_pred),
+            'precision': precision_score(y_test, y_pred),
+            'fit_s': fit_s,
+            'predict_s': predict_s,
+            'row_p50_ms': np.percentile(latencies, 50) * 1000,
+            'row_p99_ms': np.percentile(latencies, 99) * 1000,
+        })
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
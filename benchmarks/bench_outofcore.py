@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Peak memory of out-of-core training (ds_outofcore) against the in-memory path
+
+The sample is scaled up to --rows rows and written to a temporary csv. Each mode trains the
+final model pipeline (one hot + KNN preprocessor) in its own process so peak RSS is per mode:
+  in_memory     load_data + train_test_split + Pipeline.fit, as DS_Model_Final.py
+  outofcore     fit_outofcore with a QuantileDMatrix
+  external      fit_outofcore with an ExtMemQuantileDMatrix paged to disk
+Validation recall is at 0.5 on the 20% split of each mode. The scaled up rows are copies of the sample,
+so train_test_split puts copies of the test rows in training (optimistic recall) while the hash
+split keeps equal rows on the same side.
+
+    python -m benchmarks.bench_outofcore --csv <sample csv> --rows 1000000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+from benchmarks._common import DATA_PATH, print_table, replicate, save_json
+
+WORKER = r'''
+import json, sys, time
+from benchmarks._common import peak_rss_mb
+from ds_data import iter_chunks, load_data
+from ds_preprocess import split_X_y
+from ds_train import build_pipeline
+
+mode, path, chunksize, fit_rows, n_estimators = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4]), int(sys.argv[5])
+start = time.perf_counter()
+# column types from the first rows only
+sample = next(iter_chunks(path, 1000))
+pipeline, _ = build_pipeline(split_X_y(sample)[0])
+pipeline.set_params(classifier__n_estimators=n_estimators, classifier__max_depth=5, classifier__learning_rate=0.2,
+                    classifier__scale_pos_weight=10)
+del sample
+if mode == 'in_memory':
+    from sklearn.metrics import recall_score
+    from sklearn.model_selection import train_test_split
+    X, y = split_X_y(load_data(path, use_cache=False, chunksize=chunksize))
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    pipeline.fit(X_train, y_train)
+    recall = recall_score(y_test, pipeline.predict(X_test))
+else:
+    from ds_outofcore import fit_outofcore
+    _, info = fit_outofcore(path, pipeline, chunksize=chunksize, fit_rows=fit_rows, external_memory=mode == 'external')
+    recall = info['validation_recall']
+print(json.dumps({'mode': mode, 'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb(),
+                  'validation_recall': recall}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--fit-rows', type=int, default=50_000, help='rows the preprocessing is fitted on (out-of-core)')
+    parser.add_argument('--n-estimators', type=int, default=200)
+    parser.add_argument('--modes', nargs='+', default=['in_memory', 'outofcore', 'external'])
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONWARNINGS='ignore')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'extract.csv')
+        # written from the raw csv so every mode parses the same text
+        raw = pd.read_csv(args.csv)
+        replicate(raw, args.rows).to_csv(path, index=False)
+        del raw
+        rows = []
+        for mode in args.modes:
+            output = subprocess.run([sys.executable, '-c', WORKER, mode, path, str(args.chunksize), str(args.fit_rows),
+                                     str(args.n_estimators)], env=env, check=True, capture_output=True, text=True)
+            rows.append({'rows': args.rows, **json.loads(output.stdout.strip().splitlines()[-1])})
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Incremental refresh (ds_refresh) against a full retrain
+
+The sample is split into history, --batches daily batches and a 20% holdout. The model is fitted
+on the history, then each batch is either added with refresh_model (warm start boosting, frozen
+preprocessing) or the pipeline is refitted from scratch on history + batches so far, with the same
+classifier settings (the search itself is not rerun, it would only add to the retrain time).
+Reported per batch: time and holdout recall/precision at 0.5 of the model in use, and whether the
+refresh was rolled back (candidate_recall is the recall of the rejected model).
+
+    python -m benchmarks.bench_refresh --csv <sample csv>
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split
+
+from benchmarks._common import DATA_PATH, load_sample, print_table, save_json
+from ds_preprocess import split_X_y
+from ds_refresh import _recall_precision, refresh_model
+from ds_train import build_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--batches', type=int, default=5)
+    parser.add_argument('--batch-fraction', type=float, default=0.05, help='size of each batch, fraction of the data')
+    parser.add_argument('--n-estimators', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=50, help='rounds added per refresh')
+    # the full learning rate on a small batch overfits it and gets rolled back
+    parser.add_argument('--learning-rate', type=float, default=0.02, help='learning rate of the added rounds')
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    X, y = split_X_y(load_sample(args.csv))
+    X_rest, X_holdout, y_rest, y_holdout = train_test_split(X, y, test_size=0.2, random_state=42)
+    batch_rows = int(len(X) * args.batch_fraction)
+    history_rows = len(X_rest) - args.batches * batch_rows
+    pipeline, _ = build_pipeline(X)
+    pipeline.set_params(classifier__n_estimators=args.n_estimators, classifier__max_depth=5,
+                        classifier__learning_rate=0.2, classifier__scale_pos_weight=10, verbose=False)
+
+    start = time.perf_counter()
+    current = clone(pipeline).fit(X_rest.iloc[:history_rows], y_rest.iloc[:history_rows])
+    recall, precision = _recall_precision(current, X_holdout, y_holdout, 0.5)
+    rows = [{'batch': 0, 'mode': 'initial fit', 'seconds': time.perf_counter() - start,
+             'recall': recall, 'precision': precision}]
+
+    for batch in range(1, args.batches + 1):
+        end = history_rows + batch * batch_rows
+        X_batch, y_batch = X_rest.iloc[end - batch_rows:end], y_rest.iloc[end - batch_rows:end]
+        current, report = refresh_model(current, X_batch, y_batch, X_holdout, y_holdout, n_rounds=args.rounds,
+                                        learning_rate=args.learning_rate)
+        kept = 'before' if report['rolled_back'] else 'after'
+        rows.append({'batch': batch, 'mode': 'refresh', 'seconds': report['refresh_s'],
+                     'recall': report[f'recall_{kept}'], 'precision': report[f'precision_{kept}'],
+                     'rolled_back': report['rolled_back'], 'candidate_recall': report['recall_after']})
+
+        start = time.perf_counter()
+        retrained = clone(pipeline).fit(X_rest.iloc[:end], y_rest.iloc[:end])
+        seconds = time.perf_counter() - start
+        recall, precision = _recall_precision(retrained, X_holdout, y_holdout, 0.5)
+        rows.append({'batch': batch, 'mode': 'full retrain', 'seconds': seconds,
+                     'recall': recall, 'precision': precision})
+
+    print_table(pd.DataFrame(rows).replace({np.nan: ''}))
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
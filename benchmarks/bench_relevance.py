@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Time and peak memory of the feature relevance scores, in-memory DS_Analysis.py steps against ds_relevance
+
+The sample is scaled up to --rows rows (100x by default) and written to a temporary csv. Each mode runs in
+its own process:
+  pandas     load_data + df.corr() of the numerics and the response + LabelEncoder + sklearn chi2
+  streaming  feature_relevance over the csv chunks (correlation, chi2 and the column selection)
+
+    python -m benchmarks.bench_relevance --csv <sample csv> --rows 2700000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+from benchmarks._common import DATA_PATH, print_table, replicate, save_json
+
+WORKER = r'''
+import json, sys, time
+from benchmarks._common import peak_rss_mb
+
+mode, path, chunksize = sys.argv[1], sys.argv[2], int(sys.argv[3])
+start = time.perf_counter()
+if mode == 'pandas':
+    from sklearn.feature_selection import chi2
+    from sklearn.preprocessing import LabelEncoder
+    from ds_columns import TARGET, code_target
+    from ds_data import load_data
+    data = load_data(path, use_cache=False, chunksize=chunksize)
+    data[TARGET] = code_target(data[TARGET])
+    data.select_dtypes(include=['number']).corr()
+    encoded = data.select_dtypes(include=['category']).dropna()
+    for column in encoded.columns:
+        encoded[column] = LabelEncoder().fit_transform(encoded[column])
+    chi2(encoded, data.loc[encoded.index, TARGET])
+else:
+    from ds_relevance import feature_relevance
+    feature_relevance(path, chunksize=chunksize).select()
+print(json.dumps({'mode': mode, 'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb()}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--rows', type=int, default=2_700_000)
+    parser.add_argument('--chunksize', type=int, default=200_000)
+    parser.add_argument('--modes', nargs='+', default=['pandas', 'streaming'])
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONWARNINGS='ignore')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'extract.csv')
+        raw = pd.read_csv(args.csv)
+        replicate(raw, args.rows).to_csv(path, index=False)
+        del raw
+        rows = []
+        for mode in args.modes:
+            output = subprocess.run([sys.executable, '-c', WORKER, mode, path, str(args.chunksize)], env=env,
+                                    check=True, capture_output=True, text=True)
+            rows.append({'rows': args.rows, **json.loads(output.stdout.strip().splitlines()[-1])})
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
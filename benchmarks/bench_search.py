@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Wall time of FoldCachedSearchCV against GridSearchCV on the final model grid
+
+The searches use the pipeline and param grid of DS_Model_Final.py (n_estimators can be
+scaled down with --n-estimators to keep the run short) and must find the same best score.
+The shared variant memory maps the fold matrices so the workers do not get their own copies.
+
+    python -m benchmarks.bench_search --csv <sample csv>
+"""
+
+import argparse
+import time
+
+from sklearn.model_selection import GridSearchCV, train_test_split
+from sklearn.pipeline import Pipeline
+from xgboost import XGBClassifier
+
+from benchmarks._common import DATA_PATH, load_sample, print_table, save_json
+from ds_preprocess import CategoricalCleaner, build_native_preprocessor, build_preprocessor, feature_types, split_X_y
+from ds_search import FoldCachedSearchCV
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=[500, 1000])
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    X, y = split_X_y(load_sample(args.csv))
+    X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2, random_state=42)
+    numerical_features, categorical_features = feature_types(X)
+    preprocessor = build_preprocessor(numerical_features, categorical_features)
+    pipeline = Pipeline(steps=[
+        ('cleaner', CategoricalCleaner(columns=list(categorical_features))),
+        ('preprocessor', preprocessor),
+        ('classifier', XGBClassifier(eval_metric='logloss', enable_categorical=True, tree_method='hist'))
+    ])
+    param_grid = {
+        'preprocessor': [preprocessor, build_native_preprocessor(numerical_features, categorical_features)],
+        'classifier__n_estimators': args.n_estimators,
+        'classifier__max_depth': [3, 5],
+        'classifier__learning_rate': [0.005, 0.2],
+        'classifier__scale_pos_weight': [10, 12],
+    }
+
+    rows = []
+    searches = {
+        'GridSearchCV': GridSearchCV(pipeline, param_grid, scoring='recall', cv=3, n_jobs=args.n_jobs),
+        'FoldCachedSearchCV': FoldCachedSearchCV(pipeline, param_grid, scoring='recall', cv=3, n_jobs=args.n_jobs),
+        'FoldCachedSearchCV(shared)': FoldCachedSearchCV(pipeline, param_grid, scoring='recall', cv=3,
+                                                         n_jobs=args.n_jobs, shared=True),
+    }
+    for name, search in searches.items():
+        start = time.perf_counter()
+        search.fit(X_train, y_train)
+        row = {'search': name, 'fit_s': time.perf_counter() - start, 'best_score': search.best_score_}
+        if hasattr(search, 'time_saved_'):
+            row['preprocess_s'] = search.preprocess_time_
+            row['preprocess_saved_s'] = search.time_saved_
+            # workers are reused across searches, so this is the peak over the runs so far
+            row['max_worker_rss_mb'] = max(search.worker_peak_rss_mb_.values())
+        rows.append(row)
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
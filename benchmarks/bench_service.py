@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Load test of the ds_serve scoring service against per row predict_proba
+
+Starts the service in process on a free port and sends single record requests from
+--clients concurrent keep-alive connections. The same records are also scored one call
+per row to show the per call overhead the micro-batching removes.
+
+    python -m benchmarks.bench_service --csv <sample csv> --model <xgb_pipeline.pkl>
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from benchmarks._common import DATA_PATH, load_sample, print_table, save_json
+from ds_preprocess import prepare_features
+from ds_serve import make_server
+
+
+def _records(csv, n):
+    X = prepare_features(load_sample(csv)).head(n).astype(object)
+    # json has no NaN, missing values are sent as null
+    return [{k: (None if v is None or v != v else v.item() if hasattr(v, 'item') else v) for k, v in row.items()}
+            for row in X.to_dict(orient='records')]
+
+
+def _client(port, records, latencies):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    for record in records:
+        start = time.perf_counter()
+        conn.request('POST', '/score', body=json.dumps(record), headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f'status {response.status}')
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def load_test(model, records, clients, max_batch, max_wait_ms):
+    server = make_server(model, port=0, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    latencies = []
+    threads = [threading.Thread(target=_client, args=(port, records[i::clients], latencies)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stats = server.batcher.stats.snapshot()
+    server.shutdown()
+    server.server_close()
+    server.batcher.close()
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    return {'mode': f'service (batch {max_batch}, wait {max_wait_ms}ms)', 'clients': clients,
+            'requests_per_s': len(latencies) / elapsed, 'p50_ms': p50, 'p99_ms': p99,
+            'mean_batch_rows': stats['mean_batch_rows']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--model', default='/content/xgb_pipeline.pkl')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    records = _records(args.csv, args.requests)
+
+    # baseline - one predict_proba call per record, no http
+    X = prepare_features(load_sample(args.csv)).head(min(args.requests, 500))
+    latencies = []
+    for i in range(len(X)):
+        start = time.perf_counter()
+        model.predict_proba(X.iloc[[i]])
+        latencies.append(time.perf_counter() - start)
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    rows = [{'mode': 'predict_proba per row', 'clients': 1, 'requests_per_s': len(latencies) / sum(latencies),
+             'p50_ms': p50, 'p99_ms': p99, 'mean_batch_rows': 1.0}]
+
+    for clients in args.clients:
+        rows.append(load_test(model, records, clients, args.max_batch, args.max_wait_ms))
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
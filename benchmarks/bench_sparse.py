@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the sparse (CSR) preprocessing path against the dense one
+
+For the sample data and a replicated version (100x by default) it reports, for each mode,
+the size of the transformed matrix, the peak python allocation while preprocessing
+(tracemalloc) and the fit time of preprocessing + XGBoost.
+
+    python -m benchmarks.bench_sparse --csv <sample csv> [--factors 1 100]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import scipy.sparse as sp
+from sklearn.pipeline import Pipeline
+from xgboost import XGBClassifier
+
+from benchmarks._common import DATA_PATH, load_sample, print_table, replicate, save_json
+from ds_preprocess import build_preprocessor, feature_types, split_X_y
+
+
+def matrix_bytes(M):
+    if sp.issparse(M):
+        return M.data.nbytes + M.indices.nbytes + M.indptr.nbytes
+    return M.nbytes
+
+
+def run(X, y, sparse, n_estimators):
+    numerical_features, categorical_features = feature_types(X)
+    preprocessor = build_preprocessor(numerical_features, categorical_features, sparse=sparse)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    Xt = preprocessor.fit_transform(X)
+    preprocess_s = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    classifier = XGBClassifier(n_estimators=n_estimators, eval_metric='logloss', tree_method='hist')
+    start = time.perf_counter()
+    classifier.fit(Xt, y)
+    classifier_s = time.perf_counter() - start
+
+    # the same full pipeline predict path as in DS_Model_Final.py
+    pipeline = Pipeline(steps=[('preprocessor', preprocessor), ('classifier', classifier)])
+    start = time.perf_counter()
+    pipeline.predict_proba(X)
+    predict_s = time.perf_counter() - start
+
+    return {
+        'mode': 'sparse' if sparse else 'dense',
+        'matrix_mb': matrix_bytes(Xt) / 2**20,
+        'preprocess_peak_mb': peak / 2**20,
+        'preprocess_s': preprocess_s,
+        'xgb_fit_s': classifier_s,
+        'fit_total_s': preprocess_s + classifier_s,
+        'predict_s': predict_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH)
+    parser.add_argument('--factors', type=int, nargs='+', default=[1, 100])
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--json', default=None, help='optional path to write the results')
+    args = parser.parse_args()
+
+    sample = load_sample(args.csv)
+    rows = []
+    for factor in args.factors:
+        X, y = split_X_y(replicate(sample, len(sample) * factor) if factor > 1 else sample)
+        results = {mode: run(X, y, mode == 'sparse', args.n_estimators) for mode in ('dense', 'sparse')}
+        for mode, row in results.items():
+            rows.append({'rows': len(X), **row})
+        dense, sparse = results['dense'], results['sparse']
+        print(f"{len(X)} rows: matrix {dense['matrix_mb']:.1f}MB -> {sparse['matrix_mb']:.1f}MB, "
+              f"fit {dense['fit_total_s']:.2f}s -> {sparse['fit_total_s']:.2f}s")
+
+    print_table(rows)
+    save_json(rows, args.json)
+
+
+if __name__ == '__main__':
+    main()
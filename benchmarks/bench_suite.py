@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Scaling of the DS_Model_Final.py train/score path on synthetic data, results saved as json for comparison
+
+For every --rows size a synthetic csv is generated with benchmarks/synthetic.py (kept in --data-dir and
+reused when given) and one process runs the stages of DS_Model_Final.py on it:
+  ingest         load_data (typed read, no parquet cache)
+  split          split_X_y + 80/20 train_test_split
+  <step>         fit_transform of every preprocessing step on the train part - the cleaner, the num and cat
+                 steps of build_preprocessor's ColumnTransformer, the native encoder
+  search         build_search grid fit (FoldCachedSearchCV, same results as GridSearchCV) over both
+                 preprocessors and PARAM_GRID with --n-estimators trees; above --max-search-rows the
+                 pipeline is fitted once with the first grid point instead (stage fit)
+  save / load    joblib dump and load of the best pipeline
+  predict_proba  the loaded pipeline on the test part
+Every stage has its wall time and the peak rss of the process during the stage (linux, the peak is reset
+between stages). The json has the run's metadata (commit, versions, cpus, arguments) and one row per
+(rows, stage); --compare <previous json> prints the ratios against it and exits 1 when a stage of at least
+--min-seconds is more than --tolerance times slower or bigger.
+
+    python -m benchmarks.bench_suite --csv <sample csv> --rows 10000 100000 1000000 --json suite.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks._common import DATA_PATH, print_table, save_json
+from benchmarks.synthetic import profile_sample, write_synthetic
+
+WORKER = r'''
+import json, sys
+from benchmarks.bench_suite import run_stages
+print(json.dumps(run_stages(sys.argv[1], json.loads(sys.argv[2]))))
+'''
+
+
+def run_stages(path, options):
+    """Time the DS_Model_Final.py stages on the csv at path, one dict per stage"""
+    import joblib
+    from sklearn.base import clone
+    from sklearn.model_selection import train_test_split
+
+    from benchmarks._common import peak_rss_mb, reset_peak_rss
+    from ds_data import load_data
+    from ds_preprocess import split_X_y
+    from ds_train import PARAM_GRID, build_pipeline, build_search
+
+    stages = []
+
+    def stage(name, func, **extra):
+        reset_peak_rss()
+        start = time.perf_counter()
+        result = func()
+        stages.append({'stage': name, 'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb(), **extra})
+        return result
+
+    data = stage('ingest', lambda: load_data(path, use_cache=False))
+    stages[-1]['frame_mb'] = data.memory_usage(deep=True).sum() / 2**20
+    X_train, X_test, y_train, y_test = stage(
+        'split', lambda: train_test_split(*split_X_y(data), test_size=0.2, random_state=42))
+    del data
+
+    pipeline, preprocessors = build_pipeline(X_train)
+    cleaned = stage('cleaner', lambda: clone(pipeline.named_steps['cleaner']).fit_transform(X_train))
+    for name, block, columns in preprocessors[0].transformers:
+        Xt = cleaned[columns]
+        for step, transformer in block.steps:
+            Xt = stage(f'{name}__{step}', lambda: clone(transformer).fit_transform(Xt, y_train))
+    stage('native_encoder', lambda: clone(preprocessors[1]).fit_transform(cleaned, y_train))
+    del cleaned, Xt
+
+    param_grid = {**PARAM_GRID, 'classifier__n_estimators': options['n_estimators'], 'verbose': [False]}
+    if len(X_train) <= options['max_search_rows']:
+        search = build_search(pipeline, preprocessors, search_mode='grid', param_grid=param_grid,
+                              n_jobs=options['n_jobs'], cv=options['cv'])
+        search.verbose = 0
+        model = stage('search', lambda: search.fit(X_train, y_train).best_estimator_)
+        stages[-1].update(candidates=len(search.cv_results_['params']), best_score=search.best_score_)
+    else:
+        params = {key: values[0] for key, values in param_grid.items()}
+        model = stage('fit', lambda: pipeline.set_params(**params).fit(X_train, y_train))
+
+    with tempfile.TemporaryDirectory() as directory:
+        model_path = os.path.join(directory, 'xgb_pipeline.pkl')
+        stage('save', lambda: joblib.dump(model, model_path))
+        stages[-1]['size_mb'] = os.path.getsize(model_path) / 2**20
+        del model
+        loaded = stage('load', lambda: joblib.load(model_path))
+    stage('predict_proba', lambda: loaded.predict_proba(X_test))
+    stages[-1]['rows_per_second'] = len(X_test) / stages[-1]['seconds']
+    return stages
+
+
+def _metadata(args):
+    import numpy
+    import sklearn
+    import xgboost
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit, 'python': platform.python_version(),
+            'numpy': numpy.__version__, 'pandas': pd.__version__, 'sklearn': sklearn.__version__,
+            'xgboost': xgboost.__version__, 'cpus': os.cpu_count(), 'args': vars(args)}
+
+
+def compare(results, previous, tolerance=1.25, min_seconds=0.5):
+    """Ratio of seconds and peak rss against a previous run, regression when a ratio is over tolerance"""
+    before = pd.DataFrame(previous['results']).set_index(['rows', 'stage'])
+    after = pd.DataFrame(results).set_index(['rows', 'stage'])
+    table = after[['seconds', 'peak_rss_mb']].join(before[['seconds', 'peak_rss_mb']], rsuffix='_before',
+                                                   how='inner')
+    table['time_ratio'] = table['seconds'] / table['seconds_before']
+    table['memory_ratio'] = table['peak_rss_mb'] / table['peak_rss_mb_before']
+    # short stages are mostly noise
+    timed = table[['seconds', 'seconds_before']].max(axis=1) >= min_seconds
+    table['regression'] = (timed & (table['time_ratio'] > tolerance)) | (table['memory_ratio'] > tolerance)
+    return table.reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH, help='sample the synthetic data is profiled on')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--data-dir', default=None, help='keep the synthetic csvs here and reuse them')
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=[100],
+                        help='n_estimators of the grid (PARAM_GRID has 500 1000)')
+    parser.add_argument('--max-search-rows', type=int, default=1_000_000,
+                        help='train rows above which the search is replaced by one fit')
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--cv', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', default=None, help='path to write the results')
+    parser.add_argument('--compare', default=None, help='results json of a previous run')
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    parser.add_argument('--min-seconds', type=float, default=0.5)
+    args = parser.parse_args()
+
+    options = {'n_estimators': args.n_estimators, 'max_search_rows': args.max_search_rows, 'n_jobs': args.n_jobs,
+               'cv': args.cv}
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), PYTHONWARNINGS='ignore')
+    profile = profile_sample(args.csv)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        data_dir = args.data_dir or directory
+        os.makedirs(data_dir, exist_ok=True)
+        for n_rows in args.rows:
+            path = os.path.join(data_dir, f'synthetic_{n_rows}_{args.seed}.csv')
+            if not os.path.exists(path):
+                start = time.perf_counter()
+                write_synthetic(path + '.tmp', n_rows, profile, seed=args.seed)
+                os.replace(path + '.tmp', path)
+                results.append({'rows': n_rows, 'stage': 'generate', 'seconds': time.perf_counter() - start})
+            output = subprocess.run([sys.executable, '-c', WORKER, path, json.dumps(options)], env=env,
+                                    check=True, capture_output=True, text=True)
+            stages = json.loads(output.stdout.strip().splitlines()[-1])
+            results.extend({'rows': n_rows, **row} for row in stages)
+            print(f'{n_rows:,} rows done', file=sys.stderr)
+
+    print_table(results)
+    save_json({'metadata': _metadata(args), 'results': results}, args.json)
+    if args.compare:
+        with open(args.compare) as f:
+            table = compare(results, json.load(f), tolerance=args.tolerance, min_seconds=args.min_seconds)
+        print_table(table.to_dict(orient='records'))
+        if table['regression'].any():
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Startup budget check for the scoring path
+
+Imports ds_score (and loads --model if given) in a fresh python process and fails (exit code 1)
+if the import + load time or the resident memory is over budget, or if any of the training /
+plotting libraries got imported along the way. Time is the best of --repeat runs.
+tests/test_startup.py runs the same check under pytest.
+
+    python -m benchmarks.check_startup --model <ds_artifact directory>
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks._common import print_table
+
+# none of these are needed to load an artifact and score
+FORBIDDEN = ['sklearn', 'xgboost', 'scipy', 'matplotlib', 'seaborn', 'joblib']
+MAX_SECONDS = 1.5
+MAX_RSS_MB = 150
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, resource, sys, time
+start = time.perf_counter()
+import ds_score
+if sys.argv[1]:
+    ds_score.load_model(sys.argv[1])
+seconds = time.perf_counter() - start
+try:
+    # peak of this process only, ru_maxrss can start from the parent's rss
+    rss_mb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmHWM')) / 1024
+except (OSError, StopIteration):
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({'seconds': seconds, 'rss_mb': rss_mb,
+                  'modules': sorted({name.split('.')[0] for name in sys.modules})}))
+'''
+
+
+def probe(model):
+    """Import time, peak rss and imported top level modules of ds_score (+ loading model) in a fresh process"""
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONWARNINGS='ignore')
+    output = subprocess.run([sys.executable, '-c', PROBE, model or ''], env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=None, help='ds_artifact directory (or pickle) to load as well')
+    parser.add_argument('--max-seconds', type=float, default=MAX_SECONDS)
+    parser.add_argument('--max-rss-mb', type=float, default=MAX_RSS_MB)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    runs = [probe(args.model) for _ in range(args.repeat)]
+    seconds = min(run['seconds'] for run in runs)
+    rss_mb = max(run['rss_mb'] for run in runs)
+    imported = sorted(set(FORBIDDEN) & set(runs[0]['modules']))
+    print_table([{'check': 'import + load seconds', 'value': seconds, 'budget': args.max_seconds},
+                 {'check': 'peak rss mb', 'value': rss_mb, 'budget': args.max_rss_mb}])
+
+    failures = []
+    if seconds > args.max_seconds:
+        failures.append(f'import + load took {seconds:.2f}s, budget is {args.max_seconds}s')
+    if rss_mb > args.max_rss_mb:
+        failures.append(f'peak rss is {rss_mb:.0f}MB, budget is {args.max_rss_mb}MB')
+    if imported:
+        failures.append(f'scoring path imported {", ".join(imported)}')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Synthetic records with the schema and distributions of the sample csv, at any number of rows
+
+    python -m benchmarks.synthetic --csv <sample csv> --rows 10000000 --output synthetic.csv
+
+The sample is profiled per class of the response (IncomeLabel):
+  * the value frequencies of every column as read from the raw csv - categories keep their leading
+    space and '?', numerics their empty cells, so the missing rates and the raw format are the sample's
+  * the share of '>60K' rows (--positive-rate overrides it, the exercise data has about 10%)
+Rows draw their class first and then every column from its frequencies in that class, so the
+marginal distributions and the per class differences the model learns from are kept, the
+correlations between features within a class are not. Numerics only take values seen in the sample.
+The csv is written in chunks of --chunksize rows (memory stays flat at 10^7 rows) and the same
+--seed and --chunksize give the same file.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from ds_columns import POSITIVE_LABEL, TARGET
+from ds_data import DATA_PATH
+
+
+def profile_sample(path=DATA_PATH, target=TARGET, positive_label=POSITIVE_LABEL):
+    """Per class value frequencies of every column of the raw csv at path"""
+    raw = pd.read_csv(path)
+    positive = raw[target].astype(str).str.strip() == positive_label
+    profile = {'columns': list(raw.columns), 'dtypes': {column: raw[column].dtype for column in raw.columns},
+               'positive_rate': float(positive.mean()), 'classes': {}}
+    for label, rows in ((True, raw[positive]), (False, raw[~positive])):
+        columns = {}
+        for column in raw.columns:
+            # NaN (empty cells) is kept as a value so its frequency is the missing rate
+            counts = rows[column].value_counts(dropna=False, sort=False)
+            columns[column] = (counts.index.to_numpy(dtype=object), (counts / counts.sum()).to_numpy())
+        profile['classes'][label] = columns
+    return profile
+
+
+def generate(profile, n_rows, rng, positive_rate=None):
+    """n_rows synthetic raw records (same columns and dtypes as the profiled csv)"""
+    positive_rate = profile['positive_rate'] if positive_rate is None else positive_rate
+    positive = rng.random(n_rows) < positive_rate
+    data = {}
+    for column in profile['columns']:
+        values = np.empty(n_rows, dtype=object)
+        for label, rows in ((True, positive), (False, ~positive)):
+            uniques, p = profile['classes'][label][column]
+            values[rows] = uniques[rng.choice(len(uniques), size=int(rows.sum()), p=p)]
+        dtype = profile['dtypes'][column]
+        # int columns with missing cells are read as float, object/str columns stay as drawn
+        data[column] = values.astype(dtype) if pd.api.types.is_numeric_dtype(dtype) else values
+    return pd.DataFrame(data)
+
+
+def write_synthetic(path, n_rows, profile, chunksize=1_000_000, seed=42, positive_rate=None):
+    """Write n_rows synthetic records to the csv at path, chunk by chunk"""
+    # one child seed per chunk so a chunk does not depend on how many rows came before it
+    seeds = np.random.SeedSequence(seed).spawn(max(1, -(-n_rows // chunksize)))
+    for i, start in enumerate(range(0, n_rows, chunksize)):
+        chunk = generate(profile, min(chunksize, n_rows - start), np.random.default_rng(seeds[i]), positive_rate)
+        chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', default=DATA_PATH, help='sample to profile')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--positive-rate', type=float, default=None, help="share of '>60K', default the sample's")
+    parser.add_argument('--chunksize', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    write_synthetic(args.output, args.rows, profile_sample(args.csv), chunksize=args.chunksize, seed=args.seed,
+                    positive_rate=args.positive_rate)
+    print(f'{args.rows:,} rows written to {args.output} in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -29,6 +29,8 @@ Objective : To build a binary classification model to identify the individuals w
 !pip install catboost
 !pip install scikit-optimize
 import pandas as pd
+from ds_data import load_data
+from ds_preprocess import CategoricalCleaner
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
@@ -47,7 +49,9 @@ from sklearn.metrics import accuracy_score, precision_score, recall_score, roc_a
 
 #Define the file path
 file_path = '/content/data science exercise - sample data.csv'
-df = pd.read_csv(file_path)
+# load_data strips the strings, treats '?' as NaN, stores strings as category and downcasts numerics
+# (the raw file has a leading space in all strings and '?' for unknown values)
+df = load_data(file_path)
 
 #View few records from the file
 df.head()
@@ -65,7 +69,7 @@ df.info()
 
 df.describe()
 
-df.describe(include=['object'])
+df.describe(include=['category'])
 
 """**Initial observations**
 1. Based on un uniform count values across the fields, we can interpret that the data is not complete for all individuals and we could expect Nulls (for ex Education shows count as 27207 implying that 260 records are NaN)
@@ -89,18 +93,12 @@ for column in df.select_dtypes(include=['object', 'category']).columns:
     unique_values = df[column].unique()
     print(f"Unique values in '{column}': \n {unique_values} \n")
 
-#Observing NaN, '?' in columns and also observing a single space in all strings. Will fix these in subsequent steps
+#In the raw file we observed NaN, '?' in columns and also a single space in all strings. load_data already fixes these
 
 #Check for volume of missing/Null values
 df[df.isnull().any(axis=1)]
 
-#Observing few '?' Let us Convert '?' to Null as well - this would be taken care while loading the data for the final model
-# Also let us make sure there is no leading/trailing spaces in all string fields - this should also be addressed in the final code
-df = df.applymap(lambda x: str(x).strip() if isinstance(x, str) else x)
-df.replace('?', np.nan, inplace=True)
-
-#Let us check the total null count again
-df[df.isnull().any(axis=1)]
+#'?' is converted to Null and leading/trailing spaces are removed by load_data - same loader is used for the final model
 
 #The total incomplete records are ~4589, which is approx 17% of the data provided
 #As it is not advisable to ignore this volume, we will work on imputation for select fields based on feature importance
@@ -116,7 +114,7 @@ defaulted to Hs-grad, which is not right'''
 
 knn_imputer = KNNImputer(n_neighbors=5)
 # Apply KNN imputer to numerical data
-numerical_data = df.select_dtypes(include=['float64', 'int64'])
+numerical_data = df.select_dtypes(include=[np.number])
 data_imputed = knn_imputer.fit_transform(numerical_data)
 
 # Convert the imputed data back to a DataFrame
@@ -124,24 +122,19 @@ data_imputed_df = pd.DataFrame(data_imputed, columns=numerical_data.columns)
 
 # Encode categorical columns
 #Initally used label encoding, but during model performance it looked like one hot encoding
-df_cat = df.select_dtypes(include=['object'])
-label_encoders = {}
-for column in df_cat.columns:
-    le = LabelEncoder()
-    non_null_indices = df_cat[column].notna()
-    df_cat.loc[non_null_indices, column] = le.fit_transform(df_cat.loc[non_null_indices, column].astype(str))
-    label_encoders[column] = le
+# CategoricalCleaner integer encodes all the string columns in one pass per column (NaN stays NaN for the imputer)
+df_cat = df.select_dtypes(include=['category']).drop(columns=['IncomeLabel'])
+label_encoder = CategoricalCleaner(encode=True)
+df_cat = label_encoder.fit_transform(df_cat)
 
-label_encoders
+label_encoder.categories_
 
 # Apply KNN Imputer
 knn_imputer = KNNImputer(n_neighbors=5)
 data_cat_imputed = knn_imputer.fit_transform(df_cat)
 
 # Decode back to categorical
-data_cat_imputed_df = pd.DataFrame(data_cat_imputed, columns=df_cat.columns)
-for column in df_cat.columns:
-    data_cat_imputed_df[column] = label_encoders[column].inverse_transform(data_cat_imputed_df[column].round().astype(int))
+data_cat_imputed_df = label_encoder.inverse_transform(pd.DataFrame(data_cat_imputed, columns=df_cat.columns)).astype(object)
 
 data_cat_imputed_df.head(20)
 
@@ -176,50 +169,36 @@ df_imputed_final.info()
 
 # Let us see the class distribution acoss Gender, Education, workclass and
 
-def annotate_countplot(ax, data, column, hue):
-    total = len(data)
-    for p in ax.patches:
-        height = p.get_height()
-        ax.annotate(f'{100 * height / total:.2f}%',
-                    (p.get_x() + p.get_width() / 2., height),
-                    ha = 'center', va = 'center',
-                    fontsize = 10, color = 'black',
-                    xytext = (0, 10),
-                    textcoords = 'offset points')
+# The plots are drawn from aggregates computed in one chunked pass over the file (ds_eda), so the same
+# figures can be regenerated on much larger extracts. Missing values show as their own '(missing)' category
+# instead of the KNN imputed ones
+from ds_eda import compute_aggregates, plot_counts, plot_density, plot_histogram, plot_sample_pairs
+eda = compute_aggregates(file_path, pairs=[('Age', 'HoursWorkWeekly'), ('EducationYears', 'CapitalGain')],
+                         sample_per_class=2000)
 
 fig, axes = plt.subplots(2, 2, figsize=(20, 20))
-data = df_imputed_final
-# Visualization 1: Income vs. Gender
-ax1 = sns.countplot(data=data, x='Gender', hue='IncomeLabel', ax=axes[0, 0])
-axes[0, 0].set_title('Income vs. Gender')
-axes[0, 0].set_xlabel('Gender')
-axes[0, 0].set_ylabel('Count')
-annotate_countplot(ax1, data, 'Gender', 'IncomeLabel')
+# Visualization 1: Income vs. Gender (bars annotated with the % of all records)
+plot_counts(eda, 'Gender', axes[0, 0])
 
 # Visualization 2: Income vs. Education Level
-ax2 = sns.countplot(data=data, x='Education', hue='IncomeLabel', order=data['Education'].value_counts().index, ax=axes[0, 1])
-axes[0, 1].set_title('Income vs. Education Level')
-axes[0, 1].set_xlabel('Education Level')
-axes[0, 1].set_ylabel('Count')
+plot_counts(eda, 'Education', axes[0, 1])
 axes[0, 1].tick_params(axis='x', rotation=90)
-annotate_countplot(ax2, data, 'Education', 'IncomeLabel')
 
-# Visualization 3: Income vs. Hours per Week (boxplot does not directly show percentages, but we can add some context)
-sns.boxplot(data=data, x='IncomeLabel', y='HoursWorkWeekly', ax=axes[1, 0])
-axes[1, 0].set_title('Income vs. Hours per Week')
-axes[1, 0].set_xlabel('Income Label')
-axes[1, 0].set_ylabel('Hours per Week')
+# Visualization 3: Income vs. Hours per Week (per class histograms instead of the boxplot, quartiles below)
+plot_histogram(eda, 'HoursWorkWeekly', axes[1, 0], stacked=False)
 
 # Visualization 4: Income vs. Workclass
-ax4 = sns.countplot(data=data, x='WorkClass', hue='IncomeLabel', order=data['WorkClass'].value_counts().index, ax=axes[1, 1])
-axes[1, 1].set_title('Income vs. Workclass')
-axes[1, 1].set_xlabel('Workclass')
-axes[1, 1].set_ylabel('Count')
+plot_counts(eda, 'WorkClass', axes[1, 1])
 axes[1, 1].tick_params(axis='x', rotation=45)
-annotate_countplot(ax4, data, 'WorkClass', 'IncomeLabel')
 plt.tight_layout()
 plt.show()
 
+eda.quantiles('HoursWorkWeekly')
+
+# Rate of >60K per group
+for column in ['Gender', 'Education', 'WorkClass', 'Occupation', 'Race']:
+    print(eda.rates(column), '\n')
+
 """From above plots, we can observe that
 
 1.   Gender Vs Income plot
@@ -244,7 +223,15 @@ plt.show()
 
 """
 
-sns.pairplot(df_imputed_final, hue='IncomeLabel', size=2.5);
+# pairplot of a stratified sample (2000 records per class) instead of every record
+plot_sample_pairs(eda, height=2.5);
+
+# binned densities of all the records for the pairs that matter most
+fig, axes = plt.subplots(1, 2, figsize=(16, 6))
+plot_density(eda, 'Age', 'HoursWorkWeekly', axes[0])
+plot_density(eda, 'EducationYears', 'CapitalGain', axes[1])
+plt.tight_layout()
+plt.show()
 
 """Below are the observations from pair plot
 1. Age shows right skewed distribution. It indicates that most of the work force are in early years with start of range at 17 upto 90.
@@ -255,41 +242,19 @@ sns.pairplot(df_imputed_final, hue='IncomeLabel', size=2.5);
 6. Caploss doesnt seem to have correlatin with Income
 """
 
-plt.figure(figsize=(16, 12))
+fig, axes = plt.subplots(2, 2, figsize=(16, 12))
 
 # Plot income distribution by marital status
-plt.subplot(2,2,1)
-sns.countplot(y='MaritalStatus', hue='IncomeLabel', data=data, order=data['MaritalStatus'].value_counts().index)
-plt.title('Income Distribution by Marital Status')
-plt.xlabel('Count')
-plt.ylabel('Marital Status')
-plt.legend(title='Income Label', loc='upper right')
-
+plot_counts(eda, 'MaritalStatus', axes[0, 0], horizontal=True)
 
 # Plot income distribution by occupation
-plt.subplot(2,2,2)
-sns.countplot(y='Occupation', hue='IncomeLabel', data=data, order=data['Occupation'].value_counts().index)
-plt.title('Income Distribution by Occupation')
-plt.xlabel('Count')
-plt.ylabel('Occupation')
-plt.legend(title='Income Label', loc='upper right')
-
+plot_counts(eda, 'Occupation', axes[0, 1], horizontal=True)
 
 # Plot income distribution by hours worked per week
-plt.subplot(2,2,3)
-sns.histplot(data=data, x='HoursWorkWeekly', hue='IncomeLabel', multiple='stack', kde=True)
-plt.title('Income Distribution by Hours Per Week')
-plt.xlabel('Hours Per Week')
-plt.ylabel('Count')
-plt.legend(title='Income Label', loc='upper right')
+plot_histogram(eda, 'HoursWorkWeekly', axes[1, 0])
 
 # Plot income distribution by race
-plt.subplot(2,2,4)
-sns.countplot(y='Race', hue='IncomeLabel', data=data, order=data['Race'].value_counts().index)
-plt.title('Income Distribution by Race')
-plt.xlabel('Count')
-plt.ylabel('Race')
-plt.legend(title='Income Label', loc='upper right')
+plot_counts(eda, 'Race', axes[1, 1], horizontal=True)
 
 plt.tight_layout()
 plt.show()
@@ -333,8 +298,8 @@ plt.show()
 
 #Feature importace check for categorical variables
 df['IncomeLabel'] = df['IncomeLabel'].astype('category')
-X = df[df.select_dtypes(include=['object']).columns]
-y = df[df.select_dtypes(include=['category']).columns]
+X = df[df.select_dtypes(include=['category']).columns.drop('IncomeLabel')]
+y = df[['IncomeLabel']]
 
 # use label encoder for feature importance check
 df_chi = df_imputed_final
@@ -377,6 +342,17 @@ sorted_features = target_correlations.abs().sort_values(ascending=False)
 print("Features ordered by importance based on correlation with target variable:")
 print(sorted_features)
 
+# The same correlation and a chi2 test per categorical column (on the contingency counts, no label encoding)
+# from one streaming pass over the file - DS_Model_Final.py keeps the columns dropped above by default and recomputes
+#   the selection this way (on its train rows only) when select_features = True
+from ds_relevance import feature_relevance
+relevance = feature_relevance(file_path)
+relevance.scores()
+
+keep_columns, drop_columns = relevance.select()
+print("Kept:", keep_columns)
+print("Dropped:", drop_columns)
+
 """# Model Building
 
 ##Train-Test Split
@@ -476,10 +452,14 @@ models = {
 
 
 
-# Evaluate each model
-for name, model in models.items():
-    print(f"Evaluating {name}...")
-    model_prediction(model, X_train, y_train, X_test, y_test)
+# Evaluate the models in parallel processes (ds_compare.py) - model_prediction above still works for a single model
+# a model running for more than 10 minutes is stopped (SVC with probability=True can stall the whole run)
+# fit/predict time, latency, memory and the metrics are saved in one table and the plots are made from it afterwards
+from ds_compare import compare_models, plot_comparison
+comparison = compare_models(models, X_train, y_train.astype(int), X_test, y_test.astype(int), timeout=600,
+                            results_path='/content/model_comparison.csv')
+print(comparison.to_string(index=False))
+plot_comparison(comparison)
 
 # Based on above XGBclassifier, LightGBM classifier and CatBoostClassifiers were chosen for further experiment
 # Hyper param tuning was done for these using gridsearchcv and finally XGB classifier was chosen for final model
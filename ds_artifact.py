@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Versioned, memory mappable model artifact
+
+    python ds_artifact.py --pickle xgb_pipeline.pkl --out xgb_artifact
+
+The artifact is a directory with
+  * manifest.json - format version, columns, category lookups and scalar parameters
+  * one .npy file per array (scaler vectors, imputer training data, packed trees)
+  * model.ubj - the booster in native XGBoost format, kept so the model can be reloaded
+    in xgboost itself whatever sklearn/xgboost versions are installed
+
+load_artifact returns the ds_compile.CompiledPredictor with the arrays memory mapped read only,
+so worker processes loading the same artifact share one copy of the pages (page cache) and start
+without unpickling the sklearn object graph. xgboost is not needed to load or score, sklearn
+only once a row with a missing numeric value has to be imputed.
+See benchmarks/bench_artifact.py for load time and memory against the joblib pickle.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+TREE_ARRAYS = ['roots', 'left', 'right', 'feature', 'threshold', 'default_left', 'is_leaf', 'cat_row', 'cat_right']
+
+
+def save_artifact(model, directory):
+    """Write the fitted pipeline (see ds_compile.compile_pipeline for the supported ones) to directory"""
+    import sklearn
+    import xgboost
+    from ds_compile import compile_pipeline
+
+    compiled = compile_pipeline(model)
+    os.makedirs(directory, exist_ok=True)
+    arrays = {f'tree_{name}': compiled.trees[name] for name in TREE_ARRAYS}
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        # informational only, loading does not depend on them
+        'trained_with': {'sklearn': sklearn.__version__, 'xgboost': xgboost.__version__},
+        'numerical_features': compiled.numerical_features,
+        'categorical_features': compiled.categorical_features,
+        'encoding': compiled.encoding,
+        'sparse': bool(compiled.sparse),
+        'one_hot': bool(compiled.one_hot),
+        'base_margin': float(compiled.trees['base_margin']),
+        'n_features': compiled.trees['n_features'],
+        'imputer': None,
+    }
+    if compiled.imputer is not None:
+        imputer = compiled.imputer
+        imputer._densify_fit()
+        arrays['imputer_fit_X'] = np.asarray(imputer._fit_X, dtype=np.float64)
+        arrays['imputer_mask'] = imputer._mask_fit_X
+        arrays['imputer_valid_mask'] = imputer._valid_mask
+        # scaler vectors cover the imputer output (columns with no value in fit are dropped)
+        n_scaled = int(imputer._valid_mask.sum())
+        arrays['scaler_mean'] = np.broadcast_to(compiled.mean_, (n_scaled,)).astype(np.float64)
+        arrays['scaler_scale'] = np.broadcast_to(compiled.scale_, (n_scaled,)).astype(np.float64)
+        manifest['imputer'] = {key: getattr(imputer, key) for key in ('n_neighbors', 'weights', 'leaf_size', 'chunk_size')}
+
+    for name, values in arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(values))
+    manifest['arrays'] = sorted(arrays)
+    model.steps[-1][1].get_booster().save_model(os.path.join(directory, 'model.ubj'))
+    # manifest last, a directory without one is an incomplete export
+    with open(os.path.join(directory, MANIFEST + '.tmp'), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(os.path.join(directory, MANIFEST + '.tmp'), os.path.join(directory, MANIFEST))
+    return directory
+
+
+def load_artifact(directory, mmap=True, chunk_size=8192):
+    """CompiledPredictor from an artifact directory, arrays memory mapped unless mmap=False"""
+    from ds_compile import CompiledPredictor
+
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest['format_version'] != FORMAT_VERSION:
+        raise ValueError(f"Artifact format {manifest['format_version']} is not supported (expected {FORMAT_VERSION})")
+    arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r' if mmap else None)
+              for name in manifest['arrays']}
+
+    trees = {name: arrays[f'tree_{name}'] for name in TREE_ARRAYS}
+    trees['base_margin'] = manifest['base_margin']
+    trees['n_features'] = manifest['n_features']
+    encoding = {column: tuple(values) for column, values in manifest['encoding'].items()}
+    # artifacts written before 'one_hot' was recorded had the numeric imputer exactly when one hot encoded
+    one_hot = manifest.get('one_hot', manifest['imputer'] is not None)
+    compiled = CompiledPredictor(manifest['numerical_features'], manifest['categorical_features'], encoding, trees,
+                                 sparse=manifest['sparse'], one_hot=one_hot, chunk_size=chunk_size)
+    if manifest['imputer'] is not None:
+        compiled.imputer = _MappedImputer(manifest['imputer'], arrays)
+        compiled.mean_ = arrays['scaler_mean']
+        compiled.scale_ = arrays['scaler_scale']
+    return compiled
+
+
+class _MappedImputer:
+    """IndexedKNNImputer over the memory mapped training data, built on the first row with a missing value
+
+    Importing sklearn costs more than the rest of the load, complete rows only need the column selection.
+    """
+
+    def __init__(self, params, arrays):
+        self.params = params
+        self.arrays = arrays
+        self._imputer = None
+
+    def transform(self, X):
+        if not np.isnan(X).any():
+            return X[:, self.arrays['imputer_valid_mask']]
+        if self._imputer is None:
+            from ds_impute import IndexedKNNImputer
+            # fitted state set directly so the training data stays memory mapped (fit would copy it)
+            imputer = IndexedKNNImputer(**self.params)
+            imputer._fit_X = self.arrays['imputer_fit_X']
+            imputer._mask_fit_X = self.arrays['imputer_mask']
+            imputer._valid_mask = self.arrays['imputer_valid_mask']
+            imputer.n_features_in_ = imputer._fit_X.shape[1]
+            imputer._indexes = {}
+            self._imputer = imputer
+        return self._imputer.transform(X)
+
+
+def load_booster(directory):
+    """The native XGBoost booster of an artifact (needs xgboost)"""
+    import xgboost
+    booster = xgboost.Booster()
+    booster.load_model(os.path.join(directory, 'model.ubj'))
+    return booster
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the saved pipeline as a memory mappable artifact')
+    parser.add_argument('--pickle', default='/content/xgb_pipeline.pkl')
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args(argv)
+
+    import joblib
+    save_artifact(joblib.load(args.pickle), args.out)
+    print(f'Artifact written to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Prediction cache for repeated records, in front of predict_proba of the saved pipeline or an artifact
+
+    model = PredictionCache(load_model(path), version=model_version(path), max_entries=1_000_000)
+    model.predict_proba(X)    # only the rows not seen before go to the model
+    model.stats()             # hits, misses, hit rate, lookup/predict time
+
+  * the key of a row is the tuple of its cleaned feature values - the model's input columns only, strings
+    stripped with '?' as missing and numerics as float, so raw and cleaned records share entries. The dict
+    compares the tuples on lookup, so rows with the same hash (hash(-1.0) == hash(-2.0)) never share one
+  * rows missing from the cache are deduplicated and scored in one predict_proba call
+  * entries are kept in LRU order up to max_entries (a few hundred bytes each, the key tuple holds the row)
+  * the cache belongs to one model version (model_version(path) hashes the pickle or the artifact files),
+    set_model with a different version empties it
+Used by ds_score.py (--cache-size, one cache per worker) and ds_serve.py (--cache-size).
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from ds_data import NA_VALUES, clean_categorical, file_hash
+
+# up to this many rows the keys are built cell by cell instead of with pandas
+SMALL_BATCH = 256
+
+
+def model_version(path):
+    """Content hash of a pickle or of all the files of an artifact directory"""
+    if not os.path.isdir(path):
+        return file_hash(path)
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(path)):
+        if not name.endswith('.tmp'):
+            digest.update(name.encode())
+            digest.update(file_hash(os.path.join(path, name)).encode())
+    return digest.hexdigest()
+
+
+def _clean_number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+
+def _model_columns(model):
+    # input columns and which of them are strings, for the pipeline (cleaner step) and CompiledPredictor
+    if hasattr(model, 'categorical_features') and hasattr(model, 'numerical_features'):
+        return list(model.numerical_features) + list(model.categorical_features), set(model.categorical_features)
+    columns = getattr(model, 'feature_names_in_', None)
+    if columns is None:
+        return None, set()
+    cleaner = getattr(model, 'named_steps', {}).get('cleaner')
+    return list(columns), set(getattr(cleaner, 'columns', None) or getattr(cleaner, 'categories_', {}))
+
+
+class PredictionCache:
+    """LRU cache of the positive class probability keyed by the cleaned feature row"""
+
+    def __init__(self, model, version=None, max_entries=1_000_000, na_values=tuple(NA_VALUES)):
+        self.max_entries = max_entries
+        self.na_values = na_values
+        self._lock = threading.Lock()
+        self.set_model(model, version)
+
+    def set_model(self, model, version=None):
+        """Switch to model, the entries are dropped unless version is the current one"""
+        with self._lock:
+            if version is None or version != getattr(self, 'version', None):
+                self._reset()
+            self.model = model
+            self.version = version
+            self._columns, self._categorical = _model_columns(model)
+
+    def keys(self, X):
+        """Key per row of X, the tuple of its cleaned values (None for missing)"""
+        columns = self._columns if self._columns is not None else sorted(X.columns)
+        cleaned = []
+        for column in columns:
+            if column not in X.columns:
+                cleaned.append([None] * len(X))
+                continue
+            values = X[column]
+            if len(X) <= SMALL_BATCH:
+                # pandas per call overhead dominates for a few rows (online requests), same values cell by cell
+                clean = self._clean_string if self._is_string(column, values) else _clean_number
+                cleaned.append([clean(value) for value in values.tolist()])
+            elif self._is_string(column, values):
+                values = clean_categorical(values, list(self.na_values))
+                # code -1 (missing) picks the appended None
+                lookup = np.array(values.cat.categories.tolist() + [None], dtype=object)
+                cleaned.append(lookup[values.cat.codes.to_numpy()].tolist())
+            else:
+                numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+                objects = numbers.astype(object)
+                objects[np.isnan(numbers)] = None
+                cleaned.append(objects.tolist())
+        return list(zip(*cleaned))
+
+    def _is_string(self, column, values):
+        if self._columns is None:
+            return not pd.api.types.is_numeric_dtype(values)
+        return column in self._categorical
+
+    def _clean_string(self, value):
+        if value is None or pd.isna(value):
+            return None
+        value = str(value).strip()
+        return None if value in self.na_values else value
+
+    def predict_proba(self, X):
+        start = time.perf_counter()
+        keys = self.keys(X)
+        proba = np.empty(len(keys))
+        found = np.zeros(len(keys), dtype=bool)
+        with self._lock:
+            entries = self._entries
+            for i, key in enumerate(keys):
+                value = entries.get(key)
+                if value is not None:
+                    entries.move_to_end(key)
+                    proba[i] = value
+                    found[i] = True
+        lookup = time.perf_counter() - start
+
+        missing = np.flatnonzero(~found)
+        n_scored = 0
+        if len(missing):
+            # one model call for the distinct missing rows
+            distinct, first, inverse = {}, [], []
+            for i in missing.tolist():
+                slot = distinct.setdefault(keys[i], len(first))
+                if slot == len(first):
+                    first.append(i)
+                inverse.append(slot)
+            start = time.perf_counter()
+            scored = self.model.predict_proba(X.iloc[first])[:, 1]
+            predict = time.perf_counter() - start
+            n_scored = len(first)
+            proba[missing] = scored[inverse]
+            with self._lock:
+                self.predict_seconds += predict
+                self.predict_calls += 1
+                for key, value in zip(distinct, scored.tolist()):
+                    self._entries[key] = value
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        with self._lock:
+            # repeats within X are hits as well, misses are the rows the model scored
+            self.hits += len(keys) - n_scored
+            self.misses += n_scored
+            self.lookup_seconds += lookup
+        return np.column_stack([1 - proba, proba])
+
+    def predict(self, X, threshold=0.5):
+        return (self.predict_proba(X)[:, 1] >= threshold).astype(int)
+
+    def stats(self):
+        with self._lock:
+            rows = self.hits + self.misses
+            return {'cache_entries': len(self._entries), 'cache_hits': self.hits, 'cache_misses': self.misses,
+                    'cache_hit_rate': self.hits / rows if rows else 0.0, 'cache_evictions': self.evictions,
+                    'cache_lookup_ms': self.lookup_seconds * 1000, 'cache_predict_ms': self.predict_seconds * 1000,
+                    'cache_predict_calls': self.predict_calls}
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self._entries = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+        self.lookup_seconds = self.predict_seconds = 0.0
+        self.predict_calls = 0
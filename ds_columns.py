@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""Column decisions from DS_Analysis.py (target and dropped features)
+
+Kept free of sklearn so the scoring path (ds_score.py, ds_serve.py) can import it cheaply.
+ds_preprocess re-exports everything here.
+"""
+
+import pandas as pd
+
+TARGET = 'IncomeLabel'
+POSITIVE_LABEL = '>60K'
+# dropped based on the feature importance findings in DS_Analysis.py
+DROP_COLUMNS = ['Country', 'LotSize', 'Suburban', 'OwnHouse', 'WorkClass']
+
+
+def prepare_features(data, drop_columns=None):
+    # drop the target (if present) and the low importance columns (DROP_COLUMNS by default)
+    drop_columns = DROP_COLUMNS if drop_columns is None else list(drop_columns)
+    return data.drop(columns=[TARGET] + drop_columns, errors='ignore')
+
+
+def code_target(values, positive_label=POSITIVE_LABEL):
+    # response variable to 0/1, values already coded 0/1 (DS_Analysis.py recodes the label in place) are kept
+    categories = getattr(values, 'cat', None)
+    if pd.api.types.is_numeric_dtype(values) or (categories is not None
+                                                 and pd.api.types.is_numeric_dtype(categories.categories)):
+        return values.astype(int)
+    return (values == positive_label).astype(int)
+
+
+def split_X_y(data, drop_columns=None):
+    # drop the target and low importance columns and code the response variable to 0/1
+    X = prepare_features(data, drop_columns)
+    y = code_target(data[TARGET])
+    return X, y
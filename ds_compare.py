@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Parallel comparison of candidate classifiers (the model selection step of DS_Analysis.py)
+
+    results = compare_models(models, X_train, y_train, X_test, y_test, timeout=600)
+    save_results(results, 'model_comparison.csv')
+    plot_comparison(results)
+
+  * every candidate is fitted in its own process, n_jobs at a time
+  * a candidate still running after timeout seconds is killed and recorded as 'timeout'
+    (SVC(probability=True) can take hours on the full data), one that fails as 'error'
+  * one row per candidate with fit time, batch predict time, single row latency, peak memory of
+    its process, train/test metrics and the confusion counts
+  * plots are made afterwards from the results table (which can be read back from the csv/json)
+"""
+
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from ds_data import peak_rss_mb
+
+# the DS_Analysis.py candidates, (module, class, params) so missing optional libraries only skip their model
+CANDIDATES = {
+    'logisticregression': ('sklearn.linear_model', 'LogisticRegression', {}),
+    'RandomForest': ('sklearn.ensemble', 'RandomForestClassifier', {}),
+    'GradientBoosting': ('sklearn.ensemble', 'GradientBoostingClassifier', {}),
+    'SVC': ('sklearn.svm', 'SVC', {'probability': True}),
+    'KNN': ('sklearn.neighbors', 'KNeighborsClassifier', {}),
+    'NaiveBayes': ('sklearn.naive_bayes', 'GaussianNB', {}),
+    'MLP': ('sklearn.neural_network', 'MLPClassifier', {}),
+    'XGBoost': ('xgboost', 'XGBClassifier', {}),
+    'LightGBM': ('lightgbm', 'LGBMClassifier', {'verbose': -1}),
+    'CatBoost': ('catboost', 'CatBoostClassifier', {'verbose': False}),
+}
+
+
+def candidate_models(names=None):
+    """Estimators for the CANDIDATES (all by default), skipping the ones whose library is not installed"""
+    import importlib
+
+    models = {}
+    for name in names or CANDIDATES:
+        module, cls, params = CANDIDATES[name]
+        try:
+            models[name] = getattr(importlib.import_module(module), cls)(**params)
+        except ImportError:
+            print(f'{name} skipped, {module} is not installed')
+    return models
+
+
+def _evaluate(model, X_train, y_train, X_test, y_test, single_rows):
+    from sklearn.base import clone
+    from sklearn.metrics import accuracy_score, confusion_matrix, f1_score, precision_score, recall_score, roc_auc_score
+
+    model = clone(model)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = model.predict_proba(X_test)[:, 1] if hasattr(model, 'predict_proba') else model.decision_function(X_test)
+    y_pred = model.predict(X_test)
+    predict_s = time.perf_counter() - start
+
+    latencies = []
+    for i in range(min(single_rows, len(X_test))):
+        row = X_test.iloc[[i]] if hasattr(X_test, 'iloc') else X_test[i:i + 1]
+        start = time.perf_counter()
+        model.predict(row)
+        latencies.append(time.perf_counter() - start)
+
+    tn, fp, fn, tp = confusion_matrix(y_test, y_pred, labels=[0, 1]).ravel()
+    return {
+        'status': 'ok',
+        'fit_s': fit_s,
+        'predict_s': predict_s,
+        'row_latency_ms': float(np.median(latencies) * 1000) if latencies else np.nan,
+        'peak_rss_mb': peak_rss_mb(),
+        'train_accuracy': accuracy_score(y_train, model.predict(X_train)),
+        'test_accuracy': accuracy_score(y_test, y_pred),
+        'precision': precision_score(y_test, y_pred, zero_division=0),
+        'recall': recall_score(y_test, y_pred),
+        'f1': f1_score(y_test, y_pred),
+        'roc_auc': roc_auc_score(y_test, scores),
+        'tn': int(tn), 'fp': int(fp), 'fn': int(fn), 'tp': int(tp),
+    }
+
+
+def _run_candidate(conn, model, data, single_rows):
+    try:
+        result = _evaluate(model, *data, single_rows)
+    except Exception as exc:
+        result = {'status': 'error', 'error': repr(exc), 'peak_rss_mb': peak_rss_mb()}
+    conn.send(result)
+    conn.close()
+
+
+def compare_models(models, X_train, y_train, X_test, y_test, n_jobs=None, timeout=600, single_rows=100,
+                   results_path=None, verbose=True):
+    """Fit and evaluate every model in models (name -> estimator) in parallel processes
+
+    Returns the results table (one row per model, in the order of models), also written to
+    results_path (.csv or .json) if given.
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    # fork shares the data with the workers without pickling it where available
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    data = (X_train, y_train, X_test, y_test)
+    pending, running, results = list(models.items()), {}, {}
+
+    while pending or running:
+        while pending and len(running) < n_jobs:
+            name, model = pending.pop(0)
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_run_candidate, args=(sender, model, data, single_rows), daemon=True)
+            process.start()
+            sender.close()
+            running[name] = (process, receiver, time.perf_counter())
+
+        for name, (process, receiver, start) in list(running.items()):
+            elapsed = time.perf_counter() - start
+            if receiver.poll():
+                results[name] = receiver.recv()
+                process.join()
+            elif not process.is_alive():
+                results[name] = {'status': 'error', 'error': f'worker exited with code {process.exitcode}'}
+            elif elapsed > timeout:
+                process.terminate()
+                process.join()
+                results[name] = {'status': 'timeout'}
+            else:
+                continue
+            results[name]['wall_s'] = elapsed
+            del running[name]
+            if verbose:
+                print(f"{name}: {results[name]['status']} after {elapsed:.1f}s")
+        time.sleep(0.05)
+
+    table = pd.DataFrame([{'model': name, **results[name]} for name in models])
+    if results_path:
+        save_results(table, results_path)
+    return table
+
+
+def save_results(results, path):
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(results.to_dict(orient='records'), f, indent=2, default=float)
+    else:
+        results.to_csv(path, index=False)
+
+
+def load_results(path):
+    return pd.read_json(path) if path.endswith('.json') else pd.read_csv(path)
+
+
+def plot_comparison(results):
+    """Test metrics, fit time and confusion matrices of the finished candidates from a results table"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    done = results[results['status'] == 'ok'].set_index('model')
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
+    done[['recall', 'precision', 'f1', 'roc_auc']].plot.bar(ax=ax1)
+    ax1.set_title('Test metrics')
+    ax1.set_ylim(0, 1)
+    done[['fit_s', 'predict_s']].plot.bar(ax=ax2, logy=True)
+    ax2.set_title('Fit and predict time (s)')
+    plt.tight_layout()
+    plt.show()
+
+    n = len(done)
+    fig, axes = plt.subplots(1, n, figsize=(4 * n, 4), squeeze=False)
+    for ax, (name, row) in zip(axes[0], done.iterrows()):
+        cm = np.array([[row['tn'], row['fp']], [row['fn'], row['tp']]], dtype=int)
+        sns.heatmap(cm, annot=True, fmt='d', cmap='Greens', cbar=False, ax=ax)
+        ax.set_xlabel('Predicted')
+        ax.set_ylabel('Actual')
+        ax.set_title(name)
+    plt.tight_layout()
+    plt.show()
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Array based inference for the fitted final model pipeline
+
+compile_pipeline(best_model) turns the fitted cleaner -> preprocessor -> XGBClassifier pipeline
+into a CompiledPredictor that only does numpy arithmetic and lookups:
+  * the distinct values of each categorical column are looked up in a precomputed dict
+    (cleaned value -> one hot column, or category code for the native preprocessor)
+  * numerics are imputed by the fitted IndexedKNNImputer (a no-op for complete rows) and
+    scaled with the StandardScaler mean/scale vectors
+  * the XGBoost trees are packed into flat node arrays and all trees are walked together,
+    one vectorised step per tree level
+The probabilities match Pipeline.predict_proba to float32 rounding (see benchmarks/bench_compiled.py).
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def pack_trees(booster, n_iterations=None):
+    """Flatten the trees of an XGBoost booster into node arrays
+
+    Node ids are global (tree offset + node id), roots holds the id of each tree's root.
+    Categorical splits keep the categories that go right as a (node, category) boolean table.
+    """
+    model = json.loads(booster.save_raw('json'))
+    learner = model['learner']
+    objective = learner['objective']['name']
+    if objective not in ('binary:logistic', 'binary:logitraw'):
+        raise ValueError(f'Only binary classifiers are supported, got objective {objective!r}')
+    trees = learner['gradient_booster']['model']['trees']
+    if n_iterations is not None:
+        trees = trees[:learner['gradient_booster']['model']['iteration_indptr'][n_iterations]]
+
+    left, right, feature, threshold, default_left, roots = [], [], [], [], [], []
+    cat_nodes, cat_sets = [], []
+    offset = 0
+    for tree in trees:
+        n_nodes = len(tree['left_children'])
+        children_left = np.asarray(tree['left_children'], dtype=np.int64)
+        children_right = np.asarray(tree['right_children'], dtype=np.int64)
+        is_leaf = children_left == -1
+        # leaves point to themselves so finished rows stay put while the others move down
+        own = np.arange(n_nodes) + offset
+        left.append(np.where(is_leaf, own, children_left + offset))
+        right.append(np.where(is_leaf, own, children_right + offset))
+        feature.append(tree['split_indices'])
+        # split_conditions holds the leaf value on leaves
+        threshold.append(tree['split_conditions'])
+        default_left.append(tree['default_left'])
+        roots.append(offset)
+        categories = tree['categories']
+        for node, start, size in zip(tree['categories_nodes'], tree['categories_segments'], tree['categories_sizes']):
+            cat_nodes.append(node + offset)
+            cat_sets.append(categories[start:start + size])
+        offset += n_nodes
+
+    packed = {
+        'roots': np.asarray(roots, dtype=np.int64),
+        'left': np.concatenate(left),
+        'right': np.concatenate(right),
+        'feature': np.concatenate(feature).astype(np.int64),
+        'threshold': np.concatenate(threshold).astype(np.float32),
+        'default_left': np.concatenate(default_left).astype(bool),
+        'cat_row': np.full(offset, -1, dtype=np.int64),
+        'cat_right': np.zeros((len(cat_nodes), max([max(s, default=0) for s in cat_sets], default=0) + 1), dtype=bool),
+    }
+    packed['is_leaf'] = packed['left'] == np.arange(offset)
+    for row, (node, values) in enumerate(zip(cat_nodes, cat_sets)):
+        packed['cat_row'][node] = row
+        packed['cat_right'][row, values] = True
+
+    # stored as '[5.6E-1]' by xgboost >= 3 and as '5.6E-1' before
+    base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+    # the base score is stored as a probability, the trees add to its logit
+    packed['base_margin'] = np.log(base_score / (1 - base_score)) if objective == 'binary:logistic' else base_score
+    packed['n_features'] = int(learner['learner_model_param']['num_feature'])
+    return packed
+
+
+def predict_margin(packed, X):
+    """Sum of the leaf values for every row of X (float32 features, NaN is missing)"""
+    n_rows = X.shape[0]
+    node = np.broadcast_to(packed['roots'], (n_rows, len(packed['roots']))).copy()
+    rows = np.arange(n_rows)[:, None]
+    left, right, feature, threshold = packed['left'], packed['right'], packed['feature'], packed['threshold']
+    has_cats = packed['cat_right'].shape[0] > 0
+    while True:
+        active = ~packed['is_leaf'][node]
+        if not active.any():
+            break
+        values = X[rows, feature[node]]
+        missing = np.isnan(values)
+        # xgboost goes left on value < split, missing values follow the default direction
+        go_left = np.where(missing, packed['default_left'][node], values < threshold[node])
+        if has_cats:
+            cat_row = packed['cat_row'][node]
+            is_cat = (cat_row >= 0) & ~missing
+            if is_cat.any():
+                # listed categories go right, unknown (out of range) categories go left
+                codes = values[is_cat].astype(np.int64)
+                in_range = (codes >= 0) & (codes < packed['cat_right'].shape[1])
+                go_right = np.zeros(len(codes), dtype=bool)
+                go_right[in_range] = packed['cat_right'][cat_row[is_cat][in_range], codes[in_range]]
+                go_left[is_cat] = ~go_right
+        node = np.where(go_left, left[node], right[node])
+    # leaf values summed in float64, xgboost sums in float32 so results differ in the last digits
+    return packed['threshold'][node].sum(axis=1, dtype=np.float64) + packed['base_margin']
+
+
+class CompiledPredictor:
+    """Numpy only replacement for the fitted pipeline's predict_proba/predict
+
+    Built by compile_pipeline, takes the same input frame as the pipeline (extra columns are ignored).
+    chunk_size bounds the rows walked through the trees at once (memory is rows x trees node ids).
+    """
+
+    def __init__(self, numerical_features, categorical_features, encoding, trees, sparse=False, one_hot=False,
+                 chunk_size=8192):
+        self.numerical_features = list(numerical_features)
+        self.categorical_features = list(categorical_features)
+        # per column (value -> feature position, position of unknown values, position of missing values, strip)
+        # position -1 means the value sets no feature
+        self.encoding = encoding
+        self.trees = trees
+        self.sparse = sparse
+        # one hot categories (build_preprocessor) or native category codes (build_native_preprocessor)
+        self.one_hot = one_hot
+        self.chunk_size = chunk_size
+        self.imputer = None
+        self.mean_ = None
+        self.scale_ = None
+
+    def _category_positions(self, values, column):
+        lookup, unknown, missing, strip = self.encoding[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+        # one dict lookup per distinct value, not per row
+        positions = [lookup.get(str(value).strip() if strip else str(value), unknown) for value in uniques]
+        # code -1 (missing) picks the appended missing position
+        return np.append(np.asarray(positions, dtype=np.int64), missing)[codes]
+
+    def transform(self, X):
+        """Feature matrix as the classifier sees it (float32, NaN is missing)"""
+        n_rows = len(X)
+        features = np.full((n_rows, self.trees['n_features']), np.nan, dtype=np.float32)
+        numerics = X[self.numerical_features].to_numpy(dtype=np.float64, na_value=np.nan)
+        if self.imputer is not None:
+            numerics = (self.imputer.transform(numerics) - self.mean_) / self.scale_
+        features[:, :numerics.shape[1]] = numerics
+
+        if not self.one_hot:
+            # native categories - the feature is the category code
+            for i, column in enumerate(self.categorical_features):
+                codes = self._category_positions(X[column], column)
+                features[:, numerics.shape[1] + i] = np.where(codes >= 0, codes, np.nan)
+        else:
+            # dense one hot input has zeros where sparse (CSR) input has missing entries
+            start = numerics.shape[1]
+            if self.sparse:
+                features[features == 0] = np.nan
+            else:
+                features[:, start:] = 0
+            for column in self.categorical_features:
+                positions = self._category_positions(X[column], column)
+                hit = positions >= 0
+                features[np.flatnonzero(hit), positions[hit]] = 1
+        return features
+
+    def predict_proba(self, X):
+        margins = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), self.chunk_size):
+            chunk = X.iloc[start:start + self.chunk_size]
+            margins[start:start + len(chunk)] = predict_margin(self.trees, self.transform(chunk))
+        proba = 1 / (1 + np.exp(-margins))
+        return np.column_stack([1 - proba, proba])
+
+    def predict(self, X, threshold=0.5):
+        return (self.predict_proba(X)[:, 1] >= threshold).astype(int)
+
+
+def _n_iterations(classifier):
+    # models fitted with early stopping predict with the trees up to the best iteration
+    try:
+        return classifier.best_iteration + 1
+    except AttributeError:
+        return None
+
+
+def compile_pipeline(model, chunk_size=8192):
+    """CompiledPredictor for a fitted (cleaner ->) preprocessor -> XGBClassifier pipeline
+
+    The preprocessor is either the ColumnTransformer of build_preprocessor or the
+    NativeCategoricalEncoder of build_native_preprocessor.
+    """
+    # only needed to compile, scoring with the CompiledPredictor imports numpy and pandas only
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
+
+    from ds_preprocess import NativeCategoricalEncoder
+
+    if not isinstance(model, Pipeline):
+        raise ValueError('Expected a fitted sklearn Pipeline')
+    steps = dict(model.steps)
+    cleaner, preprocessor, classifier = steps.get('cleaner'), steps.get('preprocessor'), model.steps[-1][1]
+    trees = pack_trees(classifier.get_booster(), _n_iterations(classifier))
+
+    def encode(column, index, offset, missing):
+        if cleaner is None or column not in cleaner.categories_:
+            return {str(value): offset + i for i, value in enumerate(index)}, -1, missing, False
+        # same as the cleaner: stripped sentinels and values not seen in fit are missing,
+        # values the encoder did not see are ignored
+        positions = pd.Index(index).get_indexer(cleaner.categories_[column])
+        lookup = {value: int(offset + i) if i >= 0 else -1 for value, i in zip(cleaner.categories_[column], positions)}
+        lookup.update({value: missing for value in cleaner.na_values})
+        return lookup, missing, missing, True
+
+    if isinstance(preprocessor, NativeCategoricalEncoder):
+        numerical, categorical = preprocessor.numerical_features, preprocessor.categorical_features
+        encoding = {column: encode(column, preprocessor.categories_[column], 0, -1) for column in categorical}
+        return CompiledPredictor(numerical, categorical, encoding, trees, chunk_size=chunk_size)
+
+    if not isinstance(preprocessor, ColumnTransformer):
+        raise ValueError(f'Unsupported preprocessor {type(preprocessor).__name__}')
+    if [name for name, _, _ in preprocessor.transformers_][:2] != ['num', 'cat']:
+        raise ValueError('Expected the num and cat blocks of build_preprocessor')
+    # a block with no columns (all numerics or all categoricals dropped by the feature selection) is not fitted
+    blocks = {name: (transformer, list(columns)) for name, transformer, columns in preprocessor.transformers_
+              if name in ('num', 'cat') and transformer != 'drop' and len(columns)}
+    numerical, categorical, imputer, scaler, categories_ = [], [], None, None, []
+    if 'num' in blocks:
+        numeric, numerical = blocks['num']
+        imputer, scaler = numeric.named_steps['imputer'], numeric.named_steps['scaler']
+    if 'cat' in blocks:
+        onehot_block, categorical = blocks['cat']
+        categories_ = onehot_block.named_steps['onehot'].categories_
+
+    n_numeric = int(imputer._valid_mask.sum()) if imputer is not None else 0
+    encoding, offset = {}, n_numeric
+    for column, categories in zip(categorical, categories_):
+        is_nan = pd.isna(categories)
+        index = pd.Index(categories[~is_nan].astype(str))
+        # OneHotEncoder keeps NaN as the last category when it was seen in fit
+        missing = offset + len(index) if is_nan.any() else -1
+        encoding[column] = encode(column, index, offset, missing)
+        offset += len(categories)
+
+    compiled = CompiledPredictor(numerical, categorical, encoding, trees,
+                                 sparse=preprocessor.sparse_output_, one_hot=True, chunk_size=chunk_size)
+    if imputer is not None:
+        compiled.imputer = imputer
+        compiled.mean_ = scaler.mean_ if scaler.with_mean else 0.0
+        compiled.scale_ = scaler.scale_ if scaler.with_std else 1.0
+    return compiled
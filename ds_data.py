@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Typed, chunked loading of the exercise data
+
+Single place where the raw csv is parsed, used by DS_Model_Final.py and DS_Analysis.py
+  * strings are stripped, '?' is treated as NaN and the columns are stored as category
+  * numerics are downcast to the smallest int/float width that holds them exactly
+  * the csv is read in chunks so the object columns of the whole file never exist at once
+  * the typed frame is cached as parquet next to the csv, keyed by the file hash,
+    so later loads skip the csv parsing (the cache is skipped if pyarrow is not installed)
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+DATA_PATH = '/content/data science exercise - sample data.csv'
+# values treated as missing after stripping
+NA_VALUES = ['?']
+# bump when the cleaning below changes so older caches are not reused
+SCHEMA_VERSION = 2
+
+# Schema of the exercise columns - columns not listed here are inferred the same way
+# (strings -> category, numerics -> smallest exact width)
+SCHEMA = {
+    'Age': 'numeric',
+    'WorkClass': 'category',
+    'Education': 'category',
+    'MaritalStatus': 'category',
+    'Occupation': 'category',
+    'Relationship': 'category',
+    'Race': 'category',
+    'Gender': 'category',
+    'Country': 'category',
+    'EducationYears': 'numeric',
+    'CapitalGain': 'numeric',
+    'CapitalLoss': 'numeric',
+    'HoursWorkWeekly': 'numeric',
+    'LotSize': 'numeric',
+    'Suburban': 'numeric',
+    'OwnHouse': 'numeric',
+    'IncomeLabel': 'category',
+}
+
+
+def clean_categorical(values, na_values=NA_VALUES):
+    """Strip whitespace and map the sentinels to NaN, returning a category series
+
+    Works on the categories (unique values) rather than on every cell.
+    """
+    values = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+    stripped = pd.Index(values.cat.categories.astype(str).str.strip())
+    categories = stripped.unique().drop(na_values, errors='ignore')
+    lookup = categories.get_indexer(stripped)
+    # code -1 (missing) picks the appended -1, this also covers a column with no categories at all
+    codes = np.append(lookup, -1)[values.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=values.index, name=values.name)
+
+
+def compact_numeric(values):
+    # smallest integer width if integral without NaN, float32 if it is exact, else leave as is
+    if values.notna().all() and (values % 1 == 0).all():
+        return pd.to_numeric(values, downcast='integer')
+    as_float32 = values.astype(np.float32)
+    if ((as_float32.astype(np.float64) == values) | values.isna()).all():
+        return as_float32
+    return values
+
+
+def optimize_dtypes(data, na_values=NA_VALUES):
+    """Same dtypes as load_data for a frame that is already in memory (for ex a plain read_csv)
+
+    String columns become cleaned category columns, numerics the smallest exact width
+    (strings in a numeric schema column are parsed, anything that is not a number becomes NaN).
+    The result works with ds_preprocess.feature_types like the load_data output.
+    """
+    columns = {}
+    for column in data.columns:
+        values = data[column]
+        if _is_categorical(column, values):
+            columns[column] = clean_categorical(values, na_values)
+        else:
+            if not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_numeric(values, errors='coerce')
+            columns[column] = compact_numeric(values)
+    return pd.DataFrame(columns, index=data.index)
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB
+
+    VmHWM is the peak of this process image only, ru_maxrss (the fallback off linux) of a process started
+    by a large parent can report the parent's rss.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM')) / 1024
+    except (OSError, StopIteration):
+        pass
+    import resource
+    import sys
+    # ru_maxrss is in KB on linux and in bytes on mac
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def memory_report(before, after):
+    """Bytes per column (deep, so strings count) of two versions of the same frame"""
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'bytes_before': before.memory_usage(index=False, deep=True),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_after': after.memory_usage(index=False, deep=True),
+    })
+    report.loc['total'] = ['', report['bytes_before'].sum(), '', report['bytes_after'].sum()]
+    report['ratio'] = report['bytes_before'] / report['bytes_after']
+    return report
+
+
+def _is_categorical(column, values):
+    kind = SCHEMA.get(column)
+    if kind is not None:
+        return kind == 'category'
+    return not pd.api.types.is_numeric_dtype(values)
+
+
+def iter_chunks(path=DATA_PATH, chunksize=100_000):
+    """Yield cleaned chunks of the csv - categoricals are per chunk, numerics keep the csv dtype"""
+    string_columns = {column: str for column, kind in SCHEMA.items() if kind == 'category'}
+    reader = pd.read_csv(path, chunksize=chunksize, skipinitialspace=True,
+                         na_values=NA_VALUES, dtype=string_columns)
+    for chunk in reader:
+        for column in chunk.columns:
+            if _is_categorical(column, chunk[column]):
+                chunk[column] = clean_categorical(chunk[column])
+        yield chunk
+
+
+def iter_parquet_chunks(path, chunksize=100_000):
+    """Yield cleaned chunks of a parquet file, same cleaning as iter_chunks"""
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+        chunk = batch.to_pandas()
+        for column in chunk.columns:
+            if _is_categorical(column, chunk[column]):
+                chunk[column] = clean_categorical(chunk[column])
+        yield chunk
+
+
+def read_typed_csv(path=DATA_PATH, chunksize=100_000):
+    chunks = list(iter_chunks(path, chunksize))
+    data = {}
+    for column in chunks[0].columns:
+        parts = [chunk[column] for chunk in chunks]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            data[column] = pd.Series(union_categoricals(parts, sort_categories=True), name=column)
+        else:
+            data[column] = compact_numeric(pd.concat(parts, ignore_index=True))
+        # release the chunk columns as we go
+        for chunk in chunks:
+            del chunk[column]
+    return pd.DataFrame(data)
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(path, cache_dir=None):
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), '.ds_cache')
+    name = os.path.splitext(os.path.basename(path))[0].replace(' ', '_')
+    return os.path.join(cache_dir, f'{name}-{file_hash(path)[:16]}-v{SCHEMA_VERSION}.parquet')
+
+
+def load_data(path=DATA_PATH, use_cache=True, cache_dir=None, chunksize=100_000):
+    """Load the exercise csv as a typed frame, from the parquet cache when the file is unchanged"""
+    if not use_cache:
+        return read_typed_csv(path, chunksize)
+    try:
+        import pyarrow  # noqa: F401 - parquet engine
+    except ImportError:
+        return read_typed_csv(path, chunksize)
+
+    cached = cache_path(path, cache_dir)
+    if os.path.exists(cached):
+        return pd.read_parquet(cached)
+    data = read_typed_csv(path, chunksize)
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    # write to a temp file first so an interrupted run never leaves a truncated cache behind
+    data.to_parquet(cached + '.tmp', index=False)
+    os.replace(cached + '.tmp', cached)
+    return data
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Fast model tier for the request path - pruned or distilled versions of the tuned pipeline
+
+    fast_model, tradeoff = distill_model(best_model, X_fit, X_valid, y_valid, threshold=0.5, max_recall_loss=0.01)
+    plot_tradeoff(tradeoff)
+
+The fitted preprocessing is shared with the full model (frozen, as in ds_refresh.py), only the trees change.
+Candidates are
+  * pruned    the first k trees of the tuned booster (k a fraction of its trees)
+  * distilled small XGBoost models (depth 2-4, up to 200 trees) fitted on the full model's probabilities
+              on X_fit (soft labels, so no scale_pos_weight - the teacher's probabilities already carry it)
+Every candidate gets recall/precision at threshold on (X_valid, y_valid), agreement with the full model's
+labels, booster size, node count and the compiled (ds_compile) tree time per row and single row latency.
+The fast model is the quickest candidate whose recall is at most max_recall_loss below the full model's
+(and that agrees with its labels on min_agreement of the rows).
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+
+from ds_compile import _n_iterations, compile_pipeline, predict_margin
+
+PRUNE_FRACTIONS = (0.05, 0.1, 0.25, 0.5)
+STUDENT_DEPTHS = (2, 3, 4)
+STUDENT_ROUNDS = (10, 25, 50, 100, 200)
+
+
+def _pipeline(model, booster, **params):
+    # same wrapper as the fitted classifier, with booster as its trees
+    name, classifier = model.steps[-1]
+    classifier = clone(classifier).set_params(**params)
+    classifier.load_model(bytearray(booster.save_raw('ubj')))
+    return Pipeline(model.steps[:-1] + [(name, classifier)])
+
+
+def _evaluate(pipeline, Xt_valid, X_valid, y_valid, teacher_labels, threshold, latency_rows):
+    classifier = pipeline.steps[-1][1]
+    booster = classifier.get_booster()
+    predicted = classifier.predict_proba(Xt_valid)[:, 1] >= threshold
+    tp = int((predicted & y_valid).sum())
+
+    compiled = compile_pipeline(pipeline)
+    features = compiled.transform(X_valid)
+    start = time.perf_counter()
+    predict_margin(compiled.trees, features)
+    tree_seconds = time.perf_counter() - start
+    latencies = []
+    for i in range(min(latency_rows, len(X_valid))):
+        row = X_valid.iloc[[i]]
+        start = time.perf_counter()
+        compiled.predict_proba(row)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        'trees': booster.num_boosted_rounds(),
+        'nodes': len(compiled.trees['left']),
+        'size_kb': len(booster.save_raw('ubj')) / 1024,
+        'tree_us_per_row': tree_seconds / max(len(features), 1) * 1e6,
+        'row_latency_ms': float(np.median(latencies) * 1000) if latencies else np.nan,
+        'recall': tp / max(int(y_valid.sum()), 1),
+        'precision': tp / max(int(predicted.sum()), 1),
+        'agreement': float((predicted == teacher_labels).mean()),
+    }
+
+
+def distill_model(model, X_fit, X_valid, y_valid, threshold=0.5, max_recall_loss=0.01, min_agreement=0.97,
+                  prune_fractions=PRUNE_FRACTIONS, student_depths=STUDENT_DEPTHS, student_rounds=STUDENT_ROUNDS,
+                  student_learning_rate=0.3, latency_rows=100, random_state=42):
+    """Pruned and distilled candidates of the fitted pipeline, and the fastest one within max_recall_loss
+
+    min_agreement is the share of the validation rows where the fast model has to give the full model's label
+    (a candidate can also gain recall by labelling many more rows positive, at the cost of precision).
+
+    Returns (fast_model, tradeoff) - fast_model is a pipeline with the same steps as model (the full model
+    itself if no candidate keeps the recall), tradeoff has one row per candidate, full model first.
+    """
+    preprocessing = Pipeline(model.steps[:-1])
+    classifier = model.steps[-1][1]
+    booster = classifier.get_booster()
+    n_trees = _n_iterations(classifier) or booster.num_boosted_rounds()
+    Xt_fit, Xt_valid = preprocessing.transform(X_fit), preprocessing.transform(X_valid)
+    y_valid = np.asarray(y_valid).astype(bool)
+    teacher_labels = classifier.predict_proba(Xt_valid)[:, 1] >= threshold
+
+    candidates = [('full', classifier.max_depth, model)]
+    for fraction in prune_fractions:
+        k = max(1, int(n_trees * fraction))
+        if k < n_trees:
+            candidates.append(('pruned', classifier.max_depth, _pipeline(model, booster[:k], n_estimators=k)))
+
+    # soft labels from the full model, one training per depth and the rounds are prefixes of it
+    soft_labels = classifier.predict_proba(Xt_fit)[:, 1]
+    dfit = xgboost.DMatrix(Xt_fit, label=soft_labels, enable_categorical=bool(classifier.enable_categorical))
+    params = {key: value for key, value in classifier.get_xgb_params().items()
+              if value is not None and key not in ('n_estimators', 'scale_pos_weight', 'eval_metric')}
+    for depth in student_depths:
+        params.update(objective='binary:logistic', max_depth=depth, learning_rate=student_learning_rate,
+                      seed=random_state)
+        student = xgboost.train(params, dfit, num_boost_round=max(student_rounds))
+        for rounds in student_rounds:
+            candidates.append(('distilled', depth,
+                               _pipeline(model, student[:rounds], n_estimators=rounds, max_depth=depth,
+                                         learning_rate=student_learning_rate, scale_pos_weight=1)))
+
+    rows = []
+    for kind, depth, pipeline in candidates:
+        rows.append({'kind': kind, 'max_depth': depth,
+                     **_evaluate(pipeline, Xt_valid, X_valid, y_valid, teacher_labels, threshold, latency_rows)})
+    tradeoff = pd.DataFrame(rows)
+    tradeoff['recall_loss'] = tradeoff.loc[0, 'recall'] - tradeoff['recall']
+    tradeoff['speedup'] = tradeoff.loc[0, 'tree_us_per_row'] / tradeoff['tree_us_per_row']
+    eligible = tradeoff[(tradeoff['recall_loss'] <= max_recall_loss) & (tradeoff['agreement'] >= min_agreement)]
+    best = eligible.sort_values(['tree_us_per_row', 'recall_loss']).index[0]
+    tradeoff['selected'] = tradeoff.index == best
+    return candidates[best][2], tradeoff
+
+
+def plot_tradeoff(tradeoff):
+    """Recall against tree time per row and booster size, one point per candidate"""
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, 2, figsize=(16, 6))
+    for ax, x, label in ((axes[0], 'tree_us_per_row', 'Tree time per row (us)'), (axes[1], 'size_kb', 'Size (KB)')):
+        for kind, group in tradeoff.groupby('kind', sort=False):
+            ax.scatter(group[x], group['recall'], label=kind)
+        selected = tradeoff[tradeoff['selected']]
+        ax.scatter(selected[x], selected['recall'], s=200, facecolors='none', edgecolors='red', label='selected')
+        ax.axhline(tradeoff.loc[0, 'recall'], color='grey', linestyle='--', linewidth=1)
+        ax.set_xscale('log')
+        ax.set_xlabel(label)
+        ax.set_ylabel('Recall')
+        ax.legend()
+    axes[0].set_title('Recall vs latency')
+    axes[1].set_title('Recall vs size')
+    plt.tight_layout()
+    plt.show()
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""Exploration plots of DS_Analysis.py from small aggregates computed in one pass over chunked data
+
+    eda = compute_aggregates('big_extract.csv', pairs=[('Age', 'HoursWorkWeekly')], sample_per_class=2000)
+    plot_overview(eda)
+
+  * every chunk updates, per column and income class
+      - category counts (missing values counted as '(missing)') -> counts()/rates()
+      - fixed width histograms of the numerics -> histogram()/quantiles()
+      - 2D binned counts of the requested numeric pairs -> density()
+  * histogram bin widths are set from the first chunk (bins bins over its range, whole numbers for int
+    columns) and the bins are open ended, so later chunks outside that range just add bins
+  * an optional stratified sample (sample_per_class rows per class, bottom-k of a random key so it is
+    uniform over the whole file) is kept for the scatter/pair views
+The plots only ever see these aggregates (a few KB), never the rows, so the time is the chunked read.
+"""
+
+import numpy as np
+import pandas as pd
+
+from ds_columns import POSITIVE_LABEL, TARGET, code_target
+
+MISSING = '(missing)'
+
+
+def _iter_frame(data, chunksize):
+    for start in range(0, len(data), chunksize):
+        yield data.iloc[start:start + chunksize]
+
+
+def _add(total, part):
+    return part if total is None else total.add(part, fill_value=0)
+
+
+class EDAAggregates:
+    """Per class counts, histograms and 2D densities accumulated with update(chunk)"""
+
+    def __init__(self, target=TARGET, positive_label=POSITIVE_LABEL, bins=50, pairs=(), sample_per_class=0, seed=42):
+        self.target = target
+        self.positive_label = positive_label
+        self.bins = bins
+        self.pairs = [tuple(pair) for pair in pairs]
+        self.sample_per_class = sample_per_class
+        self.rng = np.random.default_rng(seed)
+        self.n_rows = 0
+        self.bin_edges_ = {}    # numeric column -> (origin, width)
+        self._counts = {}
+        self._hist = {}
+        self._density = {}
+        self._sample = None
+
+    def _bin_index(self, column, values):
+        if column not in self.bin_edges_:
+            finite = values[np.isfinite(values)]
+            low, high = (finite.min(), finite.max()) if len(finite) else (0.0, 1.0)
+            width = (high - low) / self.bins or 1.0
+            if np.issubdtype(values.dtype, np.integer) or np.all(finite == np.round(finite)):
+                width = float(np.ceil(width))
+            self.bin_edges_[column] = (float(low), float(width))
+        origin, width = self.bin_edges_[column]
+        return np.floor((values - origin) / width)
+
+    def update(self, chunk):
+        y = code_target(chunk[self.target], self.positive_label).to_numpy()
+        self.n_rows += len(chunk)
+        binned = {}
+        for column in chunk.columns:
+            if column == self.target:
+                continue
+            values = chunk[column]
+            if pd.api.types.is_numeric_dtype(values):
+                index = self._bin_index(column, values.to_numpy(dtype=float))
+                binned[column] = index
+                keep = ~np.isnan(index)
+                # bin and class in one int key, 2 * bin + class
+                keys, counts = np.unique(index[keep].astype(np.int64) * 2 + y[keep], return_counts=True)
+                self._hist[column] = _add(self._hist.get(column), pd.Series(counts, index=keys))
+            else:
+                if not isinstance(values.dtype, pd.CategoricalDtype):
+                    values = values.astype('category')
+                # category code and class in one key as well, code -1 (missing) goes to the last category
+                categories = values.cat.categories.append(pd.Index([MISSING]))
+                codes = values.cat.codes.to_numpy().astype(np.int64)
+                codes[codes < 0] = len(categories) - 1
+                counts = np.bincount(codes * 2 + y, minlength=2 * len(categories)).reshape(-1, 2)
+                counts = pd.DataFrame(counts, index=categories.astype(str), columns=[0, 1])
+                self._counts[column] = _add(self._counts.get(column), counts)
+
+        for x, z in self.pairs:
+            keep = ~(np.isnan(binned[x]) | np.isnan(binned[z]))
+            cells = pd.DataFrame({x: binned[x][keep].astype(np.int64), z: binned[z][keep].astype(np.int64)})
+            self._density[(x, z)] = _add(self._density.get((x, z)), cells.value_counts())
+
+        if self.sample_per_class:
+            # bottom-k of a uniform key per class is a uniform sample of each class over all the chunks
+            sample = chunk.assign(_key=self.rng.random(len(chunk)), _class=y)
+            if self._sample is not None:
+                sample = pd.concat([self._sample, sample[self._sample.columns]], ignore_index=True)
+            keys, classes = sample['_key'].to_numpy(), sample['_class'].to_numpy()
+            keep = []
+            for label in (0, 1):
+                rows = np.flatnonzero(classes == label)
+                if len(rows) > self.sample_per_class:
+                    rows = rows[np.argpartition(keys[rows], self.sample_per_class)[:self.sample_per_class]]
+                keep.append(rows)
+            self._sample = sample.iloc[np.sort(np.concatenate(keep))].reset_index(drop=True)
+        return self
+
+    def counts(self, column):
+        """Category x class counts, categories ordered by frequency"""
+        table = self._counts[column].astype(np.int64)
+        table = table[table.sum(axis=1) > 0].rename_axis(index=column, columns=self.target)
+        return table.loc[table.sum(axis=1).sort_values(ascending=False, kind='stable').index]
+
+    def rates(self, column):
+        """Rows, positives, rate of the positive class and share of all rows per category (or histogram bin)"""
+        table = self.counts(column) if column in self._counts else self.histogram(column)
+        rows = table.sum(axis=1)
+        return pd.DataFrame({'rows': rows, 'positive': table[1], 'rate': table[1] / rows.where(rows > 0),
+                             'share': rows / self.n_rows})
+
+    def histogram(self, column):
+        """Bin x class counts, indexed by the left edge of the bin"""
+        keys = self._hist[column]
+        table = (pd.Series(keys.to_numpy(), index=[keys.index // 2, keys.index % 2]).unstack(fill_value=0)
+                 .reindex(columns=[0, 1], fill_value=0).astype(np.int64))
+        table = table.reindex(np.arange(table.index.min(), table.index.max() + 1), fill_value=0)
+        origin, width = self.bin_edges_[column]
+        table.index = pd.Index(origin + table.index * width, name=column)
+        table.columns.name = self.target
+        return table
+
+    def quantiles(self, column, q=(0.25, 0.5, 0.75)):
+        """Per class quantiles read off the histogram (to within a bin width)"""
+        table = self.histogram(column)
+        width = self.bin_edges_[column][1]
+        result = {}
+        for label in table.columns:
+            cumulative = table[label].cumsum() / max(table[label].sum(), 1)
+            positions = np.searchsorted(cumulative.to_numpy(), q)
+            result[label] = table.index.to_numpy()[np.minimum(positions, len(table) - 1)] + width / 2
+        return pd.DataFrame(result, index=pd.Index(q, name='quantile'))
+
+    def density(self, x, y):
+        """2D counts of the (x, y) pair, rows are the x bins and columns the y bins"""
+        table = self._density[(x, y)].unstack(fill_value=0).astype(np.int64)
+        for axis, column in ((0, x), (1, y)):
+            origin, width = self.bin_edges_[column]
+            labels = table.axes[axis]
+            full = np.arange(labels.min(), labels.max() + 1)
+            table = table.reindex(full, axis=axis, fill_value=0)
+            table = table.set_axis(pd.Index(origin + full * width, name=column), axis=axis)
+        return table
+
+    @property
+    def sample(self):
+        """Stratified sample rows (without the helper columns), None if sample_per_class was 0"""
+        if self._sample is None:
+            return None
+        return self._sample.drop(columns=['_key', '_class'])
+
+
+def compute_aggregates(data, chunksize=100_000, **kwargs):
+    """EDAAggregates over a csv/parquet path (read in chunks) or an in-memory frame, kwargs go to EDAAggregates"""
+    if isinstance(data, str):
+        from ds_score import iter_input
+        chunks = iter_input(data, chunksize)
+    else:
+        chunks = _iter_frame(data, chunksize)
+    eda = EDAAggregates(**kwargs)
+    for chunk in chunks:
+        eda.update(chunk)
+    return eda
+
+
+def plot_counts(eda, column, ax, horizontal=False, annotate=True):
+    """countplot(x=column, hue=target) drawn from the counts, annotated with the % of all rows"""
+    table = eda.counts(column) if column in eda._counts else eda.histogram(column)
+    table.plot.barh(ax=ax) if horizontal else table.plot.bar(ax=ax)
+    if annotate and not horizontal:
+        for patch in ax.patches:
+            height = patch.get_height()
+            ax.annotate(f'{100 * height / eda.n_rows:.2f}%', (patch.get_x() + patch.get_width() / 2., height),
+                        ha='center', va='center', fontsize=10, color='black', xytext=(0, 10),
+                        textcoords='offset points')
+    ax.set_title(f'Income vs. {column}')
+    ax.set_ylabel(column if horizontal else 'Count')
+    ax.set_xlabel('Count' if horizontal else column)
+    ax.legend(title=eda.target)
+    return ax
+
+
+def plot_histogram(eda, column, ax, stacked=True):
+    """histplot(x=column, hue=target, multiple='stack') drawn from the histogram"""
+    table = eda.histogram(column)
+    width = eda.bin_edges_[column][1]
+    bottom = np.zeros(len(table))
+    for label in table.columns:
+        ax.bar(table.index, table[label], width=width, align='edge', bottom=bottom, label=str(label), alpha=0.7)
+        if stacked:
+            bottom = bottom + table[label].to_numpy()
+    ax.set_title(f'Income Distribution by {column}')
+    ax.set_xlabel(column)
+    ax.set_ylabel('Count')
+    ax.legend(title=eda.target)
+    return ax
+
+
+def plot_density(eda, x, y, ax, log=True):
+    """2D binned counts of (x, y) as a heatmap (log colour scale by default)"""
+    from matplotlib.colors import LogNorm
+
+    table = eda.density(x, y)
+    values = table.to_numpy().T.astype(float)
+    mesh = ax.pcolormesh(np.append(table.index, table.index[-1] + eda.bin_edges_[x][1]),
+                         np.append(table.columns, table.columns[-1] + eda.bin_edges_[y][1]),
+                         np.where(values > 0, values, np.nan), norm=LogNorm() if log else None, cmap='viridis')
+    ax.figure.colorbar(mesh, ax=ax, label='rows')
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    ax.set_title(f'{y} vs. {x}')
+    return ax
+
+
+def plot_overview(eda):
+    """The Gender/Education/HoursWorkWeekly/WorkClass and MaritalStatus/Occupation/HoursWorkWeekly/Race
+    figures of DS_Analysis.py"""
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(2, 2, figsize=(20, 20))
+    plot_counts(eda, 'Gender', axes[0, 0])
+    plot_counts(eda, 'Education', axes[0, 1])
+    axes[0, 1].tick_params(axis='x', rotation=90)
+    plot_histogram(eda, 'HoursWorkWeekly', axes[1, 0], stacked=False)
+    plot_counts(eda, 'WorkClass', axes[1, 1])
+    axes[1, 1].tick_params(axis='x', rotation=45)
+    plt.tight_layout()
+    plt.show()
+
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    plot_counts(eda, 'MaritalStatus', axes[0, 0], horizontal=True)
+    plot_counts(eda, 'Occupation', axes[0, 1], horizontal=True)
+    plot_histogram(eda, 'HoursWorkWeekly', axes[1, 0])
+    plot_counts(eda, 'Race', axes[1, 1], horizontal=True)
+    plt.tight_layout()
+    plt.show()
+
+
+def plot_sample_pairs(eda, columns=None, **kwargs):
+    """pairplot of the stratified sample (sample_per_class rows per class) instead of every row"""
+    import seaborn as sns
+
+    sample = eda.sample
+    if sample is None:
+        raise ValueError('no sample kept, compute the aggregates with sample_per_class > 0')
+    columns = columns or [column for column in sample.columns
+                          if column != eda.target and pd.api.types.is_numeric_dtype(sample[column])]
+    return sns.pairplot(sample[columns + [eda.target]], hue=eda.target, **kwargs)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Single pass threshold sweep evaluation
+
+The model is scored once and the confusion counts for every threshold come from one sort
+of the probabilities plus cumulative sums, so choosing an operating threshold on millions of
+rows takes seconds. ROC AUC and the precision-recall curve use the probabilities (not the 0/1
+predictions). sklearn.metrics and matplotlib/seaborn are imported when used, threshold_table
+only needs numpy/pandas.
+"""
+
+import numpy as np
+import pandas as pd
+
+# default sweep, 0.00 to 1.00 in steps of 0.01
+DEFAULT_THRESHOLDS = np.round(np.linspace(0, 1, 101), 2)
+
+
+def threshold_table(y_true, scores, thresholds=DEFAULT_THRESHOLDS):
+    """Confusion counts and metrics for every threshold (a row is predicted positive if score >= threshold)"""
+    y_true = np.asarray(y_true).astype(bool)
+    scores = np.asarray(scores, dtype=np.float64)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+
+    order = np.argsort(scores, kind='stable')
+    # positives among the i lowest scores
+    positives_below = np.concatenate([[0], np.cumsum(y_true[order])])
+    n_below = np.searchsorted(scores[order], thresholds, side='left')
+    n, n_pos = len(scores), int(positives_below[-1])
+
+    fn = positives_below[n_below]
+    tp = n_pos - fn
+    fp = (n - n_below) - tp
+    tn = (n - n_pos) - fp
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(n_pos > 0, tp / max(n_pos, 1), 0.0)
+        specificity = np.where(tn + fp > 0, tn / (tn + fp), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return pd.DataFrame({
+        'threshold': thresholds,
+        'TP': tp, 'FP': fp, 'TN': tn, 'FN': fn,
+        'precision': precision,
+        'recall': recall,
+        'specificity': specificity,
+        'f1': f1,
+        'accuracy': (tp + tn) / n,
+    })
+
+
+def evaluate_scores(y_true, scores, thresholds=DEFAULT_THRESHOLDS):
+    from sklearn.metrics import precision_recall_curve, roc_auc_score
+
+    precision, recall, pr_thresholds = precision_recall_curve(y_true, scores)
+    return {
+        'table': threshold_table(y_true, scores, thresholds),
+        'roc_auc': roc_auc_score(y_true, scores),
+        'pr_curve': pd.DataFrame({'precision': precision[:-1], 'recall': recall[:-1], 'threshold': pr_thresholds}),
+        'scores': np.asarray(scores),
+        'y_true': np.asarray(y_true),
+    }
+
+
+def evaluate_model(model, X, y_true, thresholds=DEFAULT_THRESHOLDS):
+    # predict_proba is called once for all the thresholds
+    return evaluate_scores(y_true, model.predict_proba(X)[:, 1], thresholds)
+
+
+def plot_evaluation(result, threshold=0.5):
+    """Confusion matrix at threshold and precision-recall curve side by side"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    row = threshold_table(result['y_true'], result['scores'], [threshold]).iloc[0]
+    cm = np.array([[row['TN'], row['FP']], [row['FN'], row['TP']]], dtype=int)
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
+                xticklabels=['<=60K', '>60K'], yticklabels=['<=60K', '>60K'], ax=ax1)
+    ax1.set_xlabel('Predicted')
+    ax1.set_ylabel('Actual')
+    ax1.set_title(f'Confusion Matrix (threshold {row["threshold"]:.2f})')
+
+    pr = result['pr_curve']
+    ax2.fill_between(pr['recall'], pr['precision'], alpha=0.2, color='b')
+    ax2.plot(pr['recall'], pr['precision'], color='b')
+    ax2.set_xlabel("Recall")
+    ax2.set_ylabel("Precision")
+    ax2.set_title("Precision-Recall Curve")
+
+    plt.tight_layout()
+    plt.show()
+
+
+def model_evaluation(model, X_test, y_test, threshold=0.5, plot=True):
+    """Print ROC AUC, the classification report per threshold and the threshold table, optionally plot
+
+    threshold can be a list - the model is scored once and all thresholds come from the same probabilities,
+    with plot=True every threshold gets its confusion matrix (next to the precision-recall curve)
+    """
+    from sklearn.metrics import classification_report
+
+    thresholds = np.atleast_1d(threshold)
+    result = evaluate_model(model, X_test, y_test, thresholds)
+    print(f'ROC AUC Score: {result["roc_auc"]:.4f}')
+    for t in thresholds:
+        y_test_pred = (result['scores'] >= t).astype(int)
+        print(f'Threshold: {t}')
+        print(classification_report(y_test, y_test_pred))
+    print(result['table'].to_string(index=False))
+    if plot:
+        for t in thresholds:
+            plot_evaluation(result, t)
+    return result
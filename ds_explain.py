@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Per record reasons for the predictions - TreeSHAP contributions summed back to the input columns
+
+    explainer = Explainer(load_model(path), booster)    # or Explainer.load(path) for a pickle or artifact dir
+    reasons = explainer.explain(X, top_k=3, labels=labels)
+
+  * the features are built with the CompiledPredictor transform (ds_compile) of the pipeline or artifact,
+    so they are the matrix the booster was trained on
+  * contributions come from booster.predict(pred_contribs=True), exact TreeSHAP in xgboost's C++ code,
+    batch_size rows per call - about 7ms per row for 1000 trees of depth 5 against 0.2ms to predict,
+    approximate=True takes xgboost's path attribution (approx_contribs, Saabas) at about 40x less
+  * the one hot features of a column (the fitted OneHotEncoder categories, missing included) are summed
+    into one contribution for the column, so Education gets one value however many categories it has
+  * the top_k columns per row are the ones pushing hardest towards the row's label (towards >60K when
+    labels are not given), columns with a contribution of the other sign are left out
+Output columns are reason_<i> (column), reason_<i>_value (the input value) and reason_<i>_contribution
+(log odds) for i = 1..top_k. contributions() has every column, a row's contributions plus the bias
+add up to its margin.
+Used by ds_score.py --explain K.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import xgboost
+
+
+def _valid_numerics(compiled):
+    # numerical columns left after the imputer dropped the all missing ones (all of them for native categories)
+    imputer = compiled.imputer
+    if imputer is None:
+        return list(compiled.numerical_features)
+    mask = getattr(imputer, '_valid_mask', None)
+    if mask is None:
+        mask = imputer.arrays['imputer_valid_mask']
+    return list(np.asarray(compiled.numerical_features)[np.asarray(mask)])
+
+
+def feature_columns(compiled):
+    """Input column of every feature position of a CompiledPredictor"""
+    n_features = compiled.trees['n_features']
+    numerical = _valid_numerics(compiled)
+    columns = np.full(n_features, -1, dtype=np.int64)
+    columns[:len(numerical)] = np.arange(len(numerical))
+    names = [str(column) for column in numerical + list(compiled.categorical_features)]
+    for i, column in enumerate(compiled.categorical_features, start=len(numerical)):
+        if not compiled.one_hot:
+            # native categories, one feature per column
+            columns[i] = i
+            continue
+        lookup, unknown, missing, _ = compiled.encoding[column]
+        positions = [position for position in (*lookup.values(), unknown, missing) if position >= 0]
+        columns[positions] = i
+    # one hot categories the cleaner never maps to belong to the column before them
+    unset = columns < 0
+    if unset.any():
+        columns = np.maximum.accumulate(np.where(unset, 0, columns))
+    return names, columns
+
+
+class Explainer:
+    """Batched TreeSHAP contributions of a CompiledPredictor's booster, per input column"""
+
+    def __init__(self, compiled, booster, batch_size=10_000, approximate=False):
+        self.compiled = compiled
+        self.booster = booster
+        self.batch_size = batch_size
+        self.approximate = approximate
+        self.columns, feature_column = feature_columns(compiled)
+        # features x columns indicator, contributions @ groups sums the one hot features of each column
+        self.groups = np.zeros((len(feature_column), len(self.columns)), dtype=np.float32)
+        self.groups[np.arange(len(feature_column)), feature_column] = 1
+        self.n_trees = len(compiled.trees['roots'])
+
+    @classmethod
+    def load(cls, path, **kw):
+        """Explainer for a joblib pickle of the pipeline or a ds_artifact directory"""
+        if os.path.isdir(path):
+            from ds_artifact import load_artifact, load_booster
+            return cls(load_artifact(path), load_booster(path), **kw)
+        import joblib
+        return cls.from_pipeline(joblib.load(path), **kw)
+
+    @classmethod
+    def from_pipeline(cls, model, **kw):
+        from ds_compile import compile_pipeline
+        return cls(compile_pipeline(model), model.steps[-1][1].get_booster(), **kw)
+
+    def _dmatrix(self, features):
+        native = not self.compiled.one_hot
+        return xgboost.DMatrix(features, missing=np.nan, feature_names=self.booster.feature_names,
+                               feature_types=self.booster.feature_types, enable_categorical=native)
+
+    def contributions(self, X):
+        """(rows x columns) contributions in log odds and the (rows,) bias"""
+        out = np.empty((len(X), len(self.columns)), dtype=np.float32)
+        bias = np.empty(len(X), dtype=np.float32)
+        for start in range(0, len(X), self.batch_size):
+            chunk = X.iloc[start:start + self.batch_size]
+            features = self.compiled.transform(chunk)
+            contribs = self.booster.predict(self._dmatrix(features), pred_contribs=True,
+                                            approx_contribs=self.approximate, iteration_range=(0, self.n_trees))
+            out[start:start + len(chunk)] = contribs[:, :-1] @ self.groups
+            bias[start:start + len(chunk)] = contribs[:, -1]
+        return pd.DataFrame(out, columns=self.columns, index=X.index), bias
+
+    def explain(self, X, top_k=3, labels=None):
+        """top_k reasons per row of X, towards labels (0/1 per row) or towards >60K if labels is None"""
+        contributions, _ = self.contributions(X)
+        values = contributions.to_numpy()
+        top_k = min(top_k, values.shape[1])
+        # rank by the push towards the label, negative contributions count for label 0
+        sign = np.where(np.asarray(labels) > 0, 1, -1)[:, None] if labels is not None else 1
+        scores = values * sign
+        top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+        names = np.array(self.columns, dtype=object)
+        inputs = X.reindex(columns=self.columns).astype(object).to_numpy()
+        reasons = pd.DataFrame(index=X.index)
+        for i in range(top_k):
+            column = top[:, i]
+            contribution = values[np.arange(len(values)), column]
+            keep = scores[np.arange(len(values)), column] > 0
+            reasons[f'reason_{i + 1}'] = np.where(keep, names[column], None)
+            value = inputs[np.arange(len(values)), column]
+            reasons[f'reason_{i + 1}_value'] = np.where(keep, pd.Series(value).astype(str).to_numpy(), None)
+            reasons[f'reason_{i + 1}_contribution'] = np.where(keep, contribution, np.nan)
+        return reasons
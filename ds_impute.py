@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Indexed nearest-neighbour imputation
+
+Drop-in replacement for sklearn's KNNImputer used in DS_Model_Final.py
+
+KNNImputer compares every incomplete row against every training row (quadratic cost).
+Here the donors for a column are split in two groups per missing pattern of the receiver:
+  * donors that are complete on the receiver's observed columns - these are queried through a KD tree
+  * donors that have gaps on those columns - these are few and are compared brute force, in chunks
+Both use the same nan_euclidean distance as KNNImputer, computed the same way for the candidates, so the
+imputed values match it whenever the n_neighbors nearest donors are unambiguous. Equally distant donors
+(common with integer valued columns) are taken in training row order; KNNImputer leaves that choice to
+np.argpartition, whose pick among ties depends on the numpy build, so on such ties the two can differ.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.metrics.pairwise import nan_euclidean_distances
+from sklearn.neighbors import KDTree
+from sklearn.utils.validation import check_is_fitted
+
+
+class IndexedKNNImputer(TransformerMixin, BaseEstimator):
+    """KNN imputation backed by a KD tree index and chunked distance evaluation
+
+    Parameters mirror sklearn.impute.KNNImputer (n_neighbors, weights); missing values are NaN.
+    leaf_size is passed to the KD tree and chunk_size bounds the number of receivers
+    whose distances are held in memory at once.
+    Sparse input without NaN entries is passed through as CSR.
+    """
+
+    def __init__(self, n_neighbors=5, weights='uniform', leaf_size=40, chunk_size=4096):
+        self.n_neighbors = n_neighbors
+        self.weights = weights
+        self.leaf_size = leaf_size
+        self.chunk_size = chunk_size
+
+    def fit(self, X, y=None):
+        if self.weights not in ('uniform', 'distance'):
+            raise ValueError(f"weights should be 'uniform' or 'distance', got {self.weights!r}")
+        if self.n_neighbors < 1:
+            raise ValueError(f"n_neighbors should be >= 1, got {self.n_neighbors}")
+        X = _as_float_array(X)
+        if hasattr(X, 'columns'):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.n_features_in_ = X.shape[1]
+        if sp.issparse(X):
+            # keep sparse training data as CSR, it is only densified if a receiver ever shows up
+            self._fit_X = X.tocsr()
+            nan_per_col = np.bincount(self._fit_X.indices[np.isnan(self._fit_X.data)], minlength=X.shape[1])
+            self._valid_mask = nan_per_col < X.shape[0]
+        else:
+            self._fit_X = np.asarray(X, dtype=np.float64)
+            self._valid_mask = ~np.isnan(self._fit_X).all(axis=0)
+        self._mask_fit_X = None
+        # KD trees are built lazily per (column, observed pattern) and are not pickled
+        self._indexes = {}
+        return self
+
+    def transform(self, X):
+        check_is_fitted(self, '_fit_X')
+        X = _as_float_array(X)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but IndexedKNNImputer is expecting {self.n_features_in_} features as input")
+        if sp.issparse(X):
+            X = X.tocsr()
+            # only the stored entries can be NaN - nothing to impute keeps the matrix sparse
+            if not np.isnan(X.data).any():
+                return X[:, self._valid_mask]
+            X = X.toarray()
+        X = np.array(X, dtype=np.float64)
+        mask = np.isnan(X)
+        if not mask[:, self._valid_mask].any():
+            return X[:, self._valid_mask]
+
+        self._densify_fit()
+        imputed = X.copy()
+        for col in np.flatnonzero(self._valid_mask):
+            receivers_idx = np.flatnonzero(mask[:, col])
+            if receivers_idx.size == 0:
+                continue
+            # group the receivers by the set of columns they have observed
+            patterns, inverse = np.unique(~mask[receivers_idx], axis=0, return_inverse=True)
+            for p, observed in enumerate(patterns):
+                group_idx = receivers_idx[inverse.ravel() == p]
+                imputed[group_idx, col] = self._impute_group(X[group_idx], col, observed)
+        return imputed[:, self._valid_mask]
+
+    def get_feature_names_out(self, input_features=None):
+        check_is_fitted(self, '_fit_X')
+        if input_features is None:
+            input_features = getattr(self, 'feature_names_in_', None)
+        if input_features is None:
+            input_features = np.array([f'x{i}' for i in range(self.n_features_in_)], dtype=object)
+        return np.asarray(input_features, dtype=object)[self._valid_mask]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_indexes'] = {}
+        state['_mask_fit_X'] = None
+        return state
+
+    def _densify_fit(self):
+        if sp.issparse(self._fit_X):
+            self._fit_X = self._fit_X.toarray()
+        if self._mask_fit_X is None:
+            self._mask_fit_X = np.isnan(self._fit_X)
+
+    def _col_mean(self, col):
+        return self._fit_X[~self._mask_fit_X[:, col], col].mean()
+
+    def _impute_group(self, X_group, col, observed):
+        donors = ~self._mask_fit_X[:, col]
+        n_obs = observed.sum()
+        # no shared coordinate with any donor - KNNImputer falls back to the column mean
+        if n_obs == 0:
+            return np.full(len(X_group), self._col_mean(col))
+
+        complete = donors & ~self._mask_fit_X[:, observed].any(axis=1)
+        partial_idx = np.flatnonzero(donors & ~complete)
+        tree, complete_idx = self._get_index(col, observed, complete)
+        out = np.empty(len(X_group))
+        for start in range(0, len(X_group), self.chunk_size):
+            chunk = X_group[start:start + self.chunk_size]
+            # each group gives its n_neighbors first donors by (distance, row), the union holds the overall first ones
+            dists, rows = [], []
+            if tree is not None:
+                i = complete_idx[self._tree_neighbours(tree, chunk[:, observed])]
+                # same arithmetic as nan_euclidean_distances (exact for integer values), the tree's own distances
+                # can be an ulp off and would split ties with the partial donors
+                squared = ((chunk[:, None, observed] - self._fit_X[i][:, :, observed]) ** 2).sum(axis=2)
+                dists.append(np.sqrt(squared / n_obs * self.n_features_in_))
+                rows.append(i)
+            if partial_idx.size:
+                d = nan_euclidean_distances(chunk, self._fit_X[partial_idx])
+                k = min(self.n_neighbors, len(partial_idx))
+                d = np.where(np.isnan(d), np.inf, d)
+                i = _first_k(d, k)
+                dists.append(np.take_along_axis(d, i, axis=1))
+                rows.append(partial_idx[i])
+            out[start:start + len(chunk)] = self._combine(np.hstack(dists), np.hstack(rows), col)
+        return out
+
+    def _tree_neighbours(self, tree, points):
+        # positions of the n_neighbors nearest tree donors, equally distant ones in row order
+        data = np.asarray(tree.data)
+        k = min(self.n_neighbors, len(data))
+        # a few more than k so the donors tied with the k-th (duplicated rows) are usually among them
+        d, i = tree.query(points, k=min(4 * k, len(data)))
+        if d.shape[1] == k:
+            return i
+        squared = ((data[i] - points[:, None]) ** 2).sum(axis=2)
+        nearest = np.take_along_axis(i, np.lexsort((i, squared), axis=1)[:, :k], axis=1)
+        # the last one queried is as close as the k-th, there can be more of them
+        tied = np.flatnonzero(d[:, -1] <= d[:, k - 1] * (1 + 1e-12))
+        if tied.size and d.shape[1] < len(data):
+            within = tree.query_radius(points[tied], r=d[tied, k - 1] * (1 + 1e-12))
+            # all the rows at once - candidates ordered by (row, distance, donor), the first k of every row
+            counts = np.array([len(candidates) for candidates in within])
+            owner = np.repeat(np.arange(len(tied)), counts)
+            candidates = np.concatenate(within)
+            squared = ((data[candidates] - points[tied][owner]) ** 2).sum(axis=1)
+            order = np.lexsort((candidates, squared, owner))
+            first = np.repeat(np.cumsum(counts) - counts, k) + np.tile(np.arange(k), len(tied))
+            nearest[tied] = candidates[order[first]].reshape(len(tied), k)
+        return nearest
+
+    def _get_index(self, col, observed, complete):
+        key = (col, observed.tobytes())
+        if key not in self._indexes:
+            complete_idx = np.flatnonzero(complete)
+            tree = None
+            if complete_idx.size:
+                tree = KDTree(self._fit_X[np.ix_(complete_idx, observed)], leaf_size=self.leaf_size)
+            self._indexes[key] = (tree, complete_idx)
+        return self._indexes[key]
+
+    def _combine(self, dist, donors, col):
+        # keep the n_neighbors closest candidates out of the tree and brute force results, ties in row order
+        k = min(self.n_neighbors, dist.shape[1])
+        nearest = np.lexsort((donors, dist), axis=1)[:, :k]
+        dist = np.take_along_axis(dist, nearest, axis=1)
+        values = self._fit_X[np.take_along_axis(donors, nearest, axis=1), col]
+        finite = np.isfinite(dist)
+
+        if self.weights == 'distance':
+            with np.errstate(divide='ignore'):
+                weight = 1.0 / dist
+            # exact matches take all the weight, same as sklearn
+            exact = dist == 0
+            has_exact = exact.any(axis=1)
+            weight[has_exact] = exact[has_exact]
+        else:
+            weight = np.ones_like(dist)
+        weight[~finite] = 0.0
+
+        total = weight.sum(axis=1)
+        out = np.full(len(dist), self._col_mean(col))
+        ok = total > 0
+        out[ok] = (weight[ok] * np.where(finite[ok], values[ok], 0.0)).sum(axis=1) / total[ok]
+        return out
+
+
+def _first_k(dist, k):
+    # column indices of the k smallest distances per row, equally distant ones in column order
+    kth = np.partition(dist, k - 1, axis=1)[:, k - 1:k]
+    closer = dist < kth
+    tied = dist == kth
+    # as many of the tied ones as are needed, the first ones
+    keep = closer | (tied & (np.cumsum(tied, axis=1) <= k - closer.sum(axis=1, keepdims=True)))
+    return np.nonzero(keep)[1].reshape(len(dist), k)
+
+
+def _as_float_array(X):
+    if sp.issparse(X):
+        return X.astype(np.float64)
+    if hasattr(X, 'columns'):
+        return X.astype(np.float64)
+    return np.asarray(X, dtype=np.float64)
@@ -18,123 +18,81 @@ Amudha Giridharan
 """
 
 #import the necessary libraries
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.pipeline import Pipeline
-from sklearn.compose import ColumnTransformer
-from sklearn.impute import KNNImputer
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.model_selection import train_test_split, GridSearchCV
-from xgboost import XGBClassifier
-from sklearn.metrics import classification_report, confusion_matrix , precision_recall_curve
-from sklearn.metrics import accuracy_score, precision_score, recall_score, roc_auc_score
+# training, evaluation/plots and scoring are separate modules - scoring new records only needs ds_score.py
+from sklearn.model_selection import train_test_split
+from ds_data import load_data
+from ds_distill import distill_model, plot_tradeoff
+from ds_evaluate import model_evaluation, threshold_table
+from ds_preprocess import split_X_y
+from ds_relevance import feature_relevance
+from ds_train import PARAM_GRID, build_pipeline, build_search, save_model
 
 # Load the data treating ? as NaN and removing init space as per earlier analysis
-data = pd.read_csv('/content/data science exercise - sample data.csv', na_values=' ?', skipinitialspace=True)
-
-# Load X and y, drop the columns based on feature importance findings and code the response variable to 0/1
-X = data.drop(columns=['IncomeLabel','Country','LotSize','Suburban','OwnHouse','WorkClass'], axis=1)
-y = data['IncomeLabel'].apply(lambda x: 1 if x == '>60K' else 0)
-
-# Function to evaluate the model for train/test data with a threshold of 0.5 (default)
+# load_data reads the csv with typed columns and caches it as parquet for later runs
+data = load_data('/content/data science exercise - sample data.csv')
+
+# Split the data - same rows as splitting X and y with the same random_state
+data_train, data_test = train_test_split(data, test_size=0.2, random_state=42)
+
+# By default the columns dropped in DS_Analysis.py are used ('Country','LotSize','Suburban','OwnHouse','WorkClass')
+# select_features = True recomputes the selection from one streaming pass over the train rows (ds_relevance.py)
+#   numerics are kept on |correlation with the response| >= 0.015 (the cut off used in DS_Analysis.py) and categoricals
+#   on Cramer's V of the chi2 test, both need p value <= 0.05
+#   the test rows are left out so they do not influence which columns the model gets
+select_features = False
+drop_columns = None
+if select_features:
+    relevance = feature_relevance(data_train)
+    print(relevance.scores())
+    _, drop_columns = relevance.select()
+    print("Dropped columns:", drop_columns)
+
+# Load X and y, drop the same columns from train and test and code the response variable to 0/1
+X_train, y_train = split_X_y(data_train, drop_columns)
+X_test, y_test = split_X_y(data_test, drop_columns)
+
+# Validation part of the train set for choosing the fast tier at the end - held out before the search so the tuned
+#   model never sees it and its validation recall is not a training recall
+X_search, X_valid, y_search, y_valid = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
+
+# model_evaluation (ds_evaluate.py) evaluates the model for train/test data with a threshold of 0.5 (default)
 # Threshold can be reduced to have better recall at the expense of precision, accuracy and F1
 # As focus is on Recall, precision-recall curve is plotted to observe the trade off with threshold tuning
-def model_evaluation(model, X_test, y_test, threshold = 0.5):
-    y_test_pred_proba = model.predict_proba(X_test)
-    y_test_pred = (y_test_pred_proba[:, 1] >= threshold).astype(int)
-    print(classification_report(y_test, y_test_pred))
-    cm = confusion_matrix(y_test, y_test_pred)
-    # Extract TN, FP, FN, TP
-    TN, FP, FN, TP = cm.ravel()
-    # Calculate specificity
-    specificity = TN / (TN + FP)
-    print(f'Specificity: {specificity:.4f}')
-    roc_auc = roc_auc_score(y_test, y_test_pred)
-    print(f'ROC AUC Score: {roc_auc:.4f}')
-    print(f'precision : {precision_score(y_test, y_test_pred):.4f}')
-    print(f'recall = {recall_score(y_test, y_test_pred):.4f}')
-
-    # Plot confusion matrix and precision-recall curve side by side
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
-
-    # Confusion matrix
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
-                xticklabels=['<=60K', '>60K'], yticklabels=['<=60K', '>60K'], ax=ax1)
-    ax1.set_xlabel('Predicted')
-    ax1.set_ylabel('Actual')
-    ax1.set_title('Confusion Matrix')
-
-    # Precision-Recall curve
-    precision, recall, thresholds = precision_recall_curve(y_test, y_test_pred)
-    ax2.fill_between(recall, precision, alpha=0.2, color='b')
-    ax2.plot(recall, precision, color='b')
-    ax2.set_xlabel("Recall")
-    ax2.set_ylabel("Precision")
-    ax2.set_title("Precision-Recall Curve")
-
-    plt.tight_layout()
-    plt.show()
-
-# Define feature types
-numerical_features = X.select_dtypes(include=['float64', 'int64']).columns
-categorical_features = X.select_dtypes(include=['object']).columns
-
-# Define seperate transformers for numerical data types and categorical datatypes
-# KNN is used for both based on data analysis
-
-#Scaling is added as cap gains variance is wider compared to others
-numerical_transformer = Pipeline(steps=[
-    ('imputer', KNNImputer(n_neighbors=5)),
-    ('scaler', StandardScaler())
-])
-
-categorical_transformer = Pipeline(steps=[
-    ('onehot', OneHotEncoder(sparse_output = False,handle_unknown='ignore')),
-    ('imputer', KNNImputer(n_neighbors=5))
-
-])
-
-# Combine transformers using ColumnTransformer
-preprocessor = ColumnTransformer(
-    transformers=[
-        ('num', numerical_transformer, numerical_features),
-        ('cat', categorical_transformer, categorical_features)
-    ]
-)
-
-# Define the XGBoost classifier
-xgb = XGBClassifier(eval_metric='logloss', use_label_encoder=False)
-
-# Create a full pipeline with preprocessing and classifier
-pipeline = Pipeline(steps=[
-    ('preprocessor', preprocessor),
-    ('classifier', xgb)
-])
-
-# Define parameter grid for GridSearchCV
-# scale_pos_weight is on the higher end as there is significant data imbalance
-# param grid values are based on previous experiments with given data set
-# param values are chosen in such a way to avoid long running time in colab - these can be adjusted to wider and higher range in high performing environment
+# threshold can be a list - the model is scored once and all thresholds come from the same probabilities
+# ROC AUC and the precision-recall curve are computed from the probabilities
+
+# Build the pipeline with cleaning, preprocessing and classifier (ds_train.build_pipeline)
+# KNN is used for both numerical and categorical data types based on data analysis
+# IndexedKNNImputer picks the same neighbours as sklearn KNNImputer (equally distant ones in row order) but uses a KD tree
+#   instead of comparing every row pair
+# Scaling is added as cap gains variance is wider compared to others
+# sparse_preprocessing=True keeps the one hot output as CSR all the way into XGBoost (see benchmarks/bench_sparse.py)
+# Alternative preprocessor - skip one hot and KNN imputation and let XGBoost handle categories and NaNs natively
+# Both are evaluated in the grid search (see benchmarks/bench_native.py for a side by side comparison)
+sparse_preprocessing = False
+pipeline, preprocessors = build_pipeline(X_train, sparse=sparse_preprocessing)
+
+# Parameter grid for the search is ds_train.PARAM_GRID (the preprocessors are added to it)
 # Scope of additional param evaluation exists
-param_grid = {
-    'classifier__n_estimators': [500,1000],
-    'classifier__max_depth': [3,5],
-    'classifier__learning_rate': [0.005,0.2],
-    'classifier__scale_pos_weight': [10,12],
-    'verbose' : [1]
-}
-
-# Split the data
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+param_grid = dict(PARAM_GRID)
 
 # Using Grid search CV for hyper param tuning
 # cv used is minimum for local performance - this can be increased in a high performing environment
 # scoring is based on recall rather than accuracy/F1 as the goal assumption is to correctly predict the postive cases >60K
 #.   while trying to maintain precision recall balance
-grid_search = GridSearchCV(estimator=pipeline, param_grid=param_grid, scoring='recall', cv=3, n_jobs=-1, verbose=2)
-grid_search.fit(X_train, y_train)
+# FoldCachedSearchCV gives the same results as GridSearchCV but fits the preprocessing (KNN imputers) once per fold
+#   and reuses the transformed folds for all classifier params
+# search_mode = 'halving' searches a much wider space (depth, subsample, colsample, min_child_weight, scale_pos_weight)
+#   with successive halving over rows and boosting rounds, XGBoost early stopping and a time budget in seconds
+# every (params, fold) result of the grid search is stored under results_dir keyed by the data/pipeline fingerprint,
+#   so a rerun on unchanged data or with extra grid values only evaluates the new combinations
+# the preprocessed folds are memory mapped once so the parallel workers do not each get a copy
+search_mode = 'grid'
+search_time_budget = 30 * 60
+grid_search = build_search(pipeline, preprocessors, search_mode=search_mode, param_grid=param_grid,
+                           time_budget=search_time_budget, results_dir='/content/search_results')
+grid_search.fit(X_search, y_search)
+print(f"Preprocessing time saved by the fold cache: {grid_search.time_saved_:.1f}s")
 
 #Store the best model for further predictions and view the params and best recall score
 best_model = grid_search.best_estimator_
@@ -145,22 +103,35 @@ print("Best Score:", best_score)
 
 #check the model performance using the custom function for train data
 #using default threshold of 0.5
-model_evaluation(best_model, X_train, y_train)
+model_evaluation(best_model, X_search, y_search)
 
 # Save the pipeline
-import joblib
-joblib.dump(best_model, '/content/xgb_pipeline.pkl')
+# the artifact directory is the fast loading export for scoring (ds_score.py / ds_serve.py accept either)
+save_model(best_model, '/content/xgb_pipeline.pkl', artifact_dir='/content/xgb_artifact')
 
 # Load the pipeline
+import joblib
 loaded_pipeline = joblib.load('/content/xgb_pipeline.pkl')
 
 # predict outcome with the test set if the test set doesn't have a target value already to evaluate metrics
-# test set needs to have the same columns as that of train set (columns 'Country','LotSize','Suburban','OwnHouse','WorkClass' should be dropped if exists)
+# test set needs to have the columns the model was trained on, other columns are ignored
 y_pred = loaded_pipeline.predict(X_test)
 
 #check the model performance using the custom function for test data if target value is available
-#using default threshold of 0.5
-model_evaluation(loaded_pipeline, X_test, y_test)
-
-#verifying for a different threshold
-model_evaluation(loaded_pipeline, X_test, y_test,threshold = 0.4)
\ No newline at end of file
+#using default threshold of 0.5 and verifying for a different threshold from the same scores
+test_result = model_evaluation(loaded_pipeline, X_test, y_test, threshold = [0.5, 0.4])
+
+#full threshold sweep (0 to 1 in steps of 0.01) from the same scores to pick the operating threshold
+threshold_sweep = threshold_table(y_test, test_result['scores'])
+print(threshold_sweep.to_string(index=False))
+
+# Fast tier for the request path (ds_distill.py) - the first trees of the tuned model (pruned) or small models
+#   fitted on its probabilities (distilled), with the same preprocessing
+# the fastest candidate within 1% recall of the tuned model on the validation rows held out before the search is kept
+#   (the students are fitted on the tuned model's probabilities for the rows it was trained on),
+#   the tradeoff table/plot has tree time, latency, size, recall and precision of every candidate
+fast_model, tradeoff = distill_model(best_model, X_search, X_valid, y_valid, threshold=0.5, max_recall_loss=0.01)
+print(tradeoff.to_string(index=False))
+plot_tradeoff(tradeoff)
+fast_result = model_evaluation(fast_model, X_test, y_test, threshold=0.5)
+save_model(fast_model, '/content/xgb_fast_pipeline.pkl', artifact_dir='/content/xgb_fast_artifact')
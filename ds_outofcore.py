@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Out-of-core training of the final model pipeline from a csv/parquet file read in chunks
+
+    model, info = fit_outofcore('big_extract.csv', pipeline)
+
+  * train/validation split is a hash of the row content, so it is the same whatever the chunk size
+    and never needs the whole file (rows with the same values always land on the same side)
+  * the preprocessing (cleaner + preprocessor) is fitted on the first fit_rows training rows - the KNN
+    imputers keep these rows as donors, so this bounds their memory as well
+  * every chunk is preprocessed as it is read and handed to XGBoost through a DataIter, XGBoost keeps
+    only its quantised copy (QuantileDMatrix) or pages it to disk (ExtMemQuantileDMatrix, external_memory=True)
+The returned pipeline has the same steps as the in-memory one, so ds_score/ds_compile/ds_artifact work on it.
+See benchmarks/bench_outofcore.py for peak memory against the in-memory path.
+"""
+
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+
+from ds_columns import split_X_y
+from ds_score import iter_input
+
+
+def hash_split(data, validation_fraction=0.2, seed=42):
+    """True for the rows that go to validation, from a hash of the row values"""
+    # each chunk gets the smallest numeric dtype that holds it (float where it has a NaN) and the hash of a value
+    # depends on its dtype, so the numerics are hashed as float64 whatever the chunk
+    numeric = data.select_dtypes(include='number').columns
+    data = data.astype(dict.fromkeys(numeric, np.float64))
+    hashes = pd.util.hash_pandas_object(data, index=False, hash_key=f'{seed:016d}'[-16:]).to_numpy()
+    return hashes < np.uint64(validation_fraction * np.iinfo(np.uint64).max)
+
+
+class _ChunkIter(xgboost.DataIter):
+    """Feeds the preprocessed training or validation part of each chunk to XGBoost"""
+
+    def __init__(self, path, transform, validation, validation_fraction, seed, chunksize, drop_columns=None,
+                 cache_prefix=None):
+        self.path = path
+        self.transform = transform
+        self.validation = validation
+        self.validation_fraction = validation_fraction
+        self.seed = seed
+        self.chunksize = chunksize
+        self.drop_columns = drop_columns
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self.reset()
+        for chunk in self._chunks:
+            part = chunk[hash_split(chunk, self.validation_fraction, self.seed) == self.validation]
+            if len(part):
+                X, y = split_X_y(part, self.drop_columns)
+                input_data(data=self.transform(X), label=y.to_numpy())
+                return True
+        return False
+
+    def reset(self):
+        self._chunks = iter_input(self.path, self.chunksize)
+
+
+def _preprocessing_sample(path, validation_fraction, seed, chunksize, fit_rows, drop_columns):
+    # first fit_rows rows of the training side
+    parts, n = [], 0
+    for chunk in iter_input(path, chunksize):
+        part = chunk[~hash_split(chunk, validation_fraction, seed)]
+        parts.append(part.head(fit_rows - n))
+        n += len(parts[-1])
+        if n >= fit_rows:
+            break
+    sample = pd.concat(parts, ignore_index=True)
+    # chunks have their own categories so concat gives strings, back to category with the union of the values
+    for column in sample.columns:
+        if not pd.api.types.is_numeric_dtype(sample[column]):
+            sample[column] = sample[column].astype('category')
+    return split_X_y(sample, drop_columns)
+
+
+def fit_outofcore(path, pipeline, chunksize=100_000, validation_fraction=0.2, fit_rows=50_000, seed=42,
+                  external_memory=False, cache_dir=None, early_stopping_rounds=None, threshold=0.5, drop_columns=None):
+    """Fit pipeline (cleaner -> preprocessor -> XGBClassifier) on the file at path without loading it
+
+    Returns the fitted pipeline and a dict with the row counts, validation recall/precision at threshold
+    and the time taken. n_estimators and the other classifier settings are taken from the pipeline.
+    drop_columns is the column selection (DROP_COLUMNS by default, see ds_relevance.py to recompute it).
+    """
+    start = time.perf_counter()
+    X_sample, y_sample = _preprocessing_sample(path, validation_fraction, seed, chunksize, fit_rows, drop_columns)
+    preprocessing = clone(Pipeline(pipeline.steps[:-1])).fit(X_sample, y_sample)
+    del X_sample, y_sample
+
+    classifier = clone(pipeline.steps[-1][1])
+    params = {key: value for key, value in classifier.get_xgb_params().items() if value is not None}
+    matrix_args = {'max_bin': classifier.max_bin or 256, 'enable_categorical': bool(classifier.enable_categorical)}
+    with tempfile.TemporaryDirectory(dir=cache_dir) as cache:
+        train_iter = _ChunkIter(path, preprocessing.transform, False, validation_fraction, seed, chunksize, drop_columns,
+                                cache_prefix=os.path.join(cache, 'train') if external_memory else None)
+        valid_iter = _ChunkIter(path, preprocessing.transform, True, validation_fraction, seed, chunksize, drop_columns)
+        if external_memory:
+            dtrain = xgboost.ExtMemQuantileDMatrix(train_iter, **matrix_args)
+        else:
+            dtrain = xgboost.QuantileDMatrix(train_iter, **matrix_args)
+        dvalid = xgboost.QuantileDMatrix(valid_iter, ref=dtrain, **matrix_args)
+        booster = xgboost.train(params, dtrain, num_boost_round=classifier.n_estimators or 100,
+                                evals=[(dvalid, 'validation')], early_stopping_rounds=early_stopping_rounds,
+                                verbose_eval=False)
+        scores = booster.predict(dvalid, iteration_range=(0, booster.best_iteration + 1)
+                                 if early_stopping_rounds else (0, 0))
+        y_valid = dvalid.get_label().astype(bool)
+        n_train = dtrain.num_row()
+        del dtrain, dvalid
+
+    # same wrapper as the in-memory fit, so predict_proba/get_booster/best_iteration behave the same
+    classifier.load_model(bytearray(booster.save_raw('ubj')))
+    predicted = scores >= threshold
+    tp = int((predicted & y_valid).sum())
+    info = {
+        'train_rows': int(n_train),
+        'validation_rows': len(y_valid),
+        'validation_recall': tp / max(int(y_valid.sum()), 1),
+        'validation_precision': tp / max(int(predicted.sum()), 1),
+        'seconds': time.perf_counter() - start,
+    }
+    return Pipeline(preprocessing.steps + [(pipeline.steps[-1][0], classifier)]), info
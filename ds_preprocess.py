@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Preprocessing shared by the final model and the benchmarks
+
+Builds the preprocessor used in DS_Model_Final.py, the column decisions from DS_Analysis.py
+(target, dropped features) live in ds_columns.py and are re-exported here.
+"""
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.utils.validation import check_is_fitted
+
+from ds_columns import DROP_COLUMNS, POSITIVE_LABEL, TARGET, code_target, prepare_features, split_X_y  # noqa: F401 - re-exported
+from ds_data import NA_VALUES, clean_categorical
+from ds_impute import IndexedKNNImputer
+
+
+def feature_types(X):
+    # any numeric width and both object and category strings (ds_data.load_data downcasts and uses category)
+    numerical_features = X.select_dtypes(include=['number']).columns
+    categorical_features = X.select_dtypes(include=['object', 'category']).columns
+    return numerical_features, categorical_features
+
+
+class CategoricalCleaner(TransformerMixin, BaseEstimator):
+    """Strip whitespace, map sentinels ('?') to NaN and optionally integer encode the string columns
+
+    Replaces the per cell applymap/replace and the LabelEncoder loop of DS_Analysis.py.
+    Each column is converted to category once and the cleaning is done on its categories,
+    so the cost per cell is a code lookup. Can be the first step of the model Pipeline.
+
+    columns : string columns to clean, default is all object/category columns seen in fit
+    encode : False returns category columns with the categories seen in fit,
+             True returns the integer codes as float with NaN for missing/unknown values
+    """
+
+    def __init__(self, columns=None, na_values=tuple(NA_VALUES), encode=False):
+        self.columns = columns
+        self.na_values = na_values
+        self.encode = encode
+
+    def _fit(self, X):
+        # cleaned columns of X, their categories are the ones seen in fit
+        columns = self.columns
+        if columns is None:
+            columns = X.select_dtypes(include=['object', 'category']).columns
+        cleaned = {column: clean_categorical(X[column], list(self.na_values)) for column in columns}
+        self.categories_ = {column: values.cat.categories for column, values in cleaned.items()}
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.n_features_in_ = X.shape[1]
+        return cleaned
+
+    def _output(self, X, cleaned):
+        out = X.copy()
+        for column, values in cleaned.items():
+            if self.encode:
+                codes = values.cat.codes.to_numpy().astype(np.float64)
+                codes[codes < 0] = np.nan
+                out[column] = codes
+            else:
+                out[column] = values
+        return out
+
+    def fit(self, X, y=None):
+        self._fit(X)
+        return self
+
+    def fit_transform(self, X, y=None, **fit_params):
+        # the columns cleaned in fit already have the fitted categories, no second cleaning pass
+        return self._output(X, self._fit(X))
+
+    def transform(self, X):
+        check_is_fitted(self, 'categories_')
+        return self._output(X, {
+            column: clean_categorical(X[column], list(self.na_values)).cat.set_categories(categories)
+            for column, categories in self.categories_.items()
+        })
+
+    def inverse_transform(self, X):
+        # decode integer codes (rounded, as after KNN imputation) back to the category values
+        check_is_fitted(self, 'categories_')
+        out = X.copy()
+        for column, categories in self.categories_.items():
+            codes = np.asarray(X[column], dtype=np.float64)
+            codes = np.where(np.isnan(codes), -1, np.clip(np.round(codes), 0, len(categories) - 1)).astype(int)
+            out[column] = pd.Categorical.from_codes(codes, categories=categories)
+        return out
+
+    def get_feature_names_out(self, input_features=None):
+        return self.feature_names_in_
+
+
+def build_preprocessor(numerical_features, categorical_features, sparse=False):
+    """Preprocessor of the final model
+
+    With sparse=True the one hot output stays CSR and the ColumnTransformer stacks everything
+    into one CSR matrix that is passed to XGBoost as is (no dense float64 copy of the one hot columns).
+    Missing values never reach the one hot block (OneHotEncoder keeps NaN as its own category),
+    so the categorical imputer passes sparse input straight through.
+    Note that XGBoost treats the absent entries of a sparse matrix as missing rather than 0,
+    so the trees learn a default direction for them instead of a split on 0.
+    """
+    # Scaling is added as cap gains variance is wider compared to others
+    numerical_transformer = Pipeline(steps=[
+        ('imputer', IndexedKNNImputer(n_neighbors=5)),
+        ('scaler', StandardScaler())
+    ])
+
+    categorical_transformer = Pipeline(steps=[
+        ('onehot', OneHotEncoder(sparse_output=sparse, handle_unknown='ignore')),
+        ('imputer', IndexedKNNImputer(n_neighbors=5))
+    ])
+
+    return ColumnTransformer(
+        transformers=[
+            ('num', numerical_transformer, numerical_features),
+            ('cat', categorical_transformer, categorical_features)
+        ],
+        # 1.0 always stacks to CSR when any block is sparse, 0 always returns dense
+        sparse_threshold=1.0 if sparse else 0
+    )
+
+
+class NativeCategoricalEncoder(TransformerMixin, BaseEstimator):
+    """Preprocessor for XGBoost's native categorical and missing value support
+
+    Skips one hot encoding and imputation: numerical columns are passed on as float with their NaNs,
+    categorical columns become pandas category columns with the categories seen in fit
+    (so the codes are the same at train and predict time, unknown values become NaN).
+    The classifier needs enable_categorical=True and tree_method='hist'.
+    """
+
+    def __init__(self, numerical_features, categorical_features):
+        self.numerical_features = numerical_features
+        self.categorical_features = categorical_features
+
+    def fit(self, X, y=None):
+        self.categories_ = {
+            column: pd.Index(np.unique(X[column].dropna().astype(str)))
+            for column in self.categorical_features
+        }
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    def transform(self, X):
+        check_is_fitted(self, 'categories_')
+        out = pd.DataFrame(index=X.index)
+        for column in self.numerical_features:
+            out[column] = X[column].astype(np.float64)
+        for column in self.categorical_features:
+            out[column] = pd.Categorical(X[column], categories=self.categories_[column])
+        return out
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(list(self.numerical_features) + list(self.categorical_features), dtype=object)
+
+
+def build_native_preprocessor(numerical_features, categorical_features):
+    # alternative to build_preprocessor, selectable as the 'preprocessor' step in GridSearchCV
+    return NativeCategoricalEncoder(list(numerical_features), list(categorical_features))
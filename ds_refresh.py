@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""Incremental refresh of the saved pipeline with a new batch of labelled records
+
+    python ds_refresh.py --model xgb_pipeline.pkl --batch new_records.csv --out xgb_pipeline_refreshed.pkl
+
+  * the fitted preprocessing is kept frozen - the existing trees split on the scaled/encoded values,
+    so refitting the scaler or the encoders would move the inputs under them (new categories are
+    treated as unknown, the same as when scoring)
+  * n_rounds boosting rounds are added to the existing booster on the new batch (XGBoost warm start),
+    instead of rerunning the search over all the history
+  * the refreshed model is kept only if its recall on the holdout does not drop by more than
+    max_recall_drop, otherwise the current model is returned unchanged (rolled back)
+See benchmarks/bench_refresh.py for refresh time and recall against a full retrain.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+
+
+def _recall_precision(model, X, y, threshold):
+    predicted = model.predict_proba(X)[:, 1] >= threshold
+    y = np.asarray(y).astype(bool)
+    tp = int((predicted & y).sum())
+    return tp / max(int(y.sum()), 1), tp / max(int(predicted.sum()), 1)
+
+
+def refresh_model(model, X_new, y_new, X_holdout, y_holdout, n_rounds=50, learning_rate=None, threshold=0.5,
+                  max_recall_drop=0.0):
+    """Add n_rounds boosting rounds on (X_new, y_new) to the fitted pipeline, guarded by the holdout recall
+
+    learning_rate overrides the classifier's for the new rounds (a lower one makes smaller corrections).
+    Returns (model, report) - model is the refreshed pipeline or the input one when rolled back.
+    """
+    start = time.perf_counter()
+    preprocessing = Pipeline(model.steps[:-1])
+    name, classifier = model.steps[-1]
+    Xt_new = preprocessing.transform(X_new)
+
+    # no early stopping on the new rounds, there is no validation set (the holdout guards the result)
+    refreshed = clone(classifier).set_params(n_estimators=n_rounds, early_stopping_rounds=None)
+    if learning_rate is not None:
+        refreshed.set_params(learning_rate=learning_rate)
+    # xgb_model continues boosting from the current trees
+    refreshed.fit(Xt_new, np.asarray(y_new), xgb_model=classifier.get_booster())
+    # the booster keeps best_iteration of an early stopped source model, predict (and ds_compile) would
+    # then stop at the old trees and ignore the new rounds
+    refreshed.get_booster().set_attr(best_iteration=None, best_score=None)
+    candidate = Pipeline(model.steps[:-1] + [(name, refreshed)])
+    refresh_s = time.perf_counter() - start
+
+    recall_before, precision_before = _recall_precision(model, X_holdout, y_holdout, threshold)
+    recall_after, precision_after = _recall_precision(candidate, X_holdout, y_holdout, threshold)
+    rolled_back = recall_after < recall_before - max_recall_drop
+    report = {
+        'rows': len(X_new),
+        'rounds_before': classifier.get_booster().num_boosted_rounds(),
+        'rounds_after': refreshed.get_booster().num_boosted_rounds(),
+        'recall_before': recall_before,
+        'recall_after': recall_after,
+        'precision_before': precision_before,
+        'precision_after': precision_after,
+        'rolled_back': bool(rolled_back),
+        'refresh_s': refresh_s,
+    }
+    return (model if rolled_back else candidate), report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Refresh the saved pipeline with a new labelled batch')
+    parser.add_argument('--model', default='/content/xgb_pipeline.pkl')
+    parser.add_argument('--batch', required=True, help='csv/parquet of new labelled records')
+    parser.add_argument('--holdout', default=None,
+                        help='csv/parquet of labelled records for the recall check, default is a hash split 20%% of the batch')
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--learning-rate', type=float, default=None)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--max-recall-drop', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    import joblib
+    import pandas as pd
+    from ds_columns import split_X_y
+    from ds_outofcore import hash_split
+    from ds_score import iter_input
+
+    def read(path):
+        return pd.concat(iter_input(path), ignore_index=True)
+
+    batch = read(args.batch)
+    if args.holdout is None:
+        is_holdout = hash_split(batch)
+        batch, holdout = batch[~is_holdout], batch[is_holdout]
+    else:
+        holdout = read(args.holdout)
+    # all columns are kept, the frozen preprocessing takes the ones the model was trained on
+    X_new, y_new = split_X_y(batch, drop_columns=())
+    X_holdout, y_holdout = split_X_y(holdout, drop_columns=())
+
+    model, report = refresh_model(joblib.load(args.model), X_new, y_new, X_holdout, y_holdout, n_rounds=args.rounds,
+                                  learning_rate=args.learning_rate, threshold=args.threshold,
+                                  max_recall_drop=args.max_recall_drop)
+    for key, value in report.items():
+        print(f'{key}: {value}')
+    joblib.dump(model, args.out)
+    print(f"{'Current model kept' if report['rolled_back'] else 'Refreshed model'} saved to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Feature relevance (correlation + chi2) from one streaming pass, for the column selection of the final model
+
+    relevance = feature_relevance('big_extract.csv')
+    keep, drop = relevance.select()
+    X, y = split_X_y(data, drop)
+
+Replaces the df.corr() heatmaps, LabelEncoder pass and chi2(X, y) of DS_Analysis.py that led to the
+hand written DROP_COLUMNS, so the selection can be redone on every retrain without loading the data.
+Every chunk only adds to the sufficient statistics
+  * numerics + the 0/1 response: per pair row counts, sums, sums of squares and cross products over the
+    rows where both are present -> pairwise complete Pearson correlation, the same as df.corr()
+    (values are shifted by the first chunk's means to keep the sums well conditioned)
+  * categoricals: category x class contingency counts -> chi2 test of independence and Cramer's V
+    (missing values are left out, as in the test on the encoded columns)
+"""
+
+import numpy as np
+import pandas as pd
+
+from ds_columns import POSITIVE_LABEL, TARGET, code_target
+
+
+def _add(total, part):
+    return part if total is None else total.add(part, fill_value=0)
+
+
+class RelevanceStats:
+    """Sufficient statistics for correlation and chi2 scores, accumulated with update(chunk)"""
+
+    def __init__(self, target=TARGET, positive_label=POSITIVE_LABEL):
+        self.target = target
+        self.positive_label = positive_label
+        self.n_rows = 0
+        self.numerical_features = None
+        self.categorical_features = None
+        self._shift = None
+        self._n = self._sums = self._squares = self._products = None
+        self._tables = {}
+
+    def update(self, chunk):
+        y = code_target(chunk[self.target], self.positive_label).to_numpy()
+        if self.numerical_features is None:
+            features = chunk.drop(columns=[self.target])
+            self.numerical_features = list(features.select_dtypes(include=['number']).columns)
+            self.categorical_features = [column for column in features.columns if column not in self.numerical_features]
+        self.n_rows += len(chunk)
+
+        # numerics and the response as the last column, NaN -> 0 with a presence mask
+        values = np.column_stack([chunk[self.numerical_features].to_numpy(dtype=np.float64), y])
+        if self._shift is None:
+            self._shift = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(values.shape[1])
+            k = values.shape[1]
+            self._n, self._sums, self._squares, self._products = (np.zeros((k, k)) for _ in range(4))
+        present = ~np.isnan(values)
+        values = np.where(present, values - self._shift, 0.0)
+        mask = present.astype(np.float64)
+        # [i, j] is over the rows where both i and j are present
+        self._n += mask.T @ mask
+        self._sums += values.T @ mask
+        self._squares += (values * values).T @ mask
+        self._products += values.T @ values
+
+        for column in self.categorical_features:
+            categorical = chunk[column]
+            if not isinstance(categorical.dtype, pd.CategoricalDtype):
+                categorical = categorical.astype('category')
+            codes = categorical.cat.codes.to_numpy().astype(np.int64)
+            present = codes >= 0
+            counts = np.bincount(codes[present] * 2 + y[present], minlength=2 * len(categorical.cat.categories))
+            table = pd.DataFrame(counts.reshape(-1, 2), index=categorical.cat.categories.astype(str), columns=[0, 1])
+            self._tables[column] = _add(self._tables.get(column), table)
+        return self
+
+    def correlation(self):
+        """Pairwise complete Pearson correlation of the numerics and the response (same as df.corr())"""
+        n, sums, squares = self._n, self._sums, self._squares
+        covariance = n * self._products - sums * sums.T
+        variance = (n * squares - sums ** 2) * (n * squares.T - sums.T ** 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = np.where((n > 1) & (variance > 0), covariance / np.sqrt(variance), np.nan)
+        columns = self.numerical_features + [self.target]
+        return pd.DataFrame(np.clip(corr, -1, 1), index=columns, columns=columns)
+
+    def contingency(self, column):
+        """Category x class counts of a categorical column"""
+        table = self._tables[column].astype(np.int64)
+        return table[table.sum(axis=1) > 0].rename_axis(index=column, columns=self.target)
+
+    def chi2(self):
+        """chi2 test of independence with the response for every categorical, with Cramer's V"""
+        from scipy.stats import chi2 as chi2_distribution
+
+        rows = []
+        for column in self.categorical_features:
+            observed = self.contingency(column).to_numpy().astype(np.float64)
+            total = observed.sum()
+            expected = observed.sum(axis=1, keepdims=True) * observed.sum(axis=0, keepdims=True) / max(total, 1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                statistic = float(np.nansum(np.where(expected > 0, (observed - expected) ** 2 / expected, 0)))
+            dof = (observed.shape[0] - 1) * (int((observed.sum(axis=0) > 0).sum()) - 1)
+            rows.append({
+                'feature': column,
+                'chi2': statistic,
+                'dof': dof,
+                'p_value': float(chi2_distribution.sf(statistic, dof)) if dof > 0 else 1.0,
+                # 2 classes so min(rows, columns) - 1 is 1
+                'cramers_v': float(np.sqrt(statistic / total)) if total else 0.0,
+                'rows': int(total),
+            })
+        return pd.DataFrame(rows, columns=['feature', 'chi2', 'dof', 'p_value', 'cramers_v', 'rows']).set_index('feature')
+
+    def scores(self):
+        """One row per feature: kind, score (|correlation| or Cramer's V) and p value, best first"""
+        from scipy.stats import t as t_distribution
+
+        corr = self.correlation()[self.target].drop(self.target)
+        n = pd.Series(np.diag(self._n)[:-1], index=self.numerical_features)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = corr * np.sqrt((n - 2) / (1 - corr ** 2))
+        numeric = pd.DataFrame({'kind': 'numerical', 'score': corr.abs(), 'correlation': corr,
+                                'p_value': 2 * t_distribution.sf(np.abs(t), np.maximum(n - 2, 1))})
+        chi2 = self.chi2()
+        categorical = pd.DataFrame({'kind': 'categorical', 'score': chi2['cramers_v'], 'chi2': chi2['chi2'],
+                                    'p_value': chi2['p_value']})
+        table = pd.concat([numeric, categorical]).rename_axis('feature')
+        return table.sort_values('score', ascending=False)
+
+    def select(self, min_abs_corr=0.015, min_cramers_v=0.015, max_p_value=0.05, keep=(), drop=()):
+        """(kept, dropped) columns - a numeric needs |correlation| >= min_abs_corr and a categorical
+        Cramer's V >= min_cramers_v, both with p value <= max_p_value. keep/drop force columns either way.
+        """
+        scores = self.scores()
+        threshold = np.where(scores['kind'] == 'numerical', min_abs_corr, min_cramers_v)
+        relevant = (scores['score'] >= threshold) & (scores['p_value'] <= max_p_value)
+        relevant = (relevant | scores.index.isin(keep)) & ~scores.index.isin(drop)
+        features = self.numerical_features + self.categorical_features
+        return ([column for column in features if relevant[column]],
+                [column for column in features if not relevant[column]])
+
+
+def feature_relevance(data, chunksize=100_000, **kwargs):
+    """RelevanceStats over a csv/parquet path (read in chunks) or an in-memory frame, kwargs go to RelevanceStats"""
+    if isinstance(data, str):
+        from ds_score import iter_input
+        chunks = iter_input(data, chunksize)
+    else:
+        chunks = (data.iloc[start:start + chunksize] for start in range(0, len(data), chunksize))
+    stats = RelevanceStats(**kwargs)
+    for chunk in chunks:
+        stats.update(chunk)
+    return stats
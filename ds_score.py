@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Batch scoring of new records with the saved pipeline (xgb_pipeline.pkl) or a ds_artifact directory
+
+    python ds_score.py --model xgb_pipeline.pkl --input new_records.csv --output scores.csv --threshold 0.4
+
+  * the input (csv or parquet) is read in chunks with the same cleaning as load_data, so memory
+    stays flat however large the file is
+  * the target and the dropped columns are removed if present, extra columns are ignored
+  * chunks are scored in a process pool, each worker loads the model once at start up
+  * at most 2 chunks per worker are in flight and results are written in input order as they finish
+  * output (csv or parquet, by extension) has the row number, the >60K probability and the 0/1 label
+  * --cache-size N keeps the probabilities of up to N distinct records per worker (ds_cache.py)
+  * --explain K adds the top K reasons (input column, value, log odds contribution) of every row labelled
+    >60K (--explain-all for every row) from the booster's TreeSHAP contributions (ds_explain.py, needs xgboost)
+
+This is the scoring path - it imports numpy/pandas and the light ds_columns/ds_data modules only,
+sklearn/xgboost come in with the pickle (an artifact needs neither, see benchmarks/check_startup.py).
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ds_columns import prepare_features
+from ds_data import iter_chunks, iter_parquet_chunks
+
+# model loaded once per worker process by _init_worker
+_model = None
+# (Explainer, top_k, threshold, all_rows) when explaining
+_explain = None
+
+
+def load_model(path):
+    """ds_artifact directory or joblib pickle of the fitted pipeline, both have predict_proba"""
+    if os.path.isdir(path):
+        from ds_artifact import load_artifact
+        return load_artifact(path)
+    import joblib
+    return joblib.load(path)
+
+
+def _init_worker(model_path, cache_size=0, explain=None):
+    global _model, _explain
+    _model = load_model(model_path)
+    if explain is not None:
+        from ds_explain import Explainer
+        top_k, threshold, all_rows, approximate = explain
+        if os.path.isdir(model_path):
+            from ds_artifact import load_booster
+            explainer = Explainer(_model, load_booster(model_path), approximate=approximate)
+        else:
+            explainer = Explainer.from_pipeline(_model, approximate=approximate)
+        _explain = (explainer, top_k, threshold, all_rows)
+    if cache_size:
+        from ds_cache import PredictionCache, model_version
+        _model = PredictionCache(_model, version=model_version(model_path), max_entries=cache_size)
+
+
+def _score_chunk(X):
+    # probabilities, the number of cache hits in the chunk and the reasons (None unless explaining)
+    hits = getattr(_model, 'hits', 0)
+    proba = _model.predict_proba(X)[:, 1]
+    hits = getattr(_model, 'hits', 0) - hits
+    if _explain is None:
+        return proba, hits, None
+    explainer, top_k, threshold, all_rows = _explain
+    labels = proba >= threshold
+    rows = np.arange(len(X)) if all_rows else np.flatnonzero(labels)
+    reasons = explainer.explain(X.iloc[rows], top_k, labels=labels[rows])
+    # rows that are not explained get empty reasons
+    reasons.index = rows
+    return proba, hits, reasons.reindex(np.arange(len(X)))
+
+
+def iter_input(path, chunksize=100_000):
+    if path.endswith('.parquet'):
+        return iter_parquet_chunks(path, chunksize)
+    return iter_chunks(path, chunksize)
+
+
+class _Writer:
+    """Appends scored chunks to a csv or parquet file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._parquet = None
+        self._header = True
+
+    def write(self, frame):
+        if self.path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='w' if self._header else 'a', header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def score_file(model_path, input_path, output_path, threshold=0.5, chunksize=100_000, n_workers=None,
+               id_column=None, verbose=True, cache_size=0, explain=0, explain_all=False, approximate=False):
+    """Score input_path chunk by chunk and write the probabilities/labels to output_path
+
+    cache_size > 0 puts a ds_cache.PredictionCache of that many rows in front of the model in every worker,
+    so repeated records are scored once per worker.
+    explain > 0 adds that many reasons per row labelled 1 (every row with explain_all) as ds_explain columns,
+    approximate uses xgboost's approximate contributions instead of TreeSHAP.
+    Returns a dict with rows, seconds, rows_per_second and cache_hits.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    writer = _Writer(output_path)
+    pending = deque()
+    rows, cache_hits, start = 0, 0, time.perf_counter()
+    explain_args = (explain, threshold, explain_all, approximate) if explain else None
+
+    def flush_one():
+        nonlocal rows, cache_hits
+        ids, future = pending.popleft()
+        proba, hits, reasons = future.result()
+        cache_hits += hits
+        out = pd.DataFrame({'row': np.arange(rows, rows + len(proba))})
+        if id_column is not None:
+            out[id_column] = ids
+        out['probability'] = proba
+        out['label'] = (proba >= threshold).astype(np.int8)
+        if reasons is not None:
+            out = pd.concat([out, reasons.reset_index(drop=True)], axis=1)
+        writer.write(out)
+        rows += len(proba)
+        if verbose:
+            elapsed = time.perf_counter() - start
+            print(f'{rows:,} rows scored, {rows / elapsed:,.0f} rows/s', file=sys.stderr)
+
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(model_path, cache_size, explain_args)) as pool:
+            for chunk in iter_input(input_path, chunksize):
+                ids = chunk[id_column].to_numpy() if id_column is not None else None
+                # only the target is dropped, the model takes the columns it was trained on by name
+                pending.append((ids, pool.submit(_score_chunk, prepare_features(chunk, drop_columns=()))))
+                # keep the number of chunks in memory bounded
+                while len(pending) >= 2 * n_workers:
+                    flush_one()
+            while pending:
+                flush_one()
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {'rows': rows, 'seconds': elapsed, 'rows_per_second': rows / elapsed if elapsed else float('nan'),
+            'cache_hits': cache_hits}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a csv/parquet file with the saved pipeline')
+    parser.add_argument('--model', default='/content/xgb_pipeline.pkl', help='pickle or artifact directory')
+    parser.add_argument('--input', required=True)
+    parser.add_argument('--output', required=True, help='.csv or .parquet')
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=None, help='default: number of cpus')
+    parser.add_argument('--id-column', default=None, help='input column copied to the output')
+    parser.add_argument('--cache-size', type=int, default=0, help='rows kept in the prediction cache of each worker')
+    parser.add_argument('--explain', type=int, default=0, metavar='K', help='top K reasons per row labelled 1')
+    parser.add_argument('--explain-all', action='store_true', help='reasons for every row, not only the 1 labels')
+    parser.add_argument('--approximate', action='store_true', help='approximate contributions, faster than TreeSHAP')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    stats = score_file(args.model, args.input, args.output, threshold=args.threshold, chunksize=args.chunksize,
+                       n_workers=args.workers, id_column=args.id_column, verbose=not args.quiet,
+                       cache_size=args.cache_size, explain=args.explain, explain_all=args.explain_all,
+                       approximate=args.approximate)
+    print(f"Scored {stats['rows']:,} rows in {stats['seconds']:.1f}s ({stats['rows_per_second']:,.0f} rows/s)")
+    if args.cache_size:
+        print(f"Prediction cache hits: {stats['cache_hits']:,} ({stats['cache_hits'] / max(stats['rows'], 1):.1%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,585 @@
+# -*- coding: utf-8 -*-
+"""Hyper parameter search with the preprocessing fitted once per CV fold
+
+GridSearchCV refits the whole pipeline (cleaner, KNN imputers, one hot...) for every
+parameter combination on every fold, although the tuned classifier parameters do not touch
+the preprocessing. FoldCachedSearchCV splits the param grid in preprocessing parameters and
+classifier parameters: for each preprocessing setting the preprocessing steps are fitted and
+applied once per fold, the transformed fold matrices are kept in a bounded cache and every
+classifier setting is trained on them. Settings of a list of grids that share the same
+preprocessing reuse the cached folds.
+Folds, scoring and refit of the best estimator are the same as GridSearchCV.
+
+HalvingBoostSearchCV uses the same fold cache for a budgeted successive halving search over
+rows and boosting rounds, with XGBoost early stopping on the validation folds.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from joblib import Parallel, delayed, effective_n_jobs
+from scipy.stats import loguniform, randint, rankdata, uniform
+from sklearn.base import clone
+from sklearn.metrics import check_scoring
+from sklearn.model_selection import ParameterGrid, ParameterSampler, check_cv
+from sklearn.utils import check_random_state
+from xgboost.callback import TrainingCallback
+
+from ds_data import peak_rss_mb
+
+
+class FoldCache:
+    """Bounded LRU cache of transformed fold matrices
+
+    max_bytes : total size kept, least recently used entries are evicted above it
+    directory : if set, numpy arrays and the arrays of sparse matrices are written there and read back
+                memory mapped, so the cache holds only file handles. Frames (the native preprocessor
+                output, with category columns) are not memory mapped, they stay in memory and joblib
+                pickles them to every task like without a directory.
+                joblib passes memory mapped arrays to its workers by reference, so with a directory
+                on /dev/shm every worker reads the same pages instead of getting its own copy.
+                The workers reopen the files by name, so the files of evicted entries are only deleted
+                by release(), called once the fits that may still use them are done.
+    """
+
+    def __init__(self, max_bytes=2 * 1024 ** 3, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._retired = []
+
+    def get(self, key):
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, value):
+        if key in self._entries:
+            self._drop(key)
+        size = sum(_nbytes(part) for part in value)
+        files = []
+        if self.directory is not None:
+            value = tuple(self._to_disk(part, files) for part in value)
+        self._entries[key] = (value, size, files)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+        return value
+
+    def clear(self):
+        for key in list(self._entries):
+            self._drop(key)
+        self.release()
+
+    def release(self):
+        # delete the files of the entries dropped since the last call
+        for path in self._retired:
+            if os.path.exists(path):
+                os.remove(path)
+        self._retired = []
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'nbytes': self.nbytes}
+
+    def _save(self, array, files):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.npy', dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+        files.append(path)
+        return np.load(path, mmap_mode='r')
+
+    def _to_disk(self, part, files):
+        if sp.issparse(part):
+            part = part.tocsr()
+            return sp.csr_matrix((self._save(part.data, files), self._save(part.indices, files),
+                                  self._save(part.indptr, files)), shape=part.shape, copy=False)
+        if isinstance(part, (np.ndarray, pd.Series)) and not isinstance(part.dtype, pd.CategoricalDtype):
+            return self._save(np.asarray(part), files)
+        return part
+
+    def _drop(self, key):
+        value, size, files = self._entries.pop(key)
+        self.nbytes -= size
+        self._retired.extend(files)
+
+
+class ResultStore:
+    """Append only store of the (candidate, fold) results of a search
+
+    One jsonl file per search fingerprint in directory; each line holds the hash of the candidate
+    params, the fold, its score and fit time (plus a readable copy of the params).
+    Lines cut short by an interrupted run are ignored on load.
+    """
+
+    def __init__(self, directory, fingerprint):
+        self.path = os.path.join(directory, f'search-{fingerprint}.jsonl')
+
+    def load(self):
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                done[(record['key'], record['fold'])] = (record['score'], record['fit_time'])
+        return done
+
+    def append(self, key, fold, score, fit_time, params):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        record = {'key': key, 'fold': fold, 'score': float(score), 'fit_time': fit_time,
+                  'params': {k: repr(v) for k, v in params.items()}}
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+def _params_key(params):
+    # hash of the candidate params, estimators in the grid are hashed by their (unfitted) params
+    return joblib.hash({k: clone(v, safe=False) for k, v in params.items()})
+
+
+def _nbytes(part):
+    if hasattr(part, 'memory_usage'):
+        return int(part.memory_usage(deep=True).sum())
+    if hasattr(part, 'indptr'):
+        return part.data.nbytes + part.indices.nbytes + part.indptr.nbytes
+    return part.nbytes
+
+
+def _take(X, idx):
+    return X.iloc[idx] if hasattr(X, 'iloc') else X[idx]
+
+
+def _worker_rss():
+    # (pid, peak resident memory in MB) of the process running the task
+    return os.getpid(), peak_rss_mb()
+
+
+def _fit_transform_fold(preprocessing, X, y, train, test):
+    start = time.perf_counter()
+    preprocessing = clone(preprocessing)
+    y_train, y_test = np.asarray(_take(y, train)), np.asarray(_take(y, test))
+    Xt_train = preprocessing.fit_transform(_take(X, train), y_train)
+    Xt_test = preprocessing.transform(_take(X, test))
+    return Xt_train, Xt_test, y_train, y_test, time.perf_counter() - start
+
+
+def _fit_and_score(classifier, params, Xt_train, Xt_test, y_train, y_test, scorer):
+    start = time.perf_counter()
+    classifier = clone(classifier).set_params(**params)
+    classifier.fit(Xt_train, y_train)
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    score = scorer(classifier, Xt_test, y_test)
+    return score, fit_time, time.perf_counter() - start, _worker_rss()
+
+
+class FoldCachedSearchCV:
+    """GridSearchCV over a Pipeline with the preprocessing cached per fold
+
+    estimator : Pipeline whose last step is the classifier
+    param_grid : same format as GridSearchCV; keys under the last step name ('classifier__...')
+                 are classifier parameters, everything else is treated as preprocessing
+    cache_bytes, cache_dir : size limit and optional memory map directory of the FoldCache
+    shared : memory map the fold matrices and labels even without cache_dir (in a temporary
+             directory on /dev/shm when available) so the workers share them without copies
+             (numpy and sparse folds only, frame folds are still copied to the workers, see FoldCache)
+    results_dir : if set, every (candidate, fold) score is checkpointed to a ResultStore there, keyed by
+                  the fingerprint of X, y, the pipeline config, folds and scoring. A rerun on the same data
+                  (interrupted, or with values added to the grid) only evaluates what is not stored yet.
+
+    After fit: best_estimator_, best_params_, best_score_, best_index_, cv_results_,
+    preprocess_time_ (time spent fitting the preprocessing on the folds),
+    time_saved_ (preprocessing time GridSearchCV would have spent on top of that) and
+    n_reused_ (number of (candidate, fold) results taken from the results store) and
+    worker_peak_rss_mb_ (peak resident memory of every worker process that ran a fit, by pid).
+    """
+
+    def __init__(self, estimator, param_grid, scoring='recall', cv=3, n_jobs=None, refit=True,
+                 verbose=0, cache_bytes=2 * 1024 ** 3, cache_dir=None, shared=False, results_dir=None):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.refit = refit
+        self.verbose = verbose
+        self.cache_bytes = cache_bytes
+        self.cache_dir = cache_dir
+        self.shared = shared
+        self.results_dir = results_dir
+
+    def _split_grid(self):
+        classifier_name = self.estimator.steps[-1][0]
+        prefix = classifier_name + '__'
+        grids = self.param_grid if isinstance(self.param_grid, list) else [self.param_grid]
+        for grid in grids:
+            preprocessing_grid = {k: v for k, v in grid.items() if not k.startswith(prefix)}
+            classifier_grid = {k[len(prefix):]: v for k, v in grid.items() if k.startswith(prefix)}
+            for preprocessing_params in ParameterGrid(preprocessing_grid):
+                yield preprocessing_params, list(ParameterGrid(classifier_grid)), prefix
+
+    def _open_cache(self):
+        self.worker_peak_rss_mb_ = {}
+        self._shared_dir = None
+        directory = self.cache_dir
+        if directory is None and self.shared:
+            # /dev/shm is RAM backed, the files are page cache mapped by every worker
+            base = '/dev/shm' if os.path.isdir('/dev/shm') else None
+            directory = self._shared_dir = tempfile.mkdtemp(prefix='ds_search_', dir=base)
+        return FoldCache(self.cache_bytes, directory)
+
+    def _close_cache(self, cache):
+        self.cache_stats_ = cache.stats()
+        cache.clear()
+        if self._shared_dir is not None:
+            shutil.rmtree(self._shared_dir, ignore_errors=True)
+
+    def _record_worker(self, worker):
+        pid, rss = worker
+        self.worker_peak_rss_mb_[pid] = max(rss, self.worker_peak_rss_mb_.get(pid, 0.0))
+
+    def _print_workers(self):
+        for pid, rss in sorted(self.worker_peak_rss_mb_.items()):
+            print(f"Worker {pid}: peak RSS {rss:.0f}MB")
+
+    def fingerprint(self, X, y):
+        """Content hash of the training data, pipeline config, folds and scoring the results depend on"""
+        cv = check_cv(self.cv, y, classifier=True)
+        return joblib.hash((joblib.hash(X), joblib.hash(y), joblib.hash(clone(self.estimator)), repr(cv), self.scoring))
+
+    def fit(self, X, y):
+        cv = check_cv(self.cv, y, classifier=True)
+        folds = list(cv.split(X, y))
+        classifier = self.estimator.steps[-1][1]
+        scorer = check_scoring(classifier, scoring=self.scoring)
+        cache = self._open_cache()
+        parallel = Parallel(n_jobs=self.n_jobs, verbose=self.verbose)
+        # the fit results are consumed as they come in (joblib's progress output breaks on a sequential generator)
+        fit_parallel = Parallel(n_jobs=self.n_jobs, return_as='generator',
+                                verbose=self.verbose if effective_n_jobs(self.n_jobs) > 1 else 0)
+        store = ResultStore(self.results_dir, self.fingerprint(X, y)) if self.results_dir else None
+        done = store.load() if store else {}
+
+        params, scores, fit_times = [], [], []
+        self.preprocess_time_ = 0.0
+        self.time_saved_ = 0.0
+        self.n_reused_ = 0
+        self._fold_cost = {}
+        try:
+            for group, (preprocessing_params, classifier_grid, prefix) in enumerate(self._split_grid()):
+                group_params = [{**preprocessing_params, **{prefix + k: v for k, v in classifier_params.items()}}
+                                for classifier_params in classifier_grid]
+                keys = [_params_key(candidate) for candidate in group_params]
+                todo = [(c, f) for c in range(len(classifier_grid)) for f in range(len(folds)) if (keys[c], f) not in done]
+                self.n_reused_ += len(classifier_grid) * len(folds) - len(todo)
+                if self.verbose:
+                    print(f"Preprocessing setting {group + 1}: {len(classifier_grid)} candidates x {len(folds)} folds, "
+                          f"{len(todo)} fits to run")
+                if todo:
+                    fold_ids = sorted({f for _, f in todo})
+                    preprocessing = clone(self.estimator[:-1]).set_params(**preprocessing_params)
+                    fold_data, costs, spent = self._fold_data(preprocessing, X, y, folds, cache, parallel, fold_ids)
+                    self.preprocess_time_ += spent
+                    # GridSearchCV would have paid the fold preprocessing once per candidate
+                    self.time_saved_ += sum(costs[f] for _, f in todo) - spent
+                    results = fit_parallel(
+                        delayed(_fit_and_score)(classifier, classifier_grid[c], *fold_data[f], scorer)
+                        for c, f in todo
+                    )
+                    # results are checkpointed as they come in, so an interrupted search resumes from here
+                    for i, (score, fit_time, _, worker) in enumerate(results):
+                        c, f = todo[i]
+                        self._record_worker(worker)
+                        done[(keys[c], f)] = (score, fit_time)
+                        if store:
+                            store.append(keys[c], f, score, fit_time, group_params[c])
+                    # the fits of the group are done, the folds evicted meanwhile can go
+                    cache.release()
+                for c, candidate in enumerate(group_params):
+                    params.append(candidate)
+                    scores.append([done[(keys[c], f)][0] for f in range(len(folds))])
+                    fit_times.append([done[(keys[c], f)][1] for f in range(len(folds))])
+        finally:
+            self._close_cache(cache)
+
+        # candidates ran grouped by preprocessing setting, results are reported in ParameterGrid order as
+        # GridSearchCV does (so ties pick the same best candidate)
+        grid = list(ParameterGrid(self.param_grid))
+        positions = {}
+        for i, candidate in enumerate(grid):
+            positions.setdefault(_params_key(candidate), []).append(i)
+        order = np.argsort([positions[_params_key(candidate)].pop(0) for candidate in params], kind='stable')
+        params = grid
+        self._set_results(params, np.array(scores)[order], np.array(fit_times)[order], len(folds))
+        if self.verbose:
+            print(f"Preprocessing time {self.preprocess_time_:.1f}s, saved {self.time_saved_:.1f}s compared to refitting per candidate")
+            if store:
+                print(f"Reused {self.n_reused_} stored (candidate, fold) results from {store.path}")
+            self._print_workers()
+        if self.refit:
+            # clone again so the estimators given in the grid are not fitted in place
+            self.best_estimator_ = clone(clone(self.estimator).set_params(**self.best_params_))
+            self.best_estimator_.fit(X, y)
+        return self
+
+    def _fold_data(self, preprocessing, X, y, folds, cache, parallel, fold_ids=None):
+        # preprocess the requested folds missing from the cache (in parallel) and return them by fold
+        # with the preprocessing cost of each fold and the time actually spent now
+        key = joblib.hash(preprocessing)
+        fold_ids = range(len(folds)) if fold_ids is None else fold_ids
+        fold_data = {f: cache.get((key, f)) for f in fold_ids}
+        missing = [f for f, data in fold_data.items() if data is None]
+        # no parallel call when everything is cached (the verbose call would print Done 0 out of 0)
+        computed = parallel(delayed(_fit_transform_fold)(preprocessing, X, y, *folds[f]) for f in missing) if missing else []
+        spent = 0.0
+        for f, (Xt_train, Xt_test, y_train, y_test, elapsed) in zip(missing, computed):
+            fold_data[f] = cache.put((key, f), (Xt_train, Xt_test, y_train, y_test))
+            self._fold_cost[(key, f)] = elapsed
+            spent += elapsed
+        costs = {f: self._fold_cost[(key, f)] for f in fold_ids}
+        return fold_data, costs, spent
+
+    def _set_results(self, params, scores, fit_times, n_folds):
+        mean = scores.mean(axis=1)
+        self.cv_results_ = {
+            'params': params,
+            'mean_test_score': mean,
+            'std_test_score': scores.std(axis=1),
+            'rank_test_score': rankdata(-mean, method='min').astype(int),
+            'mean_fit_time': fit_times.mean(axis=1),
+        }
+        for f in range(n_folds):
+            self.cv_results_[f'split{f}_test_score'] = scores[:, f]
+        # ties go to the first candidate, as in GridSearchCV
+        self.best_index_ = int(np.argmax(mean))
+        self.best_params_ = params[self.best_index_]
+        self.best_score_ = float(mean[self.best_index_])
+
+    def predict(self, X):
+        return self.best_estimator_.predict(X)
+
+    def predict_proba(self, X):
+        return self.best_estimator_.predict_proba(X)
+
+
+# Wider search space for HalvingBoostSearchCV
+# (the grid in DS_Model_Final.py was kept small because of the running time in colab)
+XGB_PARAM_DISTRIBUTIONS = {
+    'classifier__max_depth': randint(2, 9),
+    'classifier__learning_rate': loguniform(0.005, 0.3),
+    'classifier__subsample': uniform(0.5, 0.5),
+    'classifier__colsample_bytree': uniform(0.4, 0.6),
+    'classifier__min_child_weight': loguniform(0.5, 20),
+    'classifier__scale_pos_weight': uniform(1, 14),
+}
+
+
+class _Deadline(TrainingCallback):
+    # stops boosting once the wall clock budget of the search is used up
+    def __init__(self, deadline):
+        super().__init__()
+        self.deadline = deadline
+
+    def after_iteration(self, model, epoch, evals_log):
+        return time.time() > self.deadline
+
+
+def _stratified_order(y, rng):
+    # row order in which every prefix keeps the class proportions of y
+    y = np.asarray(y)
+    rank = np.empty(len(y))
+    for label in np.unique(y):
+        idx = np.flatnonzero(y == label)
+        rank[idx] = (rng.permutation(len(idx)) + rng.random(len(idx))) / len(idx)
+    return np.argsort(rank, kind='stable')
+
+
+def _fit_boost(classifier, params, rows, Xt_train, Xt_test, y_train, y_test, scorer, n_rounds, early_stopping_rounds,
+               deadline, skip_late=False):
+    if skip_late and deadline is not None and time.time() > deadline:
+        # the budget ran out while the fit was waiting for a worker
+        return None
+    start, cpu_start = time.perf_counter(), time.process_time()
+    Xt_train, y_train = _take(Xt_train, rows), y_train[rows]
+    classifier = clone(classifier).set_params(**params)
+    classifier.set_params(n_estimators=n_rounds, early_stopping_rounds=early_stopping_rounds)
+    if deadline is not None:
+        classifier.set_params(callbacks=[_Deadline(deadline)])
+    classifier.fit(Xt_train, y_train, eval_set=[(Xt_test, y_test)], verbose=False)
+    # predict uses the best iteration found by early stopping
+    score = scorer(classifier, Xt_test, y_test)
+    best_rounds = getattr(classifier, 'best_iteration', n_rounds - 1) + 1
+    return score, best_rounds, time.perf_counter() - start, time.process_time() - cpu_start, _worker_rss()
+
+
+class HalvingBoostSearchCV(FoldCachedSearchCV):
+    """Budgeted successive halving over rows and boosting rounds for the XGBoost pipeline
+
+    n_candidates settings are sampled from param_distributions. In rung r every remaining candidate
+    is trained on min_fraction * factor**r of the (preprocessed) training fold rows with at most
+    min_rounds * factor**r boosting rounds, stopping early when the validation fold eval_metric
+    (logloss) has not improved for early_stopping_rounds. The best 1/factor candidates by the
+    scoring on the validation folds go to the next rung, until one is left or the full data and
+    max_rounds are reached.
+
+    time_budget : seconds for the whole search (None for no limit), measured as wall clock or,
+                  with budget='cpu', as CPU seconds summed over the workers. Once used up no new
+                  rung is started. With the wall clock budget running fits are also stopped and fits
+                  not started yet are skipped (a candidate missing a fold is left out of its rung, the
+                  first candidate of the first rung always runs), so the overrun is about one boosting
+                  round per worker.
+                  The CPU budget is only checked between rungs and can be overrun by up to one rung.
+                  The preprocessing of the folds and the refit are not stopped by the budget.
+
+    The preprocessing is fitted once per fold through the FoldCache, as in FoldCachedSearchCV.
+    best_params_ includes classifier__n_estimators set to the mean best iteration of the winner.
+    """
+
+    def __init__(self, estimator, param_distributions=XGB_PARAM_DISTRIBUTIONS, n_candidates=81, factor=3,
+                 min_fraction=1 / 27, min_rounds=50, max_rounds=2000, early_stopping_rounds=50,
+                 time_budget=None, budget='wall', scoring='recall', cv=3, n_jobs=None, refit=True,
+                 verbose=0, random_state=None, cache_bytes=2 * 1024 ** 3, cache_dir=None, shared=False):
+        super().__init__(estimator, param_grid=None, scoring=scoring, cv=cv, n_jobs=n_jobs, refit=refit,
+                         verbose=verbose, cache_bytes=cache_bytes, cache_dir=cache_dir, shared=shared)
+        self.param_distributions = param_distributions
+        self.n_candidates = n_candidates
+        self.factor = factor
+        self.min_fraction = min_fraction
+        self.min_rounds = min_rounds
+        self.max_rounds = max_rounds
+        self.early_stopping_rounds = early_stopping_rounds
+        self.time_budget = time_budget
+        self.budget = budget
+        self.random_state = random_state
+
+    def _out_of_budget(self, start):
+        if self.time_budget is None:
+            return False
+        spent = self.cpu_time_ if self.budget == 'cpu' else time.time() - start
+        return spent >= self.time_budget
+
+    def fit(self, X, y):
+        if self.budget not in ('wall', 'cpu'):
+            raise ValueError(f"budget should be 'wall' or 'cpu', got {self.budget!r}")
+        rng = check_random_state(self.random_state)
+        cv = check_cv(self.cv, y, classifier=True)
+        folds = list(cv.split(X, y))
+        orders = [_stratified_order(_take(y, train), rng) for train, _ in folds]
+        classifier_name, classifier = self.estimator.steps[-1]
+        prefix = classifier_name + '__'
+        scorer = check_scoring(classifier, scoring=self.scoring)
+        cache = self._open_cache()
+        parallel = Parallel(n_jobs=self.n_jobs, verbose=self.verbose)
+
+        candidates = list(ParameterSampler(self.param_distributions, self.n_candidates, random_state=rng))
+        start = time.time()
+        deadline = start + self.time_budget if self.time_budget is not None and self.budget == 'wall' else None
+        self.preprocess_time_ = 0.0
+        self.time_saved_ = 0.0
+        self.cpu_time_ = 0.0
+        self._fold_cost = {}
+        results = {key: [] for key in ('params', 'rung', 'n_rows', 'n_rounds', 'mean_test_score',
+                                       'std_test_score', 'mean_best_rounds', 'mean_fit_time')}
+        alive = list(range(len(candidates)))
+        rung = 0
+        try:
+            while True:
+                fraction = min(1.0, self.min_fraction * self.factor ** rung)
+                n_rounds = int(min(self.max_rounds, self.min_rounds * self.factor ** rung))
+                tasks = []
+                for c in alive:
+                    preprocessing_params = {k: v for k, v in candidates[c].items() if not k.startswith(prefix)}
+                    classifier_params = {k[len(prefix):]: v for k, v in candidates[c].items() if k.startswith(prefix)}
+                    preprocessing = clone(self.estimator[:-1]).set_params(**preprocessing_params)
+                    fold_data, costs, spent = self._fold_data(preprocessing, X, y, folds, cache, parallel)
+                    self.preprocess_time_ += spent
+                    self.time_saved_ += sum(costs.values()) - spent
+                    for f, order in enumerate(orders):
+                        rows = np.sort(order[:max(1, int(len(order) * fraction))])
+                        # the row subset is taken in the worker so the shared fold matrices are not copied here
+                        tasks.append((classifier_params, rows, fold_data[f]))
+                fold_results = parallel(
+                    delayed(_fit_boost)(classifier, params, rows, *data, scorer,
+                                        n_rounds, self.early_stopping_rounds, deadline, skip_late=rung > 0 or i >= len(folds))
+                    for i, (params, rows, data) in enumerate(tasks)
+                )
+                cache.release()
+                ran = [r for r in fold_results if r is not None]
+                for r in ran:
+                    self._record_worker(r[4])
+                self.cpu_time_ += sum(r[3] for r in ran)
+
+                n_folds = len(folds)
+                rung_scores = []
+                for i, c in enumerate(alive):
+                    candidate_results = fold_results[i * n_folds:(i + 1) * n_folds]
+                    if any(r is None for r in candidate_results):
+                        # skipped at the deadline, the search stops after this rung so it is not ranked
+                        rung_scores.append(-np.inf)
+                        continue
+                    scores = np.array([r[0] for r in candidate_results])
+                    best_rounds = np.mean([r[1] for r in candidate_results])
+                    rung_scores.append(scores.mean())
+                    results['params'].append({**candidates[c], prefix + 'n_estimators': max(1, int(round(best_rounds)))})
+                    results['rung'].append(rung)
+                    results['n_rows'].append(int(len(orders[0]) * fraction))
+                    results['n_rounds'].append(n_rounds)
+                    results['mean_test_score'].append(scores.mean())
+                    results['std_test_score'].append(scores.std())
+                    results['mean_best_rounds'].append(best_rounds)
+                    results['mean_fit_time'].append(np.mean([r[2] for r in candidate_results]))
+                if self.verbose:
+                    skipped = len(fold_results) - len(ran)
+                    print(f"Rung {rung}: {len(alive)} candidates, {fraction:.0%} of rows, up to {n_rounds} rounds, "
+                          f"best score {max(rung_scores):.4f}" + (f", {skipped} fits skipped at the deadline" if skipped else ''))
+
+                self.budget_exhausted_ = self._out_of_budget(start)
+                full = fraction >= 1.0 and n_rounds >= self.max_rounds
+                if len(alive) <= 1 or full or self.budget_exhausted_:
+                    break
+                keep = max(1, len(alive) // self.factor)
+                # stable sort keeps the earlier sampled candidate on ties
+                ranked = np.argsort(-np.array(rung_scores), kind='stable')[:keep]
+                alive = [alive[i] for i in sorted(ranked)]
+                rung += 1
+        finally:
+            self._close_cache(cache)
+
+        self.cv_results_ = {key: np.array(value) if key != 'params' else value for key, value in results.items()}
+        # the winner is the best candidate of the last rung that was run (the one before when the deadline
+        # skipped a fold of every candidate)
+        rung = int(self.cv_results_['rung'].max())
+        last = np.flatnonzero(self.cv_results_['rung'] == rung)
+        self.best_index_ = int(last[np.argmax(self.cv_results_['mean_test_score'][last])])
+        self.best_params_ = self.cv_results_['params'][self.best_index_]
+        self.best_score_ = float(self.cv_results_['mean_test_score'][self.best_index_])
+        self.n_rungs_ = rung + 1
+        self.time_spent_ = time.time() - start
+        if self.verbose:
+            print(f"Search took {self.time_spent_:.1f}s ({self.cpu_time_:.1f} CPU s in the fits), best score {self.best_score_:.4f}")
+            self._print_workers()
+        if self.refit:
+            # clone again so the estimators given in the grid are not fitted in place
+            self.best_estimator_ = clone(clone(self.estimator).set_params(**self.best_params_))
+            self.best_estimator_.fit(X, y)
+        return self
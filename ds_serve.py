@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""Online scoring service for the saved pipeline with micro-batching
+
+    python ds_serve.py --model xgb_pipeline.pkl --port 8080 --max-batch 64 --max-wait-ms 5
+
+  POST /score  {"records": [{"Age": 39, "Education": "Bachelors", ...}, ...]}  (or a single record)
+               -> {"probabilities": [...], "labels": [...]}
+  GET  /stats  -> request/row/batch counters, throughput and p50/p99 latency in ms
+                (plus the cache hits/misses/hit rate with --cache-size)
+
+The per call overhead of Pipeline.predict_proba (ColumnTransformer, imputers, XGBoost) is
+paid per batch instead of per request - requests arriving within max_wait_ms of the first
+one (up to max_batch records) are scored together by a single scoring thread.
+The pipeline is loaded once at start up.
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from ds_cache import _model_columns
+from ds_columns import prepare_features
+from ds_score import load_model
+
+# seconds a request waits for its batch before giving up with 503
+REQUEST_TIMEOUT = 30.0
+
+
+class LatencyStats:
+    """Counters and a window of the latest request latencies"""
+
+    def __init__(self, window=10_000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+
+    def add_request(self, latency, rows):
+        with self._lock:
+            self._latencies.append(latency)
+            self.requests += 1
+            self.rows += rows
+
+    def add_batch(self):
+        with self._lock:
+            self.batches += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            elapsed = time.perf_counter() - self._start
+            stats = {'requests': self.requests, 'rows': self.rows, 'batches': self.batches,
+                     'mean_batch_rows': self.rows / self.batches if self.batches else 0.0,
+                     'requests_per_second': self.requests / elapsed, 'rows_per_second': self.rows / elapsed}
+        if len(latencies):
+            stats['p50_ms'], stats['p99_ms'] = np.percentile(latencies, [50, 99])
+        return stats
+
+
+class MicroBatcher:
+    """Groups concurrent scoring requests into one predict_proba call
+
+    submit() returns a Future with the probabilities of the submitted records (a list of dicts).
+    cache is an optional ds_cache.PredictionCache of model, only its misses reach the model.
+    A request whose records cannot be scored fails on its own, the other requests of its batch are scored.
+    """
+
+    def __init__(self, model, max_batch=64, max_wait_ms=5.0, stats=None, cache=None):
+        self.model = model
+        self.cache = cache
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.stats = stats or LatencyStats()
+        # input columns of the pipeline (feature_names_in_) or of the artifact, so both reindex the same way
+        self._columns, self._categorical = _model_columns(model)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, records):
+        future = Future()
+        self._queue.put((records, future))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _frame(self, records):
+        X = prepare_features(pd.DataFrame.from_records(records), drop_columns=())
+        if self._columns is None:
+            return X
+        # missing fields become NaN and are imputed like any other missing value
+        X = X.reindex(columns=self._columns)
+        for column in X.columns:
+            if column not in self._categorical:
+                X[column] = pd.to_numeric(X[column], errors='coerce')
+        return X
+
+    def _collect(self):
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch, n_rows = [item], len(item[0])
+        deadline = time.perf_counter() + self.max_wait
+        while n_rows < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    def _score(self, batch):
+        # frames are built per request so a malformed request only fails its own future
+        frames, scored = [], []
+        for records, future in batch:
+            try:
+                frames.append(self._frame(records))
+                scored.append(future)
+            except Exception as exc:
+                future.set_exception(exc)
+        if not frames:
+            return
+        scorer = self.cache or self.model
+        try:
+            proba = scorer.predict_proba(pd.concat(frames, ignore_index=True))[:, 1]
+        except Exception:
+            # score the requests one by one to find the failing ones
+            for X, future in zip(frames, scored):
+                try:
+                    future.set_result(scorer.predict_proba(X)[:, 1])
+                except Exception as exc:
+                    future.set_exception(exc)
+            return
+        self.stats.add_batch()
+        offset = 0
+        for X, future in zip(frames, scored):
+            future.set_result(proba[offset:offset + len(X)])
+            offset += len(X)
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                batch = self._collect()
+                if batch is None:
+                    return
+                self._score(batch)
+            except Exception as exc:
+                # the scoring thread must not die, every later request would wait on it
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+
+def make_handler(batcher, threshold=0.5):
+    class ScoreHandler(BaseHTTPRequestHandler):
+        # keep-alive so load tests do not measure connection set up, and no Nagle delay on the small responses
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def _send(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                stats = batcher.stats.snapshot()
+                if batcher.cache is not None:
+                    stats.update(batcher.cache.stats())
+                self._send(200, stats)
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path != '/score':
+                self._send(404, {'error': 'not found'})
+                return
+            start = time.perf_counter()
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                records = body['records'] if isinstance(body, dict) and 'records' in body else body
+                records = [records] if isinstance(records, dict) else records
+                if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+                    raise ValueError('records must be a record or a non empty list of records (json objects)')
+                proba = batcher.submit(records).result(timeout=REQUEST_TIMEOUT)
+            except (ValueError, KeyError, TypeError) as exc:
+                self._send(400, {'error': str(exc)})
+                return
+            except TimeoutError:
+                self._send(503, {'error': f'not scored within {REQUEST_TIMEOUT}s'})
+                return
+            except Exception as exc:
+                self._send(500, {'error': repr(exc)})
+                return
+            self._send(200, {'probabilities': proba.tolist(), 'labels': (proba >= threshold).astype(int).tolist()})
+            batcher.stats.add_request(time.perf_counter() - start, len(records))
+
+        def log_message(self, format, *args):
+            pass
+
+    return ScoreHandler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 resets connections under a burst of clients
+    request_queue_size = 256
+
+
+def make_server(model, host='127.0.0.1', port=8080, max_batch=64, max_wait_ms=5.0, threshold=0.5, cache_size=0,
+                version=None):
+    """Threaded http server scoring with model - port 0 picks a free port (server.server_address)
+
+    cache_size > 0 adds a prediction cache of that many records for the model version.
+    """
+    cache = None
+    if cache_size:
+        from ds_cache import PredictionCache
+        cache = PredictionCache(model, version=version, max_entries=cache_size)
+    batcher = MicroBatcher(model, max_batch=max_batch, max_wait_ms=max_wait_ms, cache=cache)
+    server = _Server((host, port), make_handler(batcher, threshold))
+    server.batcher = batcher
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Online scoring service for the saved pipeline')
+    parser.add_argument('--model', default='/content/xgb_pipeline.pkl', help='pickle or artifact directory')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--cache-size', type=int, default=0, help='distinct records kept in the prediction cache')
+    args = parser.parse_args(argv)
+
+    model = load_model(args.model)
+    version = None
+    if args.cache_size:
+        from ds_cache import model_version
+        version = model_version(args.model)
+    server = make_server(model, args.host, args.port, args.max_batch, args.max_wait_ms, args.threshold,
+                         cache_size=args.cache_size, version=version)
+    print(f'Scoring on http://{args.host}:{server.server_address[1]}/score (stats on /stats)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Training of the final model - pipeline, hyper parameter search and export
+
+Used by DS_Model_Final.py. Scoring does not need this module (see ds_score.py), evaluation
+and plots are in ds_evaluate.py.
+"""
+
+import joblib
+from sklearn.pipeline import Pipeline
+from xgboost import XGBClassifier
+
+from ds_preprocess import CategoricalCleaner, build_native_preprocessor, build_preprocessor, feature_types
+from ds_search import XGB_PARAM_DISTRIBUTIONS, FoldCachedSearchCV, HalvingBoostSearchCV
+
+# scale_pos_weight is on the higher end as there is significant data imbalance
+# param grid values are based on previous experiments with given data set
+# param values are chosen in such a way to avoid long running time in colab - these can be adjusted to wider and higher range in high performing environment
+PARAM_GRID = {
+    'classifier__n_estimators': [500, 1000],
+    'classifier__max_depth': [3, 5],
+    'classifier__learning_rate': [0.005, 0.2],
+    'classifier__scale_pos_weight': [10, 12],
+    'verbose': [True],
+}
+
+
+def build_pipeline(X, sparse=False):
+    """Cleaner -> preprocessor -> XGBoost pipeline and the two preprocessors to search over
+
+    KNN imputation + scaling + one hot (build_preprocessor, optionally sparse CSR output)
+    or XGBoost's native categorical/missing handling (build_native_preprocessor).
+    """
+    numerical_features, categorical_features = feature_types(X)
+    preprocessor = build_preprocessor(numerical_features, categorical_features, sparse=sparse)
+    native_preprocessor = build_native_preprocessor(numerical_features, categorical_features)
+    # enable_categorical with hist trees is needed for the native preprocessor and has no effect on the one hot input
+    xgb = XGBClassifier(eval_metric='logloss', use_label_encoder=False, enable_categorical=True, tree_method='hist')
+    # The cleaner strips strings and maps '?' to NaN so raw input records can be scored as well (no-op on load_data output)
+    pipeline = Pipeline(steps=[
+        ('cleaner', CategoricalCleaner(columns=list(categorical_features))),
+        ('preprocessor', preprocessor),
+        ('classifier', xgb)
+    ])
+    return pipeline, [preprocessor, native_preprocessor]
+
+
+def build_search(pipeline, preprocessors, search_mode='grid', param_grid=PARAM_GRID, time_budget=30 * 60,
+                 results_dir=None, n_jobs=-1, cv=3, random_state=42):
+    """FoldCachedSearchCV over param_grid ('grid') or HalvingBoostSearchCV over XGB_PARAM_DISTRIBUTIONS ('halving')
+
+    Both score on recall and search the preprocessors as the 'preprocessor' step. The fold matrices are
+    shared with the workers through memory mapped files (shared=True); the folds of the native preprocessor
+    are frames, those are still copied to every worker.
+    """
+    if search_mode == 'halving':
+        param_distributions = {**XGB_PARAM_DISTRIBUTIONS, 'preprocessor': preprocessors}
+        return HalvingBoostSearchCV(estimator=pipeline, param_distributions=param_distributions, scoring='recall', cv=cv,
+                                    n_jobs=n_jobs, verbose=1, time_budget=time_budget, random_state=random_state,
+                                    shared=True)
+    if search_mode != 'grid':
+        raise ValueError(f"search_mode should be 'grid' or 'halving', got {search_mode!r}")
+    return FoldCachedSearchCV(estimator=pipeline, param_grid={'preprocessor': preprocessors, **param_grid},
+                              scoring='recall', cv=cv, n_jobs=n_jobs, verbose=2, shared=True, results_dir=results_dir)
+
+
+def save_model(model, path, artifact_dir=None):
+    """joblib pickle of the fitted pipeline, plus the memory mapped ds_artifact export if artifact_dir is given"""
+    joblib.dump(model, path)
+    if artifact_dir is not None:
+        from ds_artifact import save_artifact
+        save_artifact(model, artifact_dir)
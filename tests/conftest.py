@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Shared fixtures - a small random frame with the exercise columns and pipelines fitted on it"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATEGORIES = {
+    'Education': ['HS-grad', 'Some-college', 'Bachelors', 'Masters'],
+    'MaritalStatus': ['Married-civ-spouse', 'Never-married', 'Divorced'],
+    'Occupation': ['Prof-specialty', 'Craft-repair', 'Sales', '?'],
+    'Relationship': ['Husband', 'Not-in-family', 'Own-child'],
+    'Race': ['White', 'Black', 'Other'],
+    'Gender': ['Male', 'Female'],
+}
+NUMERICS = ['Age', 'EducationYears', 'CapitalGain', 'CapitalLoss', 'HoursWorkWeekly']
+
+
+def make_data(n_rows=600, seed=0):
+    """Frame as load_data returns it (category strings with '?' cleaned to NaN, numerics with NaN) plus the target"""
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame({column: rng.normal(40, 10, n_rows) for column in NUMERICS})
+    data.loc[rng.random(n_rows) < 0.05, 'Age'] = np.nan
+    for column, values in CATEGORIES.items():
+        data[column] = pd.Categorical(rng.choice(values, n_rows)).remove_categories(
+            [value for value in ['?'] if value in values])
+    score = data['EducationYears'].fillna(40) + 5 * (data['Education'] == 'Masters') + rng.normal(0, 5, n_rows)
+    data['IncomeLabel'] = np.where(score > np.quantile(score, 0.9), '>60K', '<=60K')
+    return data
+
+
+def fit_pipeline(data, n_estimators=10, native=False):
+    from ds_preprocess import split_X_y
+    from ds_train import build_pipeline
+
+    X, y = split_X_y(data, drop_columns=())
+    pipeline, preprocessors = build_pipeline(X)
+    pipeline.set_params(preprocessor=preprocessors[native], classifier__n_estimators=n_estimators,
+                        classifier__max_depth=3)
+    return pipeline.fit(X, y), X, y
+
+
+@pytest.fixture(scope='session')
+def data():
+    return make_data()
+
+
+@pytest.fixture(scope='session')
+def artifact_dir(data, tmp_path_factory):
+    from ds_artifact import save_artifact
+
+    pipeline, _, _ = fit_pipeline(data)
+    return save_artifact(pipeline, str(tmp_path_factory.mktemp('artifact')))
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""PredictionCache returns the model's probabilities, rows with colliding hashes do not share entries"""
+
+import numpy as np
+import pytest
+
+from conftest import fit_pipeline
+from ds_cache import PredictionCache
+
+
+@pytest.mark.parametrize('n_rows', [5, 300])
+def test_rows_with_the_same_hash_get_their_own_entry(data, n_rows):
+    pipeline, X, _ = fit_pipeline(data)
+    # hash(-1.0) == hash(-2.0) in CPython
+    first, second = X.iloc[:n_rows].copy(), X.iloc[:n_rows].copy()
+    first['CapitalGain'], second['CapitalGain'] = -1.0, -2.0
+    cache = PredictionCache(pipeline)
+    for batch in (first, second, first, second):
+        assert np.allclose(cache.predict_proba(batch), pipeline.predict_proba(batch))
+    assert cache.stats()['cache_misses'] == 2 * n_rows
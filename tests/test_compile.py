@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""CompiledPredictor and the artifact give the pipeline's probabilities, also with a num or cat block left empty"""
+
+import numpy as np
+import pytest
+from conftest import CATEGORIES, NUMERICS, fit_pipeline
+
+from ds_artifact import load_artifact, save_artifact
+from ds_compile import compile_pipeline
+
+
+@pytest.mark.parametrize('columns, native', [
+    (NUMERICS + list(CATEGORIES), False),
+    (NUMERICS + list(CATEGORIES), True),
+    (NUMERICS, False),
+    (list(CATEGORIES), False),
+])
+def test_compiled_matches_pipeline(data, tmp_path, columns, native):
+    pipeline, X, _ = fit_pipeline(data[columns + ['IncomeLabel']], native=native)
+    expected = pipeline.predict_proba(X)[:, 1]
+    assert np.allclose(compile_pipeline(pipeline).predict_proba(X)[:, 1], expected, atol=1e-6)
+    loaded = load_artifact(save_artifact(pipeline, str(tmp_path / 'artifact')))
+    assert np.allclose(loaded.predict_proba(X)[:, 1], expected, atol=1e-6)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""IndexedKNNImputer against KNNImputer on integer valued columns, where equally distant donors are common"""
+
+import numpy as np
+import pytest
+from sklearn.impute import KNNImputer
+from sklearn.metrics.pairwise import nan_euclidean_distances
+
+from ds_impute import IndexedKNNImputer
+
+
+def tied_data(n_rows=500, seed=0):
+    # Age, EducationYears and HoursWorkWeekly like columns, 10% missing
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([rng.integers(17, 90, n_rows), rng.integers(1, 17, n_rows),
+                         rng.integers(1, 100, n_rows)]).astype(np.float64)
+    X[rng.random(X.shape) < 0.1] = np.nan
+    return X
+
+
+def reference(X, n_neighbors, weights):
+    """KNNImputer's distances and averaging, equally distant donors taken in row order
+
+    Also returns the cells where KNNImputer's own choice among ties can change the value.
+    """
+    missing = np.isnan(X)
+    out, ambiguous = X.copy(), np.zeros_like(missing)
+    distances = nan_euclidean_distances(X, X)
+    for col in range(X.shape[1]):
+        donors = np.flatnonzero(~missing[:, col])
+        for row in np.flatnonzero(missing[:, col]):
+            dist = np.where(np.isnan(distances[row, donors]), np.inf, distances[row, donors])
+            if np.isinf(dist).all():
+                out[row, col] = X[donors, col].mean()
+                continue
+            nearest = np.argsort(dist, kind='stable')[:n_neighbors]
+            kth = dist[nearest[-1]]
+            tied_values = X[donors[dist == kth], col]
+            ambiguous[row, col] = (dist <= kth).sum() > n_neighbors and np.ptp(tied_values) > 0
+            d, values = dist[nearest], X[donors[nearest], col]
+            if weights == 'distance':
+                with np.errstate(divide='ignore'):
+                    weight = np.where(d == 0, 1.0, 0.0) if (d == 0).any() else 1 / d
+            else:
+                weight = np.ones_like(d)
+            weight[np.isinf(d)] = 0
+            out[row, col] = (weight * np.where(np.isinf(d), 0, values)).sum() / weight.sum()
+    return out, ambiguous
+
+
+@pytest.mark.parametrize('weights', ['uniform', 'distance'])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_matches_knn_imputer_on_tied_integer_data(weights, seed):
+    X = tied_data(seed=seed)
+    missing = np.isnan(X)
+    # small chunks so the tree and brute force donors are merged over several chunks
+    indexed = IndexedKNNImputer(n_neighbors=5, weights=weights, chunk_size=64).fit_transform(X)
+    expected, ambiguous = reference(X, 5, weights)
+    assert np.array_equal(indexed[missing], expected[missing])
+    # KNNImputer picks among ties with np.argpartition, the cells where that matters are left out
+    knn = KNNImputer(n_neighbors=5, weights=weights).fit_transform(X)
+    assert (missing & ~ambiguous).sum() >= 20
+    assert np.allclose(indexed[missing & ~ambiguous], knn[missing & ~ambiguous], rtol=0, atol=1e-9)
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""Refreshing an early stopped model predicts with all of its trees"""
+
+import numpy as np
+from conftest import fit_pipeline, make_data
+from sklearn.pipeline import Pipeline
+
+from ds_compile import compile_pipeline
+from ds_preprocess import split_X_y
+from ds_refresh import refresh_model
+
+
+def test_refresh_of_early_stopped_model_uses_new_rounds(data):
+    pipeline, X, y = fit_pipeline(data)
+    classifier = pipeline.steps[-1][1]
+    Xt = Pipeline(pipeline.steps[:-1]).transform(X)
+    # shuffled labels as validation set stop the boosting after a few rounds
+    classifier.set_params(n_estimators=200, early_stopping_rounds=3, learning_rate=0.3)
+    classifier.fit(Xt, y, eval_set=[(Xt, np.random.default_rng(1).permutation(np.asarray(y)))], verbose=False)
+    rounds_before = classifier.get_booster().num_boosted_rounds()
+
+    X_new, y_new = split_X_y(make_data(seed=2), drop_columns=())
+    model, report = refresh_model(pipeline, X_new, y_new, X_new, y_new, n_rounds=20, max_recall_drop=1.0)
+    assert not report['rolled_back']
+    assert report['rounds_after'] == rounds_before + 20
+    assert len(compile_pipeline(model).trees['roots']) == rounds_before + 20
+    # the new rounds change the predictions
+    assert not np.allclose(model.predict_proba(X_new), pipeline.predict_proba(X_new))
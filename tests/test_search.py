@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""FoldCachedSearchCV reports the same cv_results_ and best candidate as GridSearchCV, HalvingBoostSearchCV
+keeps to its wall clock budget"""
+
+import numpy as np
+import pytest
+from sklearn.model_selection import GridSearchCV
+
+from ds_preprocess import split_X_y
+from ds_search import FoldCachedSearchCV, HalvingBoostSearchCV
+from ds_train import build_pipeline, build_search
+
+GRID = {'classifier__n_estimators': [5, 10], 'classifier__max_depth': [2, 3], 'classifier__scale_pos_weight': [1, 20]}
+
+
+def test_fold_cached_search_matches_grid_search(data, tmp_path):
+    X, y = split_X_y(data, drop_columns=())
+    pipeline, preprocessors = build_pipeline(X)
+    reference = GridSearchCV(pipeline, {'preprocessor': preprocessors, **GRID}, scoring='recall', cv=3).fit(X, y)
+    # the second run takes every result from the store
+    for _ in range(2):
+        search = build_search(pipeline, preprocessors, param_grid=GRID, n_jobs=1, results_dir=str(tmp_path))
+        search.verbose = 0
+        search.fit(X, y)
+        assert [str(p) for p in search.cv_results_['params']] == [str(p) for p in reference.cv_results_['params']]
+        assert np.allclose(search.cv_results_['mean_test_score'], reference.cv_results_['mean_test_score'])
+        assert search.best_index_ == reference.best_index_
+        assert str(search.best_params_) == str(reference.best_params_)
+
+
+def test_halving_search_skips_fits_after_the_deadline(data, capsys):
+    X, y = split_X_y(data, drop_columns=())
+    pipeline, _ = build_pipeline(X)
+    # the budget is used up from the start, only the first candidate of the first rung runs
+    search = HalvingBoostSearchCV(pipeline, n_candidates=9, min_rounds=5, max_rounds=20, time_budget=0, n_jobs=1,
+                                  refit=False, verbose=1, random_state=0).fit(X, y)
+    assert search.budget_exhausted_ and search.n_rungs_ == 1
+    assert len(search.cv_results_['params']) == 1 and search.best_index_ == 0
+    assert '0 out of 0' not in capsys.readouterr().out
+
+
+def test_fold_cached_search_with_evictions_in_parallel(data):
+    X, y = split_X_y(data, drop_columns=())
+    pipeline, preprocessors = build_pipeline(X)
+    reference = GridSearchCV(pipeline, {'preprocessor': preprocessors, **GRID}, scoring='recall', cv=3).fit(X, y)
+    # every put evicts the fold before it while the workers still read it from its memory mapped file
+    search = FoldCachedSearchCV(pipeline, {'preprocessor': preprocessors, **GRID}, n_jobs=2, shared=True,
+                                cache_bytes=1, refit=False).fit(X, y)
+    assert search.cache_stats_['evictions'] > 0
+    assert np.allclose(search.cv_results_['mean_test_score'], reference.cv_results_['mean_test_score'])
+
+
+@pytest.mark.parametrize('search_mode', ['grid', 'halving'])
+def test_build_search_shares_folds_with_workers(data, search_mode):
+    X, y = split_X_y(data, drop_columns=())
+    pipeline, preprocessors = build_pipeline(X)
+    search = build_search(pipeline, preprocessors, search_mode=search_mode, param_grid=GRID, n_jobs=2, cv=3)
+    assert search.shared
+    search.cache_bytes, search.refit, search.verbose = 1, False, 0
+    if search_mode == 'halving':
+        search.n_candidates, search.min_rounds, search.max_rounds, search.time_budget = 4, 5, 20, None
+    search.fit(X, y)
+    assert search.cache_stats_['evictions'] > 0
+    assert len(search.worker_peak_rss_mb_) >= 1 and 0 <= search.best_score_ <= 1
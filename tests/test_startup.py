@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""Scoring path budget (same check as benchmarks/check_startup.py) - no training libraries, bounded time/memory"""
+
+from benchmarks.check_startup import FORBIDDEN, MAX_RSS_MB, MAX_SECONDS, probe
+
+
+def test_import_does_not_pull_training_libraries():
+    imported = set(FORBIDDEN) & set(probe(None)['modules'])
+    assert not imported, f'ds_score imported {sorted(imported)}'
+
+
+def test_artifact_load_within_budget(artifact_dir):
+    runs = [probe(artifact_dir) for _ in range(3)]
+    imported = set(FORBIDDEN) & set(runs[0]['modules'])
+    assert not imported, f'loading an artifact imported {sorted(imported)}'
+    seconds = min(run['seconds'] for run in runs)
+    assert seconds <= MAX_SECONDS, f'import + load took {seconds:.2f}s, budget is {MAX_SECONDS}s'
+    rss_mb = max(run['rss_mb'] for run in runs)
+    assert rss_mb <= MAX_RSS_MB, f'peak rss is {rss_mb:.0f}MB, budget is {MAX_RSS_MB}MB'